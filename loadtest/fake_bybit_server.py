@@ -0,0 +1,191 @@
+# loadtest/fake_bybit_server.py
+"""
+Локальный фейковый WebSocket Bybit v5 для нагрузочных тестов (работает без сети).
+
+Принимает подписки в формате Bybit ({"op": "subscribe", "args": [...]}) и {"op": "auth"},
+после чего генерирует сообщения подписанных тем с заданной частотой или проигрывает записанный поток.
+В каждый элемент data добавляется поле '_sent' (time.time() момента отправки) — по нему стенд
+считает сквозную задержку до обработчика.
+
+Запуск отдельно:
+    python -m loadtest.fake_bybit_server --port 8765 --rate allLiquidation.DOGEUSDT=500 --rate order=200
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+SYMBOL = "DOGEUSDT"
+TICK_SECONDS = 0.01
+
+DEFAULT_RATES = {
+    f"allLiquidation.{SYMBOL}": 200.0,
+    f"kline.15.{SYMBOL}": 1.0,
+    "position": 50.0,
+    "order": 100.0,
+    "execution": 100.0,
+    "wallet": 5.0,
+}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _synth_data(topic: str, seq: int, price: float) -> dict:
+    """Элемент data в формате Bybit v5 для темы."""
+    now_ms = _now_ms()
+    if topic.startswith("allLiquidation."):
+        return {'T': now_ms, 's': SYMBOL, 'S': random.choice(('Buy', 'Sell')),
+                'v': str(random.randint(100, 100000)), 'p': f"{price:.5f}"}
+    if topic.startswith("kline."):
+        start = now_ms - now_ms % 900_000
+        return {'start': start, 'end': start + 899_999, 'interval': '15',
+                'open': f"{price:.5f}", 'close': f"{price:.5f}", 'high': f"{price * 1.001:.5f}",
+                'low': f"{price * 0.999:.5f}", 'volume': "1000", 'turnover': f"{1000 * price:.2f}",
+                'confirm': False, 'timestamp': now_ms}
+    if topic == "position":
+        return {'symbol': SYMBOL, 'positionIdx': seq % 3, 'side': 'Buy', 'size': str(seq % 1000),
+                'avgPrice': f"{price:.5f}", 'updatedTime': str(now_ms)}
+    if topic == "order":
+        return {'orderId': str(uuid.uuid4()), 'symbol': SYMBOL, 'side': 'Buy', 'orderType': 'Limit',
+                'price': f"{price:.5f}", 'qty': "100", 'orderStatus': random.choice(('New', 'Filled', 'Cancelled')),
+                'updatedTime': str(now_ms)}
+    if topic == "execution":
+        return {'execId': str(uuid.uuid4()), 'orderId': str(uuid.uuid4()), 'symbol': SYMBOL, 'side': 'Sell',
+                'execPrice': f"{price:.5f}", 'execQty': "100", 'execTime': str(now_ms)}
+    if topic == "wallet":
+        return {'accountType': 'UNIFIED', 'totalEquity': f"{1000 + seq % 100:.2f}", 'coin': []}
+    return {}
+
+
+def synth_message(topic: str, seq: int, price: float) -> dict:
+    now_ms = _now_ms()
+    message = {'topic': topic, 'data': [_synth_data(topic, seq, price)]}
+    if topic.startswith(("allLiquidation.", "kline.")):
+        message.update({'type': 'snapshot', 'ts': now_ms})
+    else:
+        message.update({'id': str(seq), 'creationTime': now_ms})
+    return message
+
+
+class FakeBybitServer:
+    """
+    rates: тема -> сообщений в секунду. replay: записанные сообщения (JSON-строки pybit-сообщений);
+    если задан, темы проигрываются по кругу с той же частотой, а время в сообщениях подменяется текущим.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765,
+                 rates: Optional[Dict[str, float]] = None, replay: Optional[List[dict]] = None):
+        self.host = host
+        self.port = port
+        self.rates = dict(DEFAULT_RATES if rates is None else rates)
+        self._replay: Dict[str, itertools.cycle] = {}
+        for topic in {message.get('topic') for message in replay or []}:
+            self._replay[topic] = itertools.cycle([m for m in replay if m.get('topic') == topic])
+        self._server = None
+        self.sent: Dict[str, int] = {}
+
+    async def start(self):
+        import websockets  # зависимость только стенда нагрузочного тестирования
+        self._server = await websockets.serve(self._serve, self.host, self.port, max_queue=None)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def _message(self, topic: str, seq: int, price: float) -> dict:
+        replay = self._replay.get(topic)
+        if replay is None:
+            return synth_message(topic, seq, price)
+        message = json.loads(json.dumps(next(replay)))
+        now_ms = _now_ms()
+        for key in ('ts', 'creationTime'):
+            if key in message:
+                message[key] = now_ms
+        return message
+
+    async def _stream(self, ws, topic: str, rate: float):
+        """Равномерная отправка rate сообщений в секунду (с досылкой, если цикл не успевает)."""
+        started = time.perf_counter()
+        sent = 0
+        price = 0.12
+        while True:
+            due = int((time.perf_counter() - started) * rate)
+            while sent < due:
+                price *= 1 + random.uniform(-0.0005, 0.0005)
+                message = self._message(topic, sent, price)
+                sent_at = time.time()
+                for item in message.get('data') or []:
+                    item['_sent'] = sent_at
+                await ws.send(json.dumps(message))
+                sent += 1
+                self.sent[topic] = self.sent.get(topic, 0) + 1
+            await asyncio.sleep(TICK_SECONDS)
+
+    async def _serve(self, ws, *args):
+        streams = []
+        try:
+            async for raw in ws:
+                request = json.loads(raw)
+                op = request.get('op')
+                if op == 'ping':
+                    await ws.send(json.dumps({'op': 'pong', 'success': True}))
+                    continue
+                await ws.send(json.dumps({'op': op, 'success': True, 'req_id': request.get('req_id')}))
+                if op != 'subscribe':
+                    continue
+                for topic in request.get('args', []):
+                    rate = self.rates.get(topic, 0)
+                    if rate > 0:
+                        streams.append(asyncio.create_task(self._stream(ws, topic, rate)))
+        except Exception:
+            pass  # клиент отключился
+        finally:
+            for task in streams:
+                task.cancel()
+            await asyncio.gather(*streams, return_exceptions=True)
+
+
+def parse_rates(values: List[str]) -> Dict[str, float]:
+    rates = dict(DEFAULT_RATES)
+    for value in values or []:
+        topic, _, rate = value.partition('=')
+        rates[topic] = float(rate)
+    return rates
+
+
+def load_replay(path: Optional[str]) -> Optional[List[dict]]:
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def _serve_forever(args):
+    server = FakeBybitServer(args.host, args.port, parse_rates(args.rate), load_replay(args.replay))
+    await server.start()
+    print(f"🧪 Фейковый Bybit WebSocket: {server.url}, темы: {server.rates}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный фейковый WebSocket Bybit v5")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", action="append", help="тема=сообщений_в_секунду, можно несколько раз")
+    parser.add_argument("--replay", help="JSONL с записанными сообщениями pybit для проигрывания")
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,275 @@
+# loadtest/ws_load_test.py
+"""
+Нагрузочный стенд пути событий WebSocket: фейковая биржа -> синхронные обработчики pybit из main.py ->
+EventDispatcher -> асинхронные обработчики пачек. Работает полностью офлайн.
+
+Клиентские потоки (websocket-client, как внутри pybit) подключаются к локальному FakeBybitServer,
+оформляют те же подписки, что и main(), и вызывают те же handle_*_sync по теме сообщения.
+Измеряется:
+  - сквозная задержка от отправки сообщения до завершения обработчика пачки (и до его начала);
+  - время синхронного обработчика (его платит поток WebSocket) и обработчика пачки;
+  - задержка цикла событий;
+  - глубина очередей диспетчера, отброшенные и схлопнутые сообщения, потерянные записи лога.
+
+По умолчанию ликвидации проходят через настоящий LIQUIDATION_TRIGGER (окно, debounce, cooldown) — его
+счётчики попадают в отчёт; --stub-trigger заменяет триггер пустышкой, чтобы измерить путь без него.
+Запись ликвидаций на диск отключена, пока не указан --persist-liquidations.
+
+Зависимости только для стенда (в боте не нужны, pytest их не собирает — testpaths = tests):
+    websockets        — сервер FakeBybitServer;
+    websocket-client  — клиентские потоки (ставится вместе с pybit);
+    всё, что импортирует main.py (pybit, openai и т.д.), так как стенд вызывает его обработчики.
+
+Запуск из корня репозитория:
+    python -m loadtest.ws_load_test --duration 30 --rate allLiquidation.DOGEUSDT=2000 --rate order=500
+Код возврата 1, если превышены --max-p99-ms или --max-loop-lag-ms (для проверки регрессий).
+"""
+import os
+
+# Консоль и логи стенда не должны мешать измерениям: до импорта main
+os.environ.setdefault("CONSOLE_VERBOSITY", "quiet")
+os.environ.setdefault("LOG_DIR", os.path.join("logs", "loadtest"))
+
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import main as bot
+from loadtest.fake_bybit_server import FakeBybitServer, SYMBOL, load_replay, parse_rates
+from utils.async_logging import DroppingQueueHandler, setup_async_logging, shutdown_async_logging
+
+LOOP_LAG_INTERVAL = 0.05
+DEPTH_SAMPLE_INTERVAL = 0.1
+DRAIN_SECONDS = 2.0
+
+PUBLIC_TOPICS = [f"allLiquidation.{SYMBOL}", f"kline.15.{SYMBOL}"]
+PRIVATE_TOPICS = ["position", "order", "execution", "wallet"]
+
+
+class Measurements:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.e2e: Dict[str, List[float]] = defaultdict(list)
+        self.dispatch: Dict[str, List[float]] = defaultdict(list)
+        self.batch_handler: Dict[str, List[float]] = defaultdict(list)
+        self.sync_handler: Dict[str, List[float]] = defaultdict(list)
+        self.received: Dict[str, int] = defaultdict(int)
+        self.loop_lag: List[float] = []
+        self.max_depth: Dict[str, int] = defaultdict(int)
+
+
+def _summary(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {'count': len(ordered), 'p50_ms': pick(0.5), 'p95_ms': pick(0.95),
+            'p99_ms': pick(0.99), 'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+def _timed_batch(measurements: Measurements, topic: str, handler, coalesced: bool):
+    """Обёртка обработчика пачки: задержка по полю '_sent' элементов data и время самого обработчика."""
+    async def wrapper(batch):
+        started_at = time.time()
+        items = batch if coalesced else [item for message in batch for item in message.get('data') or []]
+        sent = [item['_sent'] for item in items if isinstance(item, dict) and '_sent' in item]
+        t0 = time.perf_counter()
+        try:
+            await handler(batch)
+        finally:
+            measurements.batch_handler[topic].append(time.perf_counter() - t0)
+            finished_at = time.time()
+            measurements.dispatch[topic].extend(started_at - s for s in sent)
+            measurements.e2e[topic].extend(finished_at - s for s in sent)
+    return wrapper
+
+
+def _instrument_bot(measurements: Measurements):
+    """Подменяет обработчики пачек в main до регистрации тем диспетчера."""
+    for name, topic, coalesced in (
+        ('_handle_liquidation_batch', 'liquidation', False),
+        ('_handle_order_batch', 'order', False),
+        ('_handle_execution_batch', 'execution', False),
+        ('_handle_position_batch', 'position', True),
+        ('_handle_wallet_batch', 'wallet', True),
+    ):
+        setattr(bot, name, _timed_batch(measurements, topic, getattr(bot, name), coalesced))
+
+
+class _NullLiquidationTrigger:
+    def on_liquidation(self, liquidation: dict):
+        pass
+
+
+def _isolate_side_effects(stub_trigger: bool, persist_liquidations: bool):
+    """Ликвидации нагрузки по умолчанию не пишутся на диск; триггер заменяется только по --stub-trigger."""
+    if not persist_liquidations:
+        bot._save_liquidation = lambda liquidation, symbol: None
+    if stub_trigger:
+        bot.LIQUIDATION_TRIGGER = _NullLiquidationTrigger()
+
+
+class FeedClient:
+    """Поток websocket-client, который, как pybit, маршрутизирует сообщения по теме в синхронные обработчики."""
+
+    def __init__(self, url: str, topics: List[str], routes: Dict[str, Callable], measurements: Measurements):
+        import websocket  # websocket-client — зависимость pybit
+        self._routes = routes
+        self._topics = topics
+        self._measurements = measurements
+        self._app = websocket.WebSocketApp(url, on_open=self._on_open, on_message=self._on_message)
+        self._thread = threading.Thread(target=self._app.run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._app.close()
+        self._thread.join(timeout=5)
+
+    def _on_open(self, app):
+        app.send(json.dumps({'op': 'subscribe', 'args': self._topics}))
+
+    def _on_message(self, app, raw: str):
+        message = json.loads(raw)
+        topic = message.get('topic')
+        handler = self._routes.get(topic)
+        if handler is None:
+            return
+        t0 = time.perf_counter()
+        handler(message)
+        elapsed = time.perf_counter() - t0
+        with self._measurements.lock:
+            self._measurements.sync_handler[topic].append(elapsed)
+            self._measurements.received[topic] += 1
+
+
+async def _monitor_loop_lag(measurements: Measurements):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        measurements.loop_lag.append(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+
+async def _sample_depths(measurements: Measurements):
+    while True:
+        for topic, stats in bot.EVENT_DISPATCHER.stats().items():
+            measurements.max_depth[topic] = max(measurements.max_depth[topic], stats['depth'])
+        await asyncio.sleep(DEPTH_SAMPLE_INTERVAL)
+
+
+async def run_load_test(args) -> dict:
+    measurements = Measurements()
+    setup_async_logging()
+    loop = asyncio.get_running_loop()
+    bot.MAIN_EVENT_LOOP = loop
+    _isolate_side_effects(args.stub_trigger, args.persist_liquidations)
+    _instrument_bot(measurements)
+    bot._register_event_topics()
+    bot.EVENT_DISPATCHER.start(loop)
+
+    server = FakeBybitServer(args.host, args.port, parse_rates(args.rate), load_replay(args.replay))
+    await server.start()
+    routes = {
+        f"allLiquidation.{SYMBOL}": bot.handle_all_liquidation_sync,
+        f"kline.15.{SYMBOL}": bot.handle_kline_sync,
+        'position': bot.handle_position_sync,
+        'order': bot.handle_order_sync,
+        'execution': bot.handle_execution_sync,
+        'wallet': bot.handle_wallet_sync,
+    }
+    clients = [
+        FeedClient(f"{server.url}/v5/public/linear", PUBLIC_TOPICS, routes, measurements),
+        FeedClient(f"{server.url}/v5/private", PRIVATE_TOPICS, routes, measurements),
+    ]
+    monitors = [asyncio.create_task(_monitor_loop_lag(measurements)),
+                asyncio.create_task(_sample_depths(measurements))]
+
+    print(f"🧪 Нагрузка {args.duration:.0f} с, темы: {server.rates}")
+    for client in clients:
+        client.start()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        for client in clients:
+            await asyncio.to_thread(client.stop)
+        # Даём диспетчеру обработать накопленное
+        await asyncio.sleep(DRAIN_SECONDS)
+        for task in monitors:
+            task.cancel()
+        await asyncio.gather(*monitors, return_exceptions=True)
+        dispatcher_stats = bot.EVENT_DISPATCHER.stats()
+        await bot.EVENT_DISPATCHER.stop()
+        await server.stop()
+        shutdown_async_logging()
+
+    return {
+        'duration_s': args.duration,
+        'rates': server.rates,
+        'sent': server.sent,
+        'received': dict(measurements.received),
+        'e2e_latency': {topic: _summary(values) for topic, values in measurements.e2e.items()},
+        'dispatch_latency': {topic: _summary(values) for topic, values in measurements.dispatch.items()},
+        'batch_handler': {topic: _summary(values) for topic, values in measurements.batch_handler.items()},
+        'sync_handler': {topic: _summary(values) for topic, values in measurements.sync_handler.items()},
+        'loop_lag': _summary(measurements.loop_lag),
+        'max_queue_depth': dict(measurements.max_depth),
+        'dispatcher': dispatcher_stats,
+        'log_records_dropped': DroppingQueueHandler.dropped,
+        'streams': bot.get_stream_metrics(),
+        'liquidation_trigger': None if args.stub_trigger else dict(bot.LIQUIDATION_TRIGGER.stats),
+    }
+
+
+def _regressions(report: dict, args) -> List[str]:
+    problems = []
+    if args.max_p99_ms is not None:
+        for topic, summary in report['e2e_latency'].items():
+            if summary and summary['p99_ms'] > args.max_p99_ms:
+                problems.append(f"p99 задержки {topic}: {summary['p99_ms']} мс > {args.max_p99_ms} мс")
+    lag = report['loop_lag']
+    if args.max_loop_lag_ms is not None and lag and lag['p99_ms'] > args.max_loop_lag_ms:
+        problems.append(f"p99 задержки цикла событий: {lag['p99_ms']} мс > {args.max_loop_lag_ms} мс")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн нагрузочный тест пути событий WebSocket")
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд нагрузки")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate", action="append", help="тема=сообщений_в_секунду, можно несколько раз")
+    parser.add_argument("--replay", help="JSONL с записанными сообщениями pybit для проигрывания")
+    parser.add_argument("--output", help="куда сохранить отчёт JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="порог p99 сквозной задержки по любой теме")
+    parser.add_argument("--max-loop-lag-ms", type=float, help="порог p99 задержки цикла событий")
+    parser.add_argument("--stub-trigger", action="store_true",
+                        help="заменить LIQUIDATION_TRIGGER пустышкой (без окна, debounce и cooldown)")
+    parser.add_argument("--persist-liquidations", action="store_true",
+                        help="писать ликвидации нагрузки на диск, как в боевом режиме")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load_test(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    problems = _regressions(report, args)
+    for problem in problems:
+        print(f"❌ {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,41 @@
 # main.py
 import asyncio
+import logging
 import sys
 import os
 from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Worker переходит в свой каталог состояния раньше импорта остальных utils.*: логгер utils.helpers
+# открывает файл логов при импорте, и без этого все worker'ы писали бы в один файл
+from utils.state_dir import BOT_MODE, BOT_MODE_HUB, BOT_MODE_WORKER, enter_worker_state_dir
+if __name__ == "__main__" and BOT_MODE == BOT_MODE_WORKER:
+    try:
+        _STATE_DIR_LOCK = enter_worker_state_dir()  # блокировка держится до выхода процесса
+    except RuntimeError as e:
+        sys.exit(f"❌ {e}")
+
 from tools.bybit_wrapper import BybitWrapper
 from utils.globals import initialize_global_services
 from utils.deepseek_client import DeepSeekClient
 from config import DEEPSEEK_CHAT_MODEL, BYBIT_API_KEY, BYBIT_API_SECRET
 from utils.helpers import logger
+from utils.tool_selector import note_position_update
+from utils.tool_worker_pool import shutdown_tool_worker_pool
+from utils.transcript_archive import shutdown_transcript_archive
+from utils.tool_registry import get_tool_registry
+from utils.candle_store import get_candle_store
+from utils.indicator_engine import get_indicator_engine
+from utils.event_dispatcher import get_event_dispatcher
+from utils.ws_supervisor import RecentIds, WebSocketSupervisor
+from utils.async_logging import setup_async_logging, shutdown_async_logging, console
+from utils.candle_store import TIMEFRAME_MS, BYBIT_INTERVAL_TO_TIMEFRAME
+from utils.bybit_async_client import get_bybit_async_client
+from utils.decision_latency import get_decision_tracker, TRIGGER_CANDLE, TRIGGER_LIQUIDATION
+from utils.event_triggers import get_liquidation_trigger
+from utils.market_data_hub import MarketDataHub, MarketDataHubClient
+from utils.run_mode import BOT_RUN_MODE, orders_blocked
 
 # Импортируем асинхронный WebSocket напрямую
 from pybit.unified_trading import WebSocket
@@ -18,61 +43,148 @@ from pybit.unified_trading import WebSocket
 # --- ГЛОБАЛЬНАЯ ПЕРЕМЕННАЯ ДЛЯ ХРАНЕНИЯ ЦИКЛА СОБЫТИЙ ---
 MAIN_EVENT_LOOP = None
 
-# --- СИНХРОННЫЕ ОБРАБОТЧИКИ ДЛЯ PYBIT (для приватных и других публичных данных) ---
+# --- ДИСПЕТЧЕР СОБЫТИЙ WEBSOCKET (буфер на тему, доставка пачками) ---
+EVENT_DISPATCHER = get_event_dispatcher()
+
+# --- ТРИГГЕР ВНЕПЛАНОВОГО АНАЛИЗА ПО КАСКАДУ ЛИКВИДАЦИЙ ---
+LIQUIDATION_TRIGGER = get_liquidation_trigger()
+
+# --- КЛИЕНТ BYBIT (BybitWrapper с ccxt-сессией и асинхронным REST-клиентом) ---
+BYBIT_CLIENT = None
+
+# Торгуемая пара и таймфрейм свечей потока (таймфрейм — ключ TIMEFRAME_MS: '5m', '15m', '1h', ...)
+SYMBOL = os.getenv("BOT_SYMBOL", "DOGEUSDT")
+CANDLE_TIMEFRAME = os.getenv("CANDLE_TIMEFRAME", "15m")
+# Незакрытая свеча обновляется каждые 1-2 секунды — это пульс публичного потока
+KLINE_MAX_SILENCE = 60
+# pybit отправляет ping каждые 20 с: три пропущенных ответа — соединение считается мёртвым
+PRIVATE_HEARTBEAT_TIMEOUT = 60
+# Исполнения, уже переданные обработчику (для отсева повторов после догрузки)
+SEEN_EXECUTIONS = RecentIds()
+
+# --- СИНХРОННЫЕ ОБРАБОТЧИКИ ДЛЯ PYBIT (вызываются в потоке WebSocket) ---
+# Обработчики только передают сообщение в EventDispatcher: без печати и без перехода в цикл событий
+# на каждое сообщение. Пачки сообщений обрабатываются асинхронными обработчиками ниже.
 
 def handle_position_sync(message):
     """Синхронный обработчик позиций."""
-    # Если нужно обновлять состояние позиции в реальном времени вне основного цикла ИИ
-    # можно использовать asyncio.run_coroutine_threadsafe здесь
-    # Но для логики "ждать до следующей 15-минутной отметки" это может быть не нужно.
-    # Пока что просто логируем.
-    print(f"🔄 Обновление позиции: {message.get('data', [])[:1]}") # Печатаем первые элементы, если есть
+    PRIVATE_SUPERVISOR.note_message('position', message)
+    EVENT_DISPATCHER.publish('position', message)
 
 def handle_order_sync(message):
     """Синхронный обработчик ордеров."""
-    print(f"🔄 Обновление ордера: {message.get('data', [])[:1]}")
+    PRIVATE_SUPERVISOR.note_message('order', message)
+    EVENT_DISPATCHER.publish('order', message)
 
 def handle_execution_sync(message):
     """Синхронный обработчик исполнений."""
-    print(f"✅ Исполнение: {message.get('data', [])[:1]}")
+    PRIVATE_SUPERVISOR.note_message('execution', message)
+    EVENT_DISPATCHER.publish('execution', message)
 
 def handle_wallet_sync(message):
     """Синхронный обработчик кошелька."""
-    print(f"💰 Обновление кошелька: {message.get('data', {})}")
+    PRIVATE_SUPERVISOR.note_message('wallet', message)
+    EVENT_DISPATCHER.publish('wallet', message)
+
+# --- АСИНХРОННЫЕ ОБРАБОТЧИКИ ПАЧЕК (выполняются в цикле событий) ---
+
+async def _handle_position_batch(positions):
+    """Получает только последнее состояние каждой позиции (symbol, positionIdx)."""
+    # Запоминаем открытые позиции для отбора инструментов
+    note_position_update({'data': positions})
+    console(f"🔄 Обновление позиций: {positions[:1]}", topic='position', count=len(positions))
+
+async def _handle_order_batch(messages):
+    # Подтверждения ордеров, выставленных инструментами, закрывают замер задержки решения
+    get_decision_tracker().on_order_messages(messages)
+    # Одна строка на пачку: вывод не должен расти вместе с потоком сообщений
+    orders = [order for message in messages for order in message.get('data') or []]
+    if orders:
+        console(f"🔄 Обновления ордеров: {len(orders)}, последнее: {orders[-1]}", topic='order', count=len(orders))
+
+async def _handle_execution_batch(messages):
+    # Догрузка после переподключения пересекается с потоком: повторные execId отбрасываются
+    for message in messages:
+        message['data'] = [execution for execution in message.get('data') or []
+                           if not execution.get('execId') or SEEN_EXECUTIONS.add(execution['execId'])]
+    get_decision_tracker().on_execution_messages(messages)
+    executions = [execution for message in messages for execution in message.get('data') or []]
+    if executions:
+        console(f"✅ Исполнения: {len(executions)}, последнее: {executions[-1]}",
+                topic='execution', count=len(executions))
+
+async def _handle_wallet_batch(accounts):
+    """Получает только последнее состояние каждого типа аккаунта."""
+    console(f"💰 Обновление кошелька: {accounts}", topic='wallet')
+
+async def _handle_liquidation_batch(messages):
+    handled = []
+    for message in messages:
+        handled.extend(await _handle_all_liquidation_async(message))
+    if not handled:
+        return
+    # Итог пачки одной строкой (через очередь логирования, с ограничением частоты)
+    last = handled[-1]
+    timestamp = last.get('T')
+    readable_time = format_readable_time(timestamp) if timestamp else 'Н/Д'
+    sides = {}
+    for liquidation in handled:
+        side = liquidation.get('S', 'Н/Д')
+        sides[side] = sides.get(side, 0) + 1
+    console(f"🔥 Ликвидации: {len(handled)} {sides}, последняя: {last.get('s', 'Н/Д')} {last.get('S', 'Н/Д')} "
+            f"{last.get('v', 'Н/Д')} по {last.get('p', 'Н/Д')} в {readable_time}",
+            topic='liquidation', count=len(handled), sides=sides)
+
+async def _handle_kline_gap_batch(gaps):
+    """Догружает через REST свечи, пропущенные потоком (отложенные свечи добавятся после них)."""
+    for gap in gaps:
+        logger.warning(f"🕳️ Пропуск свечей {gap['symbol']} {gap['timeframe']} с {gap['since']}, догрузка через REST")
+        try:
+            await _backfill_klines(gap['symbol'], gap['timeframe'], gap['since'])
+        except Exception as e:
+            logger.error(f"❌ Не удалось догрузить свечи {gap['symbol']} {gap['timeframe']}: {e}")
+            # Отложенные свечи всё равно добавляем, чтобы кэш не застыл
+            get_candle_store().resolve_gap(gap['symbol'], gap['timeframe'], [])
+
+# --- ОБРАБОТЧИК СВЕЧЕЙ ---
+
+def handle_kline_sync(message):
+    """Синхронный обработчик свечей: закрытые свечи добавляются в кэш, индикаторы пересчитываются инкрементально."""
+    PUBLIC_SUPERVISOR.note_message('kline', message)
+    gaps = get_candle_store().append_kline_message(message)
+    if gaps:
+        EVENT_DISPATCHER.publish('kline_gap', {'data': [
+            {'symbol': symbol, 'timeframe': timeframe, 'since': since} for symbol, timeframe, since in gaps
+        ]})
 
 # --- ОБРАБОТЧИКИ ЛИКВИДАЦИЙ ---
 
 def handle_all_liquidation_sync(message):
     """Синхронный обработчик всех ликвидаций (точка входа для pybit)."""
-    # Используем глобальный цикл событий, который будет установлен в main
-    global MAIN_EVENT_LOOP
-    if MAIN_EVENT_LOOP:
-        # Создаем задачу для асинхронной функции
-        asyncio.run_coroutine_threadsafe(_handle_all_liquidation_async(message), MAIN_EVENT_LOOP)
-    else:
-        logger.warning("handle_all_liquidation_sync: Цикл событий НЕ НАЙДЕН (MAIN_EVENT_LOOP is None). Событие НЕ обработано.")
+    PUBLIC_SUPERVISOR.note_message('liquidation', message)
+    if BOT_MODE == BOT_MODE_HUB:
+        MARKET_HUB.publish('liquidation', message)
+        return
+    EVENT_DISPATCHER.publish('liquidation', message)
 
-async def _handle_all_liquidation_async(message):
-    """Внутренняя асинхронная логика для обработки ликвидаций."""
+def _save_liquidation(liquidation: dict, symbol: str):
+    """Сохраняет ликвидацию в JSON файл (функция из старого файла). Нагрузочный стенд подменяет её заглушкой."""
+    from websocet.handlers.liquidations import save_liquidation_to_file
+    save_liquidation_to_file(liquidation, symbol)
+
+async def _handle_all_liquidation_async(message) -> list:
+    """Внутренняя асинхронная логика для обработки ликвидаций. Возвращает обработанные ликвидации."""
     topic = message.get('topic')
     liquidations_list = message.get('data', [])
     if topic and liquidations_list:
         for liquidation in liquidations_list:
-            timestamp = liquidation.get('T', 'Н/Д')
             liq_symbol = liquidation.get('s', 'Н/Д')
-            side = liquidation.get('S', 'Н/Д')
-            volume = liquidation.get('v', 'Н/Д')
-            price = liquidation.get('p', 'Н/Д')
 
-            # Выводим информацию в консоль
-            readable_time = format_readable_time(timestamp) if timestamp != 'Н/Д' else 'Н/Д'
-            print(f"🔥 Ликвидация: {liq_symbol} {side} {volume} по {price} в {readable_time}")
+            # Сохраняем ликвидацию в JSON файл
+            _save_liquidation(liquidation, liq_symbol)
 
-            # Сохраняем ликвидацию в JSON файл (используем функцию из старого файла)
-            # Предположим, функция save_liquidation_to_file находится в utils или в handlers
-            # Импортируем её
-            from websocet.handlers.liquidations import save_liquidation_to_file
-            save_liquidation_to_file(liquidation, liq_symbol)
+            # Учитываем ликвидацию в триггере внепланового анализа
+            LIQUIDATION_TRIGGER.on_liquidation(liquidation)
 
             # (Опционально) Отправить событие в event_queue, если другие части системы его слушают
             # await event_queue.put({
@@ -86,6 +198,24 @@ async def _handle_all_liquidation_async(message):
             #         'readable_time': readable_time
             #     }
             # })
+        return liquidations_list
+    return []
+
+
+def _register_event_topics():
+    """Регистрирует темы диспетчера. Позиции и кошелёк схлопываются до последнего состояния по ключу."""
+    EVENT_DISPATCHER.register('liquidation', _handle_liquidation_batch)
+    EVENT_DISPATCHER.register('order', _handle_order_batch)
+    EVENT_DISPATCHER.register('execution', _handle_execution_batch)
+    EVENT_DISPATCHER.register(
+        'position', _handle_position_batch,
+        coalesce_key=lambda item: (item.get('symbol'), item.get('positionIdx'))
+    )
+    EVENT_DISPATCHER.register('wallet', _handle_wallet_batch, coalesce_key=lambda item: item.get('accountType'))
+    EVENT_DISPATCHER.register(
+        'kline_gap', _handle_kline_gap_batch,
+        coalesce_key=lambda item: (item['symbol'], item['timeframe'])
+    )
 
 
 # --- ФУНКЦИЯ ФОРМАТИРОВАНИЯ ВРЕМЕНИ (копируем из старого файла или utils) ---
@@ -97,121 +227,311 @@ def format_readable_time(timestamp_ms):
     return dt.strftime('%d.%m.%Y %H:%M')
 
 
-async def main():
-    global MAIN_EVENT_LOOP # <-- Объявляем, что будем использовать глобальную переменную
-    MAIN_EVENT_LOOP = asyncio.get_running_loop() # <-- Сохраняем текущий цикл событий
-    print(f"✅ Цикл событий сохранён в MAIN_EVENT_LOOP.")
-
-    # === ИНИЦИАЛИЗАЦИЯ BYBIT И ГЛОБАЛЬНЫХ СЕРВИСОВ ===
+def _close_websockets(public_ws, private_ws):
+    console("🧹 Закрытие соединений WebSocket...")
     try:
-        print("🔧 Инициализация BybitWrapper и глобальных сервисов...")
-        bybit_client = BybitWrapper()
-        initialize_global_services(bybit_client.ccxt_session, bybit_client)
-        print("✅ Глобальные сервисы инициализированы")
+        if public_ws:
+            public_ws.exit()
+            console("✅ Публичный поток закрыт.")
     except Exception as e:
-        logger.error(f"❌ Ошибка инициализации: {e}")
-        return
-
-    # === ИНИЦИАЛИЗАЦИЯ КЛИЕНТА ===
+        logger.error(f"❌ Ошибка при закрытии публичного потока: {e}")
     try:
-        client = DeepSeekClient()
-        logger.info(f"Клиент DeepSeek инициализирован с моделью: {DEEPSEEK_CHAT_MODEL}")
+        if private_ws:
+            private_ws.exit()
+            console("✅ Приватный поток закрыт.")
     except Exception as e:
-        logger.error(f"❌ Не удалось инициализировать клиента DeepSeek: {e}")
+        logger.error(f"❌ Ошибка при закрытии приватного потока: {e}")
+
+
+# --- ИНИЦИАЛИЗАЦИЯ (выполняется в потоках параллельно, т.к. конструкторы блокирующие) ---
+
+WS_READY_TIMEOUT = 10  # секунд на установку соединения WebSocket
+
+
+def _init_bybit_services():
+    """Создаёт BybitWrapper и инициализирует глобальные сервисы."""
+    bybit_client = BybitWrapper()
+    # Асинхронный REST-клиент без переходов в потоки доступен инструментам через BybitWrapper
+    bybit_client.async_http = get_bybit_async_client()
+    initialize_global_services(bybit_client.ccxt_session, bybit_client)
+    return bybit_client
+
+
+TIMEFRAME_TO_BYBIT_INTERVAL = {timeframe: interval for interval, timeframe in BYBIT_INTERVAL_TO_TIMEFRAME.items()}
+
+
+async def _load_candle_history(symbol: str = SYMBOL, timeframe: str = CANDLE_TIMEFRAME, limit: int = 500):
+    """Заполняет кэш свечей историей через REST, чтобы индикаторы были готовы сразу после старта."""
+    rows = await get_bybit_async_client().fetch_klines(symbol, TIMEFRAME_TO_BYBIT_INTERVAL[timeframe], limit=limit)
+    # Последняя свеча ещё не закрыта
+    get_candle_store().load_history(symbol, timeframe, rows[:-1])
+    console(f"✅ История свечей {symbol} {timeframe} загружена: {len(rows) - 1}")
+
+
+async def _backfill_klines(symbol: str, timeframe: str, since_ms: int):
+    rows = await get_bybit_async_client().fetch_klines(
+        symbol, TIMEFRAME_TO_BYBIT_INTERVAL[timeframe], start_ms=since_ms, limit=1000
+    )
+    now_ms = int(datetime.now().timestamp() * 1000)
+    closed = [row for row in rows if row[0] + TIMEFRAME_MS[timeframe] <= now_ms]
+    get_candle_store().resolve_gap(symbol, timeframe, closed)
+    logger.info(f"✅ Догружено свечей {symbol} {timeframe}: {len(closed)}")
+
+
+async def _backfill_public(disconnected_at: float):
+    """После переподключения публичного потока догружает закрытые свечи с момента последней сохранённой."""
+    series = get_candle_store().get(SYMBOL, CANDLE_TIMEFRAME)
+    if series is None or not len(series):
+        await _load_candle_history()
         return
+    await _backfill_klines(SYMBOL, CANDLE_TIMEFRAME, series.last_timestamp() + TIMEFRAME_MS[CANDLE_TIMEFRAME])
+
+
+async def _backfill_private(disconnected_at: float):
+    """После переподключения приватного потока догружает пропущенные исполнения и передаёт их обработчику."""
+    # /v5/execution/list отдаёт исполнения в том же формате, что и execution_stream; поток приватных данных
+    # охватывает весь аккаунт, поэтому и догрузка — по всей категории, без фильтра по символу
+    executions = await get_bybit_async_client().fetch_executions(start_ms=int(disconnected_at * 1000))
+    if not executions:
+        return
+    executions.reverse()  # REST отдаёт от новых к старым, поток — в хронологическом порядке
+    logger.info(f"✅ Догружено исполнений после переподключения: {len(executions)}")
+    EVENT_DISPATCHER.publish('execution', {'topic': 'execution', 'backfill': True, 'data': executions})
+
 
-    print("--- Bybit Bot с DeepSeek и инструментами (ОДНОМОДЕЛЬНЫЙ АВТОНОМНЫЙ РЕЖИМ) ---")
-    print("Запускается режим ожидания по таймеру (следующая 15-минутная отметка)...")
-    print("Для остановки нажмите Ctrl+C")
-    print("----------------------------")
+def _create_public_ws():
+    return WebSocket(
+        testnet=False,
+        channel_type="linear",
+        # ping_interval=20,
+        # ping_timeout=10,
+        # restart_on_error=True,
+        # retries=10
+    )
 
-    # === ИНИЦИАЛИЗАЦИЯ ВЕБСОКЕТА ===
-    print("🔌 Подключение к публичному и приватному потокам (асинхронно)...")
+
+def _subscribe_public(public_ws):
+    # --- ПОДПИСКИ НА ПУБЛИЧНЫЕ ДАННЫЕ ---
+    try:
+        public_ws.all_liquidation_stream(SYMBOL, handle_all_liquidation_sync) # Передаём синхронный обработчик
+        console(f"✅ Подписка на ликвидации {SYMBOL} выполнена")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при подписке на ликвидации: {e}")
     try:
-        # --- ПУБЛИЧНЫЙ ВЕБСОКЕТ ---
-        public_ws = WebSocket(
-            testnet=False,
-            channel_type="linear",
-            # Убираем подписку на kline.15.DOGEUSDT
-            # ping_interval=20,
-            # ping_timeout=10,
-            # restart_on_error=True,
-            # retries=10
-        )
-        await asyncio.sleep(2) # Асинхронный sleep
-        print("✅ Публичный поток подключен.")
-
-        # --- ПОДПИСКИ НА ПУБЛИЧНЫЕ ДАННЫЕ (БЕЗ СВЕЧЕЙ) ---
-        # Подписка на ликвидации
+        interval = TIMEFRAME_TO_BYBIT_INTERVAL[CANDLE_TIMEFRAME]
+        public_ws.kline_stream(interval, SYMBOL, handle_kline_sync)
+        console(f"✅ Подписка на свечи kline.{interval}.{SYMBOL} выполнена")
+    except Exception as e:
+        logger.error(f"❌ Ошибка при подписке на свечи: {e}")
+
+
+def _create_private_ws():
+    return WebSocket(
+        testnet=False,
+        channel_type="private",
+        api_key=BYBIT_API_KEY,
+        api_secret=BYBIT_API_SECRET,
+        # ping_interval=20,
+        # ping_timeout=10,
+        # restart_on_error=True,
+        # retries=10
+    )
+
+
+def _subscribe_private(private_ws):
+    # Подписки на приватные данные
+    subscriptions = [
+        ("позиций", private_ws.position_stream, handle_position_sync),
+        ("ордеров", private_ws.order_stream, handle_order_sync),
+        ("исполнений", private_ws.execution_stream, handle_execution_sync),
+        ("кошелька", private_ws.wallet_stream, handle_wallet_sync),
+    ]
+    for label, subscribe, handler in subscriptions:
         try:
-            public_ws.all_liquidation_stream('DOGEUSDT', handle_all_liquidation_sync) # Передаём синхронный обработчик
-            print("✅ Подписка на ликвидации DOGEUSDT выполнена")
+            subscribe(handler)  # Передаём синхронный обработчик
+            console(f"✅ Подписка на поток {label} выполнена")
         except Exception as e:
-            logger.error(f"❌ Ошибка при подписке на ликвидации: {e}")
+            logger.error(f"❌ Ошибка при подписке на поток {label}: {e}")
 
-        # Подписка на другие публичные данные (например, тикеры, если нужно)
-        # public_ws.ticker_stream('DOGEUSDT', handle_ticker_sync)
-        # print("✅ Подписка на тикер DOGEUSDT выполнена")
 
-    except Exception as e:
-        logger.error(f"❌ Ошибка при подключении публичного WebSocket: {e}")
-        return # Если публичный не подключился, дальше смысла нет
+# --- СУПЕРВИЗОРЫ СОЕДИНЕНИЙ (пульс, переподключение с задержкой, догрузка через REST) ---
+PUBLIC_SUPERVISOR = WebSocketSupervisor("Публичный поток", _create_public_ws, _subscribe_public, _backfill_public)
+PUBLIC_SUPERVISOR.add_stream('kline', max_silence=KLINE_MAX_SILENCE)
+PUBLIC_SUPERVISOR.add_stream('liquidation')
 
-    # --- ПРИВАТНЫЕ ДАННЫЕ ---
-    private_ws = None
-    if BYBIT_API_KEY and BYBIT_API_SECRET and BYBIT_API_KEY != "YOUR_API_KEY":
-        print("🔐 Подключение к приватному потоку...")
-        try:
-            private_ws = WebSocket(
-                testnet=False,
-                channel_type="private",
-                api_key=BYBIT_API_KEY,
-                api_secret=BYBIT_API_SECRET,
-                # ping_interval=20,
-                # ping_timeout=10,
-                # restart_on_error=True,
-                # retries=10
-            )
-            await asyncio.sleep(2) # Асинхронный sleep
-            print("✅ Приватный поток подключен.")
-
-            # Подписки на приватные данные
-            try:
-                private_ws.position_stream(handle_position_sync) # Передаём синхронный обработчик
-                print("✅ Подписка на поток позиций выполнена")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при подписке на позиции: {e}")
+# Приватные потоки молчат, пока нет сделок, — их живость проверяется по ответам на ping
+PRIVATE_SUPERVISOR = WebSocketSupervisor("Приватный поток", _create_private_ws, _subscribe_private, _backfill_private,
+                                         heartbeat_timeout=PRIVATE_HEARTBEAT_TIMEOUT)
+for _stream in ('position', 'order', 'execution', 'wallet'):
+    PRIVATE_SUPERVISOR.add_stream(_stream)
 
-            try:
-                private_ws.order_stream(handle_order_sync) # Передаём синхронный обработчик
-                print("✅ Подписка на поток ордеров выполнена")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при подписке на ордера: {e}")
 
-            try:
-                private_ws.execution_stream(handle_execution_sync) # Передаём синхронный обработчик
-                print("✅ Подписка на поток исполнений выполнена")
-            except Exception as e:
-                logger.error(f"❌ Ошибка при подписке на исполнения: {e}")
+# --- ХАБ РЫНОЧНЫХ ДАННЫХ (BOT_MODE=hub раздаёт публичные потоки, BOT_MODE=worker их получает) ---
+# Каждый worker запускается со своим BOT_STATE_DIR (например, BOT_STATE_DIR=state/account-1):
+# журнал цикла, архив, расход за день и логи пишутся туда. Без него или в занятом каталоге worker не стартует.
+MARKET_HUB = MarketDataHub()
 
+
+def _handle_hub_message(topic: str, message: dict):
+    """Сообщения публичных потоков от хаба идут в те же темы диспетчера, что и от собственного WebSocket."""
+    EVENT_DISPATCHER.publish(topic, message)
+
+
+HUB_CLIENT = MarketDataHubClient(_handle_hub_message)
+
+
+def get_stream_metrics() -> dict:
+    if BOT_MODE == BOT_MODE_WORKER:
+        return {'hub': HUB_CLIENT.metrics(), 'private': PRIVATE_SUPERVISOR.metrics()}
+    return {'public': PUBLIC_SUPERVISOR.metrics(), 'private': PRIVATE_SUPERVISOR.metrics()}
+
+
+async def _wait_ws_ready(ws, name: str, timeout: float = WS_READY_TIMEOUT):
+    """Ждёт фактического подключения WebSocket вместо фиксированной паузы."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not ws.is_connected():
+        if loop.time() >= deadline:
+            # Иначе поток pybit продолжит переподключаться в фоне без владельца
             try:
-                private_ws.wallet_stream(handle_wallet_sync) # Передаём синхронный обработчик
-                print("✅ Подписка на поток кошелька выполнена")
+                await asyncio.to_thread(ws.exit)
             except Exception as e:
-                logger.error(f"❌ Ошибка при подписке на кошелек: {e}")
+                logger.warning(f"⚠️ Не удалось закрыть {name}: {e}")
+            raise TimeoutError(f"{name} не подключился за {timeout} с")
+        await asyncio.sleep(0.05)
 
-        except Exception as e:
-            logger.error(f"❌ Не удалось подключиться или подписаться на приватный поток: {e}")
-            private_ws = None
+
+async def _connect_public_ws():
+    if BOT_MODE == BOT_MODE_WORKER:
+        console("📡 Режим worker: публичные данные поступают от хаба, собственный публичный поток не нужен.")
+        return None
+    public_ws = await asyncio.to_thread(_create_public_ws)
+    await _wait_ws_ready(public_ws, "Публичный поток")
+    console("✅ Публичный поток подключен.")
+    # Подписки оформляются после загрузки истории свечей
+    return public_ws
+
+
+def _private_keys_configured() -> bool:
+    return bool(BYBIT_API_KEY and BYBIT_API_SECRET and BYBIT_API_KEY != "YOUR_API_KEY")
+
+
+async def _connect_private_ws():
+    if not _private_keys_configured():
+        console("⚠️ API ключи не установлены или имеют значения по умолчанию. Приватный поток пропущен.", level=logging.WARNING)
+        return None
+
+    console("🔐 Подключение к приватному потоку...")
+    try:
+        private_ws = await asyncio.to_thread(_create_private_ws)
+        await _wait_ws_ready(private_ws, "Приватный поток")
+        console("✅ Приватный поток подключен.")
+    except Exception as e:
+        logger.error(f"❌ Не удалось подключиться или подписаться на приватный поток: {e}")
+        return None
+
+    await asyncio.to_thread(_subscribe_private, private_ws)
+    return private_ws
+
+
+def _log_background_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.warning(f"⚠️ Ошибка фоновой задачи: {task.exception()}")
+
+
+async def main():
+    global MAIN_EVENT_LOOP # <-- Объявляем, что будем использовать глобальную переменную
+    global BYBIT_CLIENT
+    setup_async_logging()
+    MAIN_EVENT_LOOP = asyncio.get_running_loop() # <-- Сохраняем текущий цикл событий
+    console(f"✅ Цикл событий сохранён в MAIN_EVENT_LOOP.")
+    if orders_blocked():
+        console(f"🧪 BOT_RUN_MODE={BOT_RUN_MODE}: ордера и изменения аккаунта на биржу не отправляются")
+    _register_event_topics()
+    EVENT_DISPATCHER.start(MAIN_EVENT_LOOP)
+
+    # Движок индикаторов подписывается на кэш свечей до поступления первых данных
+    get_indicator_engine()
+    from tools.cached_indicators_tool import CachedIndicatorsTool
+    from tools.pattern_statistics_tool import PatternStatisticsTool
+    from tools.positions_tool import PositionsTool
+    from tools.open_orders_tool import OpenOrdersTool
+    from tools.executions_tool import ExecutionsTool
+    get_tool_registry().register_factory("get_cached_indicators", CachedIndicatorsTool)
+    # Частые запросы к аккаунту идут через асинхронный клиент aiohttp и заменяют одноимённые встроенные
+    get_tool_registry().register_factory("get_positions", PositionsTool)
+    get_tool_registry().register_factory("get_open_orders", OpenOrdersTool)
+    get_tool_registry().register_factory("get_executions", ExecutionsTool)
+    # CPU-тяжёлый инструмент (cpu_bound): выполняется в пуле процессов utils.tool_worker_pool
+    get_tool_registry().register_factory("get_pattern_statistics", PatternStatisticsTool)
+
+    # === ПАРАЛЛЕЛЬНАЯ ИНИЦИАЛИЗАЦИЯ BYBIT, ПУБЛИЧНОГО И ПРИВАТНОГО ПОТОКОВ ===
+    console("🔧 Инициализация BybitWrapper, глобальных сервисов и WebSocket (параллельно)...")
+    bybit_result, public_result, private_result = await asyncio.gather(
+        asyncio.to_thread(_init_bybit_services),
+        _connect_public_ws(),
+        _connect_private_ws(),
+        return_exceptions=True
+    )
+    public_ws = None if isinstance(public_result, BaseException) else public_result
+    private_ws = None if isinstance(private_result, BaseException) else private_result
+
+    if isinstance(bybit_result, BaseException):
+        logger.error(f"❌ Ошибка инициализации: {bybit_result}")
+        _close_websockets(public_ws, private_ws)
+        return
+    BYBIT_CLIENT = bybit_result
+    console("✅ Глобальные сервисы инициализированы")
+
+    if isinstance(public_result, BaseException):
+        logger.error(f"❌ Ошибка при подключении публичного WebSocket: {public_result}")
+        _close_websockets(public_ws, private_ws)
+        return # Если публичный не подключился, дальше смысла нет
+
+    if BOT_MODE == BOT_MODE_WORKER:
+        # === КЭШ СВЕЧЕЙ: снимок и закрытые свечи приходят от хаба ===
+        await HUB_CLIENT.start()
     else:
-        print("⚠️ API ключи не установлены или имеют значения по умолчанию. Приватный поток пропущен.")
+        # === КЭШ СВЕЧЕЙ: история, затем подписка на публичные потоки ===
+        try:
+            await _load_candle_history()
+        except Exception as e:
+            logger.error(f"❌ Не удалось загрузить историю свечей: {e}")
+        await asyncio.to_thread(_subscribe_public, public_ws)
+
+    # === КОНТРОЛЬ СОЕДИНЕНИЙ ===
+    if public_ws:
+        await PUBLIC_SUPERVISOR.start(public_ws)
+    if private_ws or _private_keys_configured():
+        # Если при старте приватный поток не подключился, супервизор переподключает его в фоне
+        await PRIVATE_SUPERVISOR.start(private_ws)
+
+    # === ИНИЦИАЛИЗАЦИЯ КЛИЕНТА ===
+    try:
+        client = DeepSeekClient()
+        logger.info(f"Клиент DeepSeek инициализирован с моделью: {DEEPSEEK_CHAT_MODEL}")
+    except Exception as e:
+        logger.error(f"❌ Не удалось инициализировать клиента DeepSeek: {e}")
+        _close_websockets(public_ws, private_ws)
+        return
 
-    print("🟢 Все слушатели WebSocket запущены. Ожидание данных...")
-    print("Нажмите Ctrl+C для остановки.")
+    # Инструменты прогреваются в фоне, не задерживая готовность бота
+    tools_warm_up = asyncio.create_task(asyncio.to_thread(client.tool_registry.warm_up))
+    tools_warm_up.add_done_callback(_log_background_error)
+
+    console("--- Bybit Bot с DeepSeek и инструментами (ОДНОМОДЕЛЬНЫЙ АВТОНОМНЫЙ РЕЖИМ) ---")
+    console("Запускается режим ожидания по таймеру (следующая 15-минутная отметка)...")
+    console("Для остановки нажмите Ctrl+C")
+    console("----------------------------")
+
+    console("🟢 Все слушатели WebSocket запущены. Ожидание данных...")
+    console("Нажмите Ctrl+C для остановки.")
 
     # === ЦИКЛ РАБОТЫ С ИИ ПО ТАЙМЕРУ ===
     should_wait_for_time = True # <-- НОВОЕ: флаг для ожидания времени
     next_analysis_time = None # <-- Время следующего запуска анализа
+    trigger_context = None # <-- Данные срабатывания триггера ликвидаций (внеплановый запуск)
+    event_at = None # <-- Время рыночного события, с которого отсчитывается задержка решения
 
     try:
         while True:
@@ -241,33 +561,45 @@ async def main():
                     else:
                         next_analysis_time = current_time.replace(minute=next_minute, second=0, microsecond=0)
 
-                    print(f"⏳ Следующий запуск анализа ИИ запланирован на {next_analysis_time.strftime('%H:%M:%S')}")
+                    console(f"⏳ Следующий запуск анализа ИИ запланирован на {next_analysis_time.strftime('%H:%M:%S')}")
 
-                # Ждём наступления времени
+                # Ждём наступления времени или срабатывания триггера ликвидаций
+                trigger_context = None
                 time_to_sleep = (next_analysis_time - current_time).total_seconds()
                 if time_to_sleep > 0:
-                    print(f"💤 Ожидание до {next_analysis_time.strftime('%H:%M:%S')} (~{time_to_sleep:.1f} секунд)...")
+                    console(f"💤 Ожидание до {next_analysis_time.strftime('%H:%M:%S')} (~{time_to_sleep:.1f} секунд)...")
                     # Ждём до наступления времени, проверяя прерывание каждые 10 секунд
                     while time_to_sleep > 0:
-                        sleep_duration = min(10, time_to_sleep)
-                        await asyncio.sleep(sleep_duration)
-                        time_to_sleep -= sleep_duration
+                        trigger_context = await LIQUIDATION_TRIGGER.wait(min(10, time_to_sleep))
+                        if trigger_context is not None:
+                            console(f"⚡ Внеплановый запуск анализа: {trigger_context['liquidations']} ликвидаций "
+                                  f"на {trigger_context['notional_usdt']:,.0f} USDT, "
+                                  f"смещение цены {trigger_context['price_displacement_pct']:+.2f}%")
+                            break # Плановый запуск остаётся в расписании
                         current_time = datetime.now()
-                        if current_time >= next_analysis_time:
-                            print(f"⏰ Время {next_analysis_time.strftime('%H:%M:%S')} наступило. Готовимся к запуску ИИ.")
+                        time_to_sleep = (next_analysis_time - current_time).total_seconds()
+                        if time_to_sleep <= 0:
+                            console(f"⏰ Время {next_analysis_time.strftime('%H:%M:%S')} наступило. Готовимся к запуску ИИ.")
                             break # Выходим из внутреннего цикла ожидания
                 else:
                     # Это может случиться, если вычисления заняли немного времени и текущее время уже >= next_analysis_time
-                    print(f"⏰ Время {next_analysis_time.strftime('%H:%M:%S')} уже наступило (по расчёту). Продолжаем.")
+                    console(f"⏰ Время {next_analysis_time.strftime('%H:%M:%S')} уже наступило (по расчёту). Продолжаем.")
 
                 # Сбрасываем флаг ожидания, чтобы запустить анализ
                 should_wait_for_time = False
-                # Сбрасываем время, чтобы при следующем вхождении в `if should_wait_for_time` оно пересчиталось
-                next_analysis_time = None
+                if trigger_context is None:
+                    # Событие — закрытие свечи в плановую отметку
+                    event_at = next_analysis_time.timestamp()
+                    # Сбрасываем время, чтобы при следующем вхождении в `if should_wait_for_time` оно пересчиталось
+                    next_analysis_time = None
+                else:
+                    last_liquidation_ts = trigger_context.get('last_liquidation_ts')
+                    event_at = int(last_liquidation_ts) / 1000 if last_liquidation_ts else datetime.now().timestamp()
 
             # Если флаг ожидания сброшен, запускаем анализ
             if not should_wait_for_time:
-                print("🤖 Запуск ПОЛНОГО цикла анализа ИИ...")
+                logger.info(f"📡 Метрики потоков: {get_stream_metrics()}")
+                console("🤖 Запуск ПОЛНОГО цикла анализа ИИ...")
                 # Подготовим фиктивную информацию о свече или None
                 # Так как мы не ждём конкретную свечу, передаём None или минимальные данные
                 # Важно, чтобы run_full_analysis_cycle_until_wait мог работать без конкретных данных свечи,
@@ -276,8 +608,8 @@ async def main():
                 # Лучше всего передать None, если в run_full_analysis_cycle_until_wait обработка None предусмотрена.
                 # Если нет, можно передать минимальный словарь, например:
                 fake_candle_info = {
-                    'symbol': 'DOGEUSDT',
-                    'interval': '15m', # Указываем, что это "ожидаемый" интервал
+                    'symbol': SYMBOL,
+                    'interval': CANDLE_TIMEFRAME, # Указываем, что это "ожидаемый" интервал
                     'open': 0.0,
                     'high': 0.0,
                     'low': 0.0,
@@ -289,17 +621,29 @@ async def main():
                     'end_time': int(datetime.now().timestamp() * 1000)
                 }
 
+                if trigger_context is not None:
+                    fake_candle_info['trigger'] = trigger_context
+                # Анализ учтёт текущие ликвидации — повторный внеплановый запуск не раньше cooldown
+                LIQUIDATION_TRIGGER.note_analysis_started()
+
                 # Запускаем ПОЛНЫЙ цикл анализа ИИ
-                should_wait_for_next_candle = await client.run_full_analysis_cycle_until_wait(candle_info=fake_candle_info)
+                # Идентификатор решения сопровождает цикл, вызовы моделей и инструментов до подтверждения ордера
+                with get_decision_tracker().decision(
+                    TRIGGER_LIQUIDATION if trigger_context is not None else TRIGGER_CANDLE,
+                    event_at or datetime.now().timestamp(),
+                    symbol=fake_candle_info['symbol']
+                ):
+                    should_wait_for_next_candle = await client.run_full_analysis_cycle_until_wait(candle_info=fake_candle_info)
+                logger.info(f"⏱️ Задержки решений (скользящее окно): {get_decision_tracker().report()}")
 
                 # Проверяем, попросил ли ИИ ждать следующей свечи (через вызов инструмента wait_for_next_candle)
                 if should_wait_for_next_candle:
-                    print("⏳ ИИ принял решение ждать следующей 15-минутной отметки по времени.")
+                    console("⏳ ИИ принял решение ждать следующей 15-минутной отметки по времени.")
                     # Устанавливаем флаг, чтобы вернуться к ожиданию времени
                     should_wait_for_time = True
                     # next_analysis_time будет рассчитано в следующей итерации цикла при проверке if should_wait_for_time
                 else:
-                    print("✅ Анализ завершен. Ждем следующего решения ИИ или наступления времени...")
+                    console("✅ Анализ завершен. Ждем следующего решения ИИ или наступления времени...")
                     # Даже если ИИ не сказал "ждать", мы всё равно возвращаемся к ожиданию времени
                     # Это потому что основная логика - "цикл по времени"
                     should_wait_for_time = True
@@ -307,24 +651,82 @@ async def main():
 
 
     except KeyboardInterrupt:
-        print("\n🛑 Получен сигнал прерывания. Остановка...")
+        console("\n🛑 Получен сигнал прерывания. Остановка...")
     finally:
-        # Корректное завершение работы вебсокетов
-        print("🧹 Закрытие соединений WebSocket...")
-        try:
-            if public_ws:
-                public_ws.exit()
-                print("✅ Публичный поток закрыт.")
-        except Exception as e:
-            logger.error(f"❌ Ошибка при закрытии публичного потока: {e}")
-        try:
-            if private_ws:
-                private_ws.exit()
-                print("✅ Приватный поток закрыт.")
-        except Exception as e:
-            logger.error(f"❌ Ошибка при закрытии приватного потока: {e}")
-        print("👋 До свидания!")
+        # Корректное завершение работы вебсокетов (после переподключений актуальные соединения у супервизоров)
+        await PUBLIC_SUPERVISOR.stop()
+        await PRIVATE_SUPERVISOR.stop()
+        await HUB_CLIENT.stop()
+        logger.info(f"📡 Метрики потоков: {get_stream_metrics()}")
+        _close_websockets(PUBLIC_SUPERVISOR.ws or public_ws, PRIVATE_SUPERVISOR.ws or private_ws)
+        await EVENT_DISPATCHER.stop()
+        logger.info(f"📬 Статистика диспетчера событий: {EVENT_DISPATCHER.stats()}")
+        shutdown_tool_worker_pool()
+        # Дописываем транскрипты, ещё стоящие в очереди архива
+        await asyncio.to_thread(shutdown_transcript_archive)
+        await get_bybit_async_client().close()
+        console("👋 До свидания!")
+        shutdown_async_logging()
+
+
+async def run_market_data_hub():
+    """
+    Режим hub: один процесс держит публичный WebSocket, кэш свечей и догрузку через REST
+    и раздаёт данные процессам-стратегиям (BOT_MODE=worker) через Unix-сокет.
+    Модели, приватные потоки и торговые инструменты в этом режиме не запускаются.
+    """
+    global MAIN_EVENT_LOOP
+    global BYBIT_CLIENT
+    setup_async_logging()
+    MAIN_EVENT_LOOP = asyncio.get_running_loop()
+    # Из тем диспетчера хабу нужна только догрузка пропущенных свечей
+    EVENT_DISPATCHER.register(
+        'kline_gap', _handle_kline_gap_batch,
+        coalesce_key=lambda item: (item['symbol'], item['timeframe'])
+    )
+    EVENT_DISPATCHER.start(MAIN_EVENT_LOOP)
+
+    console("🔧 Хаб рыночных данных: инициализация BybitWrapper и публичного потока...")
+    bybit_result, public_result = await asyncio.gather(
+        asyncio.to_thread(_init_bybit_services),
+        _connect_public_ws(),
+        return_exceptions=True
+    )
+    public_ws = None if isinstance(public_result, BaseException) else public_result
+    for result in (bybit_result, public_result):
+        if isinstance(result, BaseException):
+            logger.error(f"❌ Ошибка инициализации хаба: {result}")
+            _close_websockets(public_ws, None)
+            await EVENT_DISPATCHER.stop()
+            shutdown_async_logging()
+            return
+    BYBIT_CLIENT = bybit_result
+
+    try:
+        await _load_candle_history()
+    except Exception as e:
+        logger.error(f"❌ Не удалось загрузить историю свечей: {e}")
+    # Сокет открывается после загрузки истории: первый же снимок подписчика полон
+    await MARKET_HUB.start()
+    await asyncio.to_thread(_subscribe_public, public_ws)
+    await PUBLIC_SUPERVISOR.start(public_ws)
+
+    console("🟢 Хаб рыночных данных запущен. Нажмите Ctrl+C для остановки.")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            logger.info(f"📡 Хаб: {MARKET_HUB.metrics()}, потоки: {PUBLIC_SUPERVISOR.metrics()}")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        console("\n🛑 Получен сигнал прерывания. Остановка хаба...")
+    finally:
+        await PUBLIC_SUPERVISOR.stop()
+        await MARKET_HUB.stop()
+        _close_websockets(PUBLIC_SUPERVISOR.ws or public_ws, None)
+        await EVENT_DISPATCHER.stop()
+        await get_bybit_async_client().close()
+        console("👋 До свидания!")
+        shutdown_async_logging()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run_market_data_hub() if BOT_MODE == BOT_MODE_HUB else main())
\ No newline at end of file
@@ -0,0 +1,46 @@
+# tests/conftest.py
+# Модули окружения бота (utils.helpers, config, tools.base_tool, tools.bybit_wrapper) не входят в репозиторий.
+# Если они не установлены, тесты подставляют минимальные заглушки, чтобы `pytest` запускался из корня.
+import importlib.util
+import logging
+import sys
+import types
+
+
+def _module_missing(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is None
+    except ModuleNotFoundError:
+        return True
+
+
+def _install_stub(name: str, **attrs):
+    if name in sys.modules or not _module_missing(name):
+        return
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+
+
+class _StubBaseTool:
+    """Минимальный BaseTool: имя, описание и параметры задаются свойствами подкласса."""
+
+    @property
+    def parameters(self):
+        return {}
+
+    @property
+    def required_parameters(self):
+        return []
+
+
+class _StubBybitWrapper:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+_install_stub("utils.helpers", logger=logging.getLogger("bot"))
+_install_stub("config", BYBIT_API_KEY="", BYBIT_API_SECRET="",
+              DEEPSEEK_CHAT_MODEL="deepseek-chat", DEEPSEEK_REASONER_MODEL="deepseek-reasoner")
+_install_stub("tools.base_tool", BaseTool=_StubBaseTool)
+_install_stub("tools.bybit_wrapper", BybitWrapper=_StubBybitWrapper)
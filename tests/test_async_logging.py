@@ -0,0 +1,53 @@
+import io
+import json
+import logging
+
+from utils import async_logging
+from utils.async_logging import MODEL_TEXT_TOPIC, console, console_logger, logger, transcript_logger
+
+
+def _run_logging(tmp_path, monkeypatch, verbosity, emit):
+    monkeypatch.setattr(async_logging, 'CONSOLE_VERBOSITY', verbosity)
+    monkeypatch.setattr(async_logging, 'LOG_DIR', str(tmp_path))
+    monkeypatch.setattr(async_logging, 'EVENTS_LOG_FILE', str(tmp_path / 'events.jsonl'))
+    monkeypatch.setattr(async_logging, 'TRANSCRIPTS_LOG_FILE', str(tmp_path / 'transcripts.log'))
+    saved = (logger.handlers, logger.propagate, logger.level, console_logger.handlers, console_logger.level,
+             transcript_logger.handlers)
+    stream = io.StringIO()
+    logger.handlers = [logging.StreamHandler(stream)]
+    logger.setLevel(logging.DEBUG)
+    try:
+        async_logging.setup_async_logging()
+        emit()
+    finally:
+        async_logging.shutdown_async_logging()
+        (logger.handlers, logger.propagate, _, console_logger.handlers, _, transcript_logger.handlers) = saved
+        logger.setLevel(saved[2])
+        console_logger.setLevel(saved[4])
+    events = [json.loads(line) for line in (tmp_path / 'events.jsonl').read_text(encoding='utf-8').splitlines()]
+    return stream.getvalue(), events
+
+
+def test_quiet_verbosity_applies_to_logger_console_handler(tmp_path, monkeypatch):
+    def emit():
+        logger.info("обычное событие")
+        logger.warning("предупреждение")
+
+    output, events = _run_logging(tmp_path, monkeypatch, 'quiet', emit)
+
+    assert "обычное событие" not in output
+    assert "предупреждение" in output
+    # Файловый журнал событий получает всё независимо от консоли
+    assert [event['message'] for event in events] == ["обычное событие", "предупреждение"]
+
+
+def test_model_texts_stay_out_of_events_log(tmp_path, monkeypatch):
+    def emit():
+        console("полный ответ модели", topic=MODEL_TEXT_TOPIC)
+        console("⏰ Время наступило")
+        async_logging.log_transcript('reasoning', "рассуждения")
+
+    _, events = _run_logging(tmp_path, monkeypatch, 'normal', emit)
+
+    assert [event['message'] for event in events] == ["⏰ Время наступило"]
+    assert "рассуждения" in (tmp_path / 'transcripts.log').read_text(encoding='utf-8')
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from utils.bybit_async_client import BybitAsyncClient  # noqa: E402
+
+
+def test_fetch_executions_follows_page_cursor():
+    pages = {
+        None: {'list': [{'execId': '3'}, {'execId': '2'}], 'nextPageCursor': 'page-2'},
+        'page-2': {'list': [{'execId': '1'}], 'nextPageCursor': ''},
+    }
+    requested = []
+
+    async def fake_get(path, params=None, signed=False):
+        requested.append(params.get('cursor'))
+        return pages[params.get('cursor')]
+
+    client = BybitAsyncClient()
+    client.get = fake_get
+
+    executions = asyncio.run(client.fetch_executions("DOGEUSDT", start_ms=1))
+
+    assert [execution['execId'] for execution in executions] == ['3', '2', '1']
+    assert requested == [None, 'page-2']
+
+
+def _recording_client(pages):
+    requested = []
+
+    async def fake_get(path, params=None, signed=False):
+        requested.append((path, params))
+        return pages[params.get('cursor')]
+
+    client = BybitAsyncClient()
+    client.get = fake_get
+    return client, requested
+
+
+def test_fetch_executions_without_symbol_is_category_wide():
+    client, requested = _recording_client({None: {'list': [{'execId': '1', 'symbol': 'BTCUSDT'}]}})
+
+    asyncio.run(client.fetch_executions(start_ms=1))
+
+    assert requested[0][1]['symbol'] is None
+    assert requested[0][1]['startTime'] == 1
+
+
+def test_fetch_positions_uses_settle_coin_only_without_symbol():
+    client, requested = _recording_client({None: {'list': []}})
+
+    asyncio.run(client.fetch_positions())
+    asyncio.run(client.fetch_positions("DOGEUSDT"))
+
+    assert [(path, params['symbol'], params['settleCoin']) for path, params in requested] == [
+        ("/v5/position/list", None, "USDT"), ("/v5/position/list", "DOGEUSDT", None)
+    ]
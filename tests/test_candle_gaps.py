@@ -0,0 +1,60 @@
+# tests/test_candle_gaps.py
+from utils.candle_store import CandleStore
+
+STEP = 900_000
+
+
+def kline(start, close, confirm=True):
+    return {'start': start, 'open': close, 'high': close, 'low': close, 'close': close,
+            'volume': 1, 'turnover': 1, 'confirm': confirm}
+
+
+def message(*klines):
+    return {'topic': 'kline.15.DOGEUSDT', 'data': list(klines)}
+
+
+def closes(store):
+    return store.get('DOGEUSDT', '15m').column('close').tolist()
+
+
+def test_unconfirmed_candles_are_not_stored():
+    store = CandleStore()
+    assert store.append_kline_message(message(kline(0, 1.0, confirm=False))) == []
+    assert store.get('DOGEUSDT', '15m') is None
+
+
+def test_contiguous_candles_are_appended():
+    store = CandleStore()
+    store.append_kline_message(message(kline(0, 1.0)))
+    assert store.append_kline_message(message(kline(STEP, 2.0))) == []
+    assert closes(store) == [1.0, 2.0]
+
+
+def test_gap_holds_candles_until_backfill():
+    store = CandleStore()
+    store.append_kline_message(message(kline(0, 1.0)))
+    gaps = store.append_kline_message(message(kline(3 * STEP, 4.0)))
+    assert gaps == [('DOGEUSDT', '15m', STEP)]
+    assert store.has_gap('DOGEUSDT', '15m')
+    # Следующая свеча тоже ждёт, новый пропуск не заявляется
+    assert store.append_kline_message(message(kline(4 * STEP, 5.0))) == []
+    assert closes(store) == [1.0]
+
+    # REST возвращает пропущенные свечи и пересечение с отложенными — пересечение отбрасывается
+    rows = [[STEP, 2, 2, 2, 2.0, 1], [2 * STEP, 3, 3, 3, 3.0, 1], [3 * STEP, 9, 9, 9, 9.0, 1]]
+    store.resolve_gap('DOGEUSDT', '15m', rows)
+    assert closes(store) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert not store.has_gap('DOGEUSDT', '15m')
+
+
+def test_failed_backfill_still_releases_held_candles():
+    store = CandleStore()
+    store.append_kline_message(message(kline(0, 1.0)))
+    store.append_kline_message(message(kline(2 * STEP, 3.0)))
+    store.resolve_gap('DOGEUSDT', '15m', [])
+    assert closes(store) == [1.0, 3.0]
+
+
+def test_malformed_topic_is_ignored():
+    store = CandleStore()
+    assert store.append_kline_message({'topic': 'kline', 'data': [kline(0, 1.0)]}) == []
@@ -0,0 +1,31 @@
+# tests/test_candle_store.py
+from utils.candle_store import CandleArray, CandleStore
+
+
+def test_append_overwrites_same_timestamp_and_ignores_older():
+    series = CandleArray("X", "1m", capacity=4)
+    assert series.append(1000, 1, 2, 0.5, 1.5, 10)
+    assert not series.append(1000, 1, 2, 0.5, 1.7, 11)  # перезапись последней
+    assert not series.append(500, 9, 9, 9, 9, 9)         # старая свеча игнорируется
+    assert len(series) == 1
+    assert series.last()['close'] == 1.7
+
+
+def test_capacity_grows_then_window_is_halved():
+    series = CandleArray("X", "1m", capacity=2, max_candles=8)
+    for i in range(9):
+        series.append(i, i, i, i, i, i)
+    assert series.capacity == 8
+    assert len(series) == 5  # 4 сохранённых + новая
+    assert series.column('timestamp').tolist() == [4, 5, 6, 7, 8]
+
+
+def test_tail_returns_copies():
+    store = CandleStore()
+    for i in range(10):
+        store.append("X", "1m", i, i, i, i, float(i), 1.0)
+    tail = store.tail("X", "1m", 3, ('timestamp', 'close'))
+    assert tail['close'].tolist() == [7.0, 8.0, 9.0]
+    tail['close'][0] = -1
+    assert store.get("X", "1m").column('close')[7] == 7.0
+    assert store.tail("Y", "1m", 3) is None
@@ -0,0 +1,89 @@
+# tests/test_cycle_budget.py
+import asyncio
+
+import pytest
+
+from utils import cycle_budget
+from utils.cycle_budget import CycleBudget, estimate_cost
+
+
+@pytest.fixture
+def budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(cycle_budget, "DAILY_SPEND_FILE", str(tmp_path / "daily_spend.json"))
+    budget = CycleBudget()
+    budget.max_iterations = 3
+    budget.max_prompt_tokens = 1000
+    budget.max_completion_tokens = 100
+    budget.max_seconds = 60
+    budget.daily_limit = 1.0
+    return budget
+
+
+def usage(prompt=0, completion=0):
+    return {'total_prompt_tokens': prompt, 'total_completion_tokens': completion,
+            'total_tokens': prompt + completion}
+
+
+def test_cycle_tokens_are_counted_from_cycle_start(budget):
+    budget.start_cycle(usage(500, 50))
+    assert budget.cycle_tokens(usage(700, 60)) == {
+        'total_prompt_tokens': 200, 'total_completion_tokens': 10, 'total_tokens': 210
+    }
+    assert budget.exhausted_reason(usage(700, 60)) is None
+
+
+def test_iteration_limit(budget):
+    budget.start_cycle(usage())
+    for _ in range(3):
+        budget.next_iteration()
+    assert "итераций" in budget.exhausted_reason(usage())
+    assert budget.last_stop_reason is not None
+
+
+def test_token_limits(budget):
+    budget.start_cycle(usage())
+    assert "prompt" in budget.exhausted_reason(usage(prompt=1000))
+    assert "completion" in budget.exhausted_reason(usage(completion=100))
+
+
+def test_time_limit_and_remaining_seconds(budget, monkeypatch):
+    assert budget.remaining_seconds() is None  # вне цикла вызовы не ограничены
+    clock = [1000.0]
+    monkeypatch.setattr(cycle_budget.time, "monotonic", lambda: clock[0])
+    budget.start_cycle(usage())
+    clock[0] += 30
+    assert budget.remaining_seconds() == pytest.approx(30)
+    assert not budget.should_downgrade(usage())
+    clock[0] += 20  # 50 из 60 с — выше порога замены модели
+    assert budget.should_downgrade(usage())
+    clock[0] += 15
+    assert budget.remaining_seconds() == 0.0
+    assert "времени" in budget.exhausted_reason(usage())
+    budget.finish_cycle()
+    assert budget.remaining_seconds() is None
+
+
+def test_daily_spend_is_persisted_in_batch(budget, tmp_path):
+    cost = budget.record_spend("deepseek-chat", 1_000_000, 0)
+    cost += budget.record_spend("deepseek-chat", 1_000_000, 0)
+    assert cost == pytest.approx(2 * estimate_cost("deepseek-chat", 1_000_000, 0))
+    # Вызовы модели не пишут на диск: расходы сохраняются пачкой в конце цикла
+    assert not (tmp_path / "daily_spend.json").exists()
+    asyncio.run(budget.persist())
+    reloaded = CycleBudget()
+    assert reloaded.spent_today == pytest.approx(cost)
+
+
+def test_model_for_downgrades_only_to_cheaper_model(budget):
+    budget.start_cycle(usage())
+    assert budget.model_for("deepseek-reasoner", usage()) == "deepseek-reasoner"
+    assert budget.model_for("deepseek-reasoner", usage(prompt=900)) == "deepseek-chat"
+    # Инструментальная модель уже самая дешёвая — замена ей ничего не даёт
+    assert budget.model_for("deepseek-chat", usage(prompt=900)) == "deepseek-chat"
+    assert budget.model_for("unknown-model", usage(prompt=900)) == "deepseek-chat"
+
+
+def test_daily_limit_stops_cycle(budget):
+    budget.start_cycle(usage())
+    budget.record_spend("deepseek-reasoner", 0, 1_000_000)  # $2.19 > $1.00
+    assert "дневной лимит" in budget.exhausted_reason(usage())
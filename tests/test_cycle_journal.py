@@ -0,0 +1,100 @@
+# tests/test_cycle_journal.py
+import asyncio
+import json
+
+from utils.cycle_journal import (
+    PHASE_STARTED, PHASE_TOOLS_DONE, PHASE_TOOLS_REQUESTED, CycleJournal,
+)
+
+ASSISTANT = {
+    'role': 'assistant', 'content': 'проверяю рынок',
+    'tool_calls': [{'id': f'call_{i}', 'type': 'function',
+                    'function': {'name': 'get_klines', 'arguments': '{}'}} for i in range(3)],
+}
+
+
+def tool_result(call_id):
+    return {'role': 'tool', 'tool_call_id': call_id, 'content': json.dumps({'ok': call_id})}
+
+
+def test_unfinished_step_survives_restart(tmp_path):
+    path = str(tmp_path / "journal.json")
+
+    async def crashed_step():
+        journal = CycleJournal(path)
+        await journal.begin(5, [{'role': 'user', 'content': 'новая свеча'}], tool_names=['get_klines', 'wait_for_next_candle'])
+        await journal.tools_requested(ASSISTANT)
+        await journal.tools_started(['call_0', 'call_1', 'call_2'])
+        # Инструменты завершаются одновременно — записи журнала не должны перемешаться
+        await asyncio.gather(journal.tool_done(tool_result('call_2')), journal.tool_done(tool_result('call_0')))
+
+    asyncio.run(crashed_step())
+
+    restored = CycleJournal(path)
+    state = restored.load_unfinished()
+    assert state['phase'] == PHASE_TOOLS_REQUESTED
+    assert state['iteration'] == 5
+    assert state['tool_names'] == ['get_klines', 'wait_for_next_candle']
+    assert state['pending_messages'] == [{'role': 'user', 'content': 'новая свеча'}]
+    # Порядок результатов — порядок tool_calls, а не завершения
+    assert [r['tool_call_id'] for r in restored.ordered_tool_results()] == ['call_0', 'call_2']
+    assert 'call_1' in state['tools_started'] and 'call_1' not in state['tool_results']
+
+
+def test_committed_step_is_not_resumed(tmp_path):
+    path = str(tmp_path / "journal.json")
+
+    async def full_step():
+        journal = CycleJournal(path)
+        await journal.begin(1, [])
+        assert journal.phase == PHASE_STARTED
+        await journal.tools_requested(ASSISTANT)
+        await journal.tools_done(wait=False)
+        assert journal.phase == PHASE_TOOLS_DONE
+        await journal.reasoner_done("вопрос", "ответ")
+        await journal.committed()
+        assert not journal.in_progress()
+
+    asyncio.run(full_step())
+    assert CycleJournal(path).load_unfinished() is None
+    assert not (tmp_path / "journal.json.tmp").exists()
+
+
+def test_missing_or_corrupt_journal(tmp_path):
+    path = tmp_path / "journal.json"
+    assert CycleJournal(str(path)).load_unfinished() is None
+    path.write_text("{обрыв")
+    assert CycleJournal(str(path)).load_unfinished() is None
+
+
+def test_interrupted_tool_result_mentions_error():
+    result = CycleJournal("unused").interrupted_tool_result('call_9')
+    assert result['tool_call_id'] == 'call_9'
+    assert 'error' in json.loads(result['content'])
+
+
+def test_corrupt_journal_is_set_aside(tmp_path):
+    path = tmp_path / "journal.json"
+    path.write_text('{"phase": "tools_requested", "iteration": ')
+    assert CycleJournal(str(path)).load_unfinished() is None
+    assert not path.exists()
+    assert (tmp_path / "journal.json.corrupt").exists()
+
+    # Запись без номера итерации тоже не восстанавливается
+    path.write_text(json.dumps({'phase': 'started'}))
+    assert CycleJournal(str(path)).load_unfinished() is None
+
+
+def test_discarded_step_is_not_resumed(tmp_path):
+    path = str(tmp_path / "journal.json")
+
+    async def failed_resume():
+        journal = CycleJournal(path)
+        await journal.begin(7, [])
+        await journal.tools_requested(ASSISTANT)
+        restored = CycleJournal(path)
+        assert restored.load_unfinished() is not None
+        await restored.discard()
+
+    asyncio.run(failed_resume())
+    assert CycleJournal(path).load_unfinished() is None
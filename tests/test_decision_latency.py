@@ -0,0 +1,54 @@
+import time
+import types
+
+from utils import decision_latency
+from utils.decision_latency import TRIGGER_CANDLE, DecisionTracker
+
+ORDER_TOOL = types.SimpleNamespace(name="place_order")
+READ_TOOL = types.SimpleNamespace(name="get_open_orders")
+
+
+def _order_message(order_id):
+    return {'creationTime': int(time.time() * 1000), 'data': [{'orderId': order_id}]}
+
+
+def test_ack_after_tool_result_completes_decision():
+    tracker = DecisionTracker()
+    with tracker.decision(TRIGGER_CANDLE, time.time()) as decision:
+        tracker.note_tool_result(ORDER_TOOL, {'result': {'orderId': 'A1'}})
+    assert decision.outcome is None
+    tracker.on_order_messages([_order_message('A1')])
+    assert decision.outcome == 'acknowledged'
+    assert 'tool_to_ack_ms' in decision.breakdown()
+
+
+def test_ack_before_tool_result_is_buffered():
+    tracker = DecisionTracker()
+    tracker.on_order_messages([_order_message('B1')])
+    with tracker.decision(TRIGGER_CANDLE, time.time()) as decision:
+        tracker.note_tool_result(ORDER_TOOL, '{"orderId": "B1"}')
+    assert decision.outcome == 'acknowledged'
+
+
+def test_order_ids_from_read_only_tools_are_ignored():
+    tracker = DecisionTracker()
+    with tracker.decision(TRIGGER_CANDLE, time.time()) as decision:
+        tracker.note_tool_result(READ_TOOL, {'list': [{'orderId': 'C1'}, {'orderId': 'C2'}]})
+    assert decision.orders == {}
+    assert decision.outcome == 'no_order'
+    flagged = types.SimpleNamespace(name="custom_entry", places_orders=True)
+    assert decision_latency.places_orders(flagged)
+
+
+def test_report_expires_unacknowledged_orders(monkeypatch):
+    tracker = DecisionTracker()
+    with tracker.decision(TRIGGER_CANDLE, time.time()) as decision:
+        tracker.note_tool_result(ORDER_TOOL, {'orderId': 'D1'})
+    monkeypatch.setattr(decision_latency, 'ORDER_ACK_TIMEOUT', 0)
+    decision.cycle_finished_at -= 1
+
+    report = tracker.report()
+
+    assert decision.outcome == 'ack_timeout'
+    assert report['awaiting_ack'] == 0
+    assert report['outcomes'] == {'ack_timeout': 1}
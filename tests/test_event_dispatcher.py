@@ -0,0 +1,69 @@
+# tests/test_event_dispatcher.py
+import asyncio
+import threading
+
+from utils.event_dispatcher import EventDispatcher, TopicBuffer
+
+
+async def _noop(batch):
+    pass
+
+
+def test_ring_buffer_drops_oldest_and_wakes_once():
+    buffer = TopicBuffer('order', _noop, capacity=3, coalesce_key=None)
+    wakeups = [buffer.push({'n': i}) for i in range(5)]
+    assert wakeups == [True, False, False, False, False]  # одно пробуждение на пачку
+    assert buffer.depth() == 3
+    assert [m['n'] for m in buffer.drain()] == [2, 3, 4]
+    assert buffer.stats['dropped'] == 2
+    assert buffer.stats['max_batch'] == 3
+    assert buffer.push({'n': 5})  # после drain снова нужно будить потребителя
+
+
+def test_coalescing_keeps_latest_state_per_key():
+    buffer = TopicBuffer('position', _noop, capacity=10, coalesce_key=lambda item: item['symbol'])
+    buffer.push({'data': [{'symbol': 'A', 'size': 1}, {'symbol': 'B', 'size': 1}]})
+    buffer.push({'data': [{'symbol': 'A', 'size': 2}]})
+    assert buffer.drain() == [{'symbol': 'A', 'size': 2}, {'symbol': 'B', 'size': 1}]
+    assert buffer.stats['coalesced'] == 1
+    assert buffer.drain() == []
+
+
+def test_dispatcher_delivers_thread_published_messages_in_batches():
+    async def scenario():
+        received = []
+        done = asyncio.Event()
+
+        async def handler(batch):
+            received.append(len(batch))
+            if sum(received) == 1000:
+                done.set()
+
+        dispatcher = EventDispatcher()
+        dispatcher.register('liquidation', handler)
+        dispatcher.start(asyncio.get_running_loop())
+
+        def producer():
+            for i in range(1000):
+                dispatcher.publish('liquidation', {'n': i})
+
+        thread = threading.Thread(target=producer)
+        thread.start()
+        await asyncio.wait_for(done.wait(), timeout=5)
+        thread.join()
+        stats = dispatcher.stats()['liquidation']
+        await dispatcher.stop()
+        return received, stats
+
+    received, stats = asyncio.run(scenario())
+    assert sum(received) == 1000
+    assert stats['delivered'] == 1000 and stats['dropped'] == 0
+    assert stats['batches'] == len(received)
+
+
+def test_publish_without_loop_counts_drop():
+    dispatcher = EventDispatcher()
+    dispatcher.register('order', _noop)
+    dispatcher.publish('order', {'data': []})
+    dispatcher.publish('unknown', {'data': []})
+    assert dispatcher.stats()['order']['dropped'] == 1
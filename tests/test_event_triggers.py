@@ -0,0 +1,78 @@
+import asyncio
+import types
+
+from utils import event_triggers
+from utils.event_triggers import LiquidationTrigger
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _liquidation(volume, price=1.0):
+    return {'s': 'DOGEUSDT', 'S': 'Buy', 'v': str(volume), 'p': str(price), 'T': 1}
+
+
+def _trigger(monkeypatch, clock, **overrides):
+    # Подменяем часы только модулю триггера: цикл событий продолжает жить по настоящему времени
+    monkeypatch.setattr(event_triggers, 'time', types.SimpleNamespace(monotonic=clock))
+    params = dict(window_seconds=60, notional_threshold=100, displacement_pct=50,
+                  debounce_seconds=0, cooldown_seconds=300, post_analysis_quiet_seconds=30)
+    params.update(overrides)
+    return LiquidationTrigger(**params)
+
+
+def test_crossings_count_only_upward_transitions(monkeypatch):
+    clock = _Clock()
+
+    async def scenario():
+        trigger = _trigger(monkeypatch, clock)
+        for _ in range(5):
+            trigger.on_liquidation(_liquidation(150))  # окно остаётся выше порога
+        assert await trigger.wait(1) is not None
+        clock.now += 61  # окно опустело
+        trigger.on_liquidation(_liquidation(10))
+        trigger.on_liquidation(_liquidation(150))
+        return trigger.stats
+
+    stats = asyncio.run(scenario())
+    assert stats['crossings'] == 2
+    assert stats['fired'] == 1
+    assert stats['suppressed'] == 1  # второе пересечение пришлось на cooldown после срабатывания
+
+
+def test_scheduled_analysis_starts_only_short_quiet_window(monkeypatch):
+    clock = _Clock()
+
+    async def scenario():
+        trigger = _trigger(monkeypatch, clock)
+        trigger.note_analysis_started()
+        clock.now += 31
+        trigger.on_liquidation(_liquidation(150))
+        return await trigger.wait(1)
+
+    context = asyncio.run(scenario())
+    assert context is not None
+    assert context['reason'] == 'liquidation_cascade'
+
+
+def test_triggered_analysis_keeps_full_cooldown(monkeypatch):
+    clock = _Clock()
+
+    async def scenario():
+        trigger = _trigger(monkeypatch, clock)
+        trigger.on_liquidation(_liquidation(150))
+        assert await trigger.wait(1) is not None
+        trigger.note_analysis_started()
+        clock.now += 61
+        trigger.on_liquidation(_liquidation(10))
+        trigger.on_liquidation(_liquidation(150))
+        return await trigger.wait(0.05), trigger.stats
+
+    context, stats = asyncio.run(scenario())
+    assert context is None
+    assert stats['suppressed'] == 1
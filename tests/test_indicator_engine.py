@@ -0,0 +1,119 @@
+# tests/test_indicator_engine.py
+import numpy as np
+import pytest
+
+from utils.candle_store import CandleStore
+from utils.indicator_engine import (
+    ATR_PERIOD, EMA_PERIODS, MACD_FAST, MACD_SIGNAL, MACD_SLOW, RSI_PERIOD, IndicatorEngine,
+)
+
+SYMBOL, TIMEFRAME, STEP = "TESTUSDT", "15m", 900_000
+
+
+def reference_ema(values, period):
+    """EMA с затравкой SMA первых period значений (как в TA-Lib); None до period-го значения."""
+    values = list(values)
+    if len(values) < period:
+        return None
+    ema = sum(values[:period]) / period
+    alpha = 2.0 / (period + 1)
+    for value in values[period:]:
+        ema += alpha * (value - ema)
+    return ema
+
+
+def reference_ema_series(values, period):
+    return [reference_ema(values[:i + 1], period) for i in range(len(values))]
+
+
+def reference_rsi(closes, period=RSI_PERIOD):
+    changes = np.diff(closes)
+    gains, losses = np.maximum(changes, 0), np.maximum(-changes, 0)
+    avg_gain, avg_loss = gains[:period].mean(), losses[:period].mean()
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    if avg_loss == 0:
+        return 50.0 if avg_gain == 0 else 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def reference_atr(highs, lows, closes, period=ATR_PERIOD):
+    true_ranges = [max(h - l, abs(h - pc), abs(l - pc)) for h, l, pc in zip(highs[1:], lows[1:], closes[:-1])]
+    atr = sum(true_ranges[:period]) / period
+    for tr in true_ranges[period:]:
+        atr = (atr * (period - 1) + tr) / period
+    return atr
+
+
+def random_candles(count, seed=7):
+    rng = np.random.default_rng(seed)
+    closes = 100 + np.cumsum(rng.normal(0, 1, count))
+    opens = np.concatenate(([closes[0]], closes[:-1]))
+    highs = np.maximum(opens, closes) + rng.uniform(0, 1, count)
+    lows = np.minimum(opens, closes) - rng.uniform(0, 1, count)
+    return opens, highs, lows, closes
+
+
+def feed(count, seed=7, closes=None):
+    store = CandleStore()
+    engine = IndicatorEngine(store)
+    opens, highs, lows, generated = random_candles(count, seed)
+    closes = generated if closes is None else np.asarray(closes, dtype=float)
+    if closes is not generated:
+        opens = highs = lows = closes
+    for i in range(count):
+        store.append(SYMBOL, TIMEFRAME, i * STEP, opens[i], highs[i], lows[i], closes[i], 1.0)
+    return store, engine, (opens, highs, lows, closes)
+
+
+def test_matches_reference_implementation():
+    _, engine, (opens, highs, lows, closes) = feed(300)
+    snapshot = engine.snapshot(SYMBOL, TIMEFRAME)
+    for period in EMA_PERIODS:
+        assert snapshot[f'ema_{period}'] == pytest.approx(reference_ema(closes, period))
+    macd_line = [f - s for f, s in zip(reference_ema_series(closes, MACD_FAST),
+                                       reference_ema_series(closes, MACD_SLOW)) if s is not None]
+    assert snapshot['macd'] == pytest.approx(macd_line[-1])
+    assert snapshot['macd_signal'] == pytest.approx(reference_ema(macd_line, MACD_SIGNAL))
+    assert snapshot['rsi_14'] == pytest.approx(reference_rsi(closes))
+    assert snapshot['atr_14'] == pytest.approx(reference_atr(highs, lows, closes))
+    assert snapshot['sma_20'] == pytest.approx(closes[-20:].mean())
+
+
+def test_ema_is_sma_seeded_at_first_full_period():
+    _, engine, (_, _, _, closes) = feed(9)
+    assert engine.snapshot(SYMBOL, TIMEFRAME)['ema_9'] == pytest.approx(closes.mean())
+
+
+def test_warmup_values_are_none():
+    _, engine, _ = feed(MACD_SLOW + MACD_SIGNAL - 2)
+    snapshot = engine.snapshot(SYMBOL, TIMEFRAME)
+    assert snapshot['macd'] is not None
+    assert snapshot['macd_signal'] is None
+    assert snapshot['ema_50'] is None
+
+
+def test_flat_series_rsi_is_neutral():
+    _, engine, _ = feed(30, closes=[1.0] * 30)
+    assert engine.snapshot(SYMBOL, TIMEFRAME)['rsi_14'] == 50.0
+
+
+def test_only_gains_rsi_is_100():
+    _, engine, _ = feed(30, closes=np.arange(30) + 1.0)
+    assert engine.snapshot(SYMBOL, TIMEFRAME)['rsi_14'] == 100.0
+
+
+def test_overwritten_candle_is_recomputed():
+    store, engine, (opens, highs, lows, closes) = feed(100)
+    store.append(SYMBOL, TIMEFRAME, 99 * STEP, opens[-1], highs[-1], lows[-1], closes[-1] + 5, 1.0)
+    corrected = closes.copy()
+    corrected[-1] += 5
+    assert engine.snapshot(SYMBOL, TIMEFRAME)['ema_21'] == pytest.approx(reference_ema(corrected, 21))
+
+
+def test_scan_patterns_returns_timestamps():
+    _, engine, _ = feed(60)
+    found = engine.scan_patterns(SYMBOL, TIMEFRAME, lookback=50)
+    for timestamps in found.values():
+        assert all(ts >= 10 * STEP for ts in timestamps)
@@ -0,0 +1,45 @@
+import asyncio
+import json
+
+import pytest
+
+from utils import market_data_hub
+from utils.candle_store import CandleStore
+from utils.market_data_hub import FRAME_SNAPSHOT, MarketDataHub, MarketDataHubClient
+
+
+def test_client_skips_malformed_frames(monkeypatch):
+    store = CandleStore()
+    monkeypatch.setattr(market_data_hub, 'get_candle_store', lambda: store)
+    received = []
+    client = MarketDataHubClient(lambda topic, message: received.append((topic, message)))
+    lines = [
+        b"not json\n",
+        json.dumps({'topic': 'candle', 'symbol': 'X'}).encode() + b"\n",  # нет полей свечи
+        json.dumps({'topic': 'liquidation', 'message': {'v': 1}}).encode() + b"\n",
+    ]
+
+    async def scenario():
+        reader = asyncio.StreamReader()
+        for line in lines:
+            reader.feed_data(line)
+        reader.feed_eof()
+        with pytest.raises(ConnectionError):
+            await client._read(reader)
+
+    asyncio.run(scenario())
+    assert client.bad_frames == 2
+    assert received == [('liquidation', {'v': 1})]
+
+
+def test_snapshot_rows_from_store_tail(monkeypatch):
+    store = CandleStore()
+    for i in range(3):
+        store.append("X", "1m", i, i, i + 1, i - 1, float(i), 10.0)
+    monkeypatch.setattr(market_data_hub, 'get_candle_store', lambda: store)
+
+    frames = [json.loads(payload) for payload in MarketDataHub()._snapshot()]
+
+    assert len(frames) == 1
+    assert frames[0]['topic'] == FRAME_SNAPSHOT
+    assert frames[0]['rows'][-1] == [2, 2.0, 3.0, 1.0, 2.0, 10.0]
@@ -0,0 +1,39 @@
+import gc
+import json
+
+from utils.message_store import ContentPool, compact_messages, create_message, get_content_pool
+
+
+def test_equal_texts_share_one_instance():
+    pool = ContentPool(min_length=4)
+    first = pool.intern("x" * 10)
+    second = pool.intern("".join(["x"] * 10))  # равная, но другая строка
+    assert first is second
+    assert pool.stats['shared'] == 1
+    assert pool.intern("abc") == "abc"  # короткие строки не интернируются
+    assert pool.report()['blobs'] == 1
+
+
+def test_unreferenced_texts_leave_the_pool():
+    pool = ContentPool(min_length=4)
+    kept = pool.intern("kept" * 10)
+    pool.intern("dropped" * 10)
+    gc.collect()
+    assert pool.report()['blobs'] == 1
+    assert pool.intern("kept" * 10) is kept
+
+
+def test_message_is_plain_json_dict():
+    message = create_message('tool', "{}" * 200, tool_call_id="call-1", name=None)
+    assert type(message) is dict
+    assert json.loads(json.dumps(message)) == {'role': 'tool', 'content': "{}" * 200, 'tool_call_id': "call-1"}
+
+
+def test_compact_messages_shares_content_in_place():
+    text = "x" * 1000
+    main_context = [{'role': 'user', 'content': "".join(["x"] * 1000)}]
+    reasoner_context = [create_message('assistant', text)]
+
+    assert compact_messages(main_context) is main_context
+    assert main_context[0]['content'] is reasoner_context[0]['content']
+    assert get_content_pool().stats['shared'] >= 1
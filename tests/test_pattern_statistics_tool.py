@@ -0,0 +1,61 @@
+# tests/test_pattern_statistics_tool.py
+import asyncio
+
+import numpy as np
+import pytest
+
+from tools import pattern_statistics_tool
+from tools.pattern_statistics_tool import PatternStatisticsTool
+from utils import tool_worker_pool
+from utils.candle_store import CandleStore
+from utils.tool_worker_pool import ToolWorkerPool
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = CandleStore()
+    # Чередование бычьих и медвежьих свечей с растущей ценой: каждая бычья поглощает предыдущую медвежью
+    for i in range(40):
+        base = 100.0 + i
+        if i % 2:
+            store.append("DOGEUSDT", "15m", i * 900_000, base - 1.5, base + 1.0, base - 2.0, base + 0.5, 10.0)
+        else:
+            store.append("DOGEUSDT", "15m", i * 900_000, base, base + 0.5, base - 1.0, base - 0.5, 10.0)
+    monkeypatch.setattr(pattern_statistics_tool, "get_candle_store", lambda: store)
+    return store
+
+
+def test_compute_reports_forward_changes(store):
+    tool = PatternStatisticsTool()
+    kwargs = asyncio.run(tool.prepare("DOGEUSDT", horizons=[2, 1, 2, 0]))
+    assert kwargs["horizons"] == [1, 2]
+    assert isinstance(kwargs["close"], np.ndarray)
+
+    result = PatternStatisticsTool.compute(**kwargs)
+    assert result["candles_scanned"] == 40
+    engulfing = result["patterns"]["bullish_engulfing"]
+    assert engulfing["count"] == 20
+    # Через 2 свечи цена у бычьих свечей всегда выше (тренд вверх)
+    assert engulfing["horizons"]["2"]["up_ratio"] == 1.0
+    assert engulfing["horizons"]["2"]["samples"] == 19
+    assert result["current_patterns"] == ["bullish_engulfing"]
+
+
+def test_compute_without_candles_returns_error():
+    result = PatternStatisticsTool.compute("DOGEUSDT", "15m", [1])
+    assert "error" in result
+
+
+def test_tool_runs_in_worker_process(store, monkeypatch):
+    # fork: процесс наследует модули-заглушки из conftest
+    monkeypatch.setattr(tool_worker_pool, "TOOL_WORKER_START_METHOD", "fork")
+
+    async def scenario():
+        pool = ToolWorkerPool(processes=1, max_queue=1)
+        try:
+            return await pool.run(PatternStatisticsTool(), {"symbol": "DOGEUSDT", "horizons": [1]})
+        finally:
+            pool.shutdown()
+
+    result = asyncio.run(scenario())
+    assert result["patterns"]["bullish_engulfing"]["count"] == 20
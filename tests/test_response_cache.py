@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from utils import response_cache, run_mode
+from utils.response_cache import ResponseCache, response_cache_key
+
+
+def test_key_is_canonical_and_covers_tools():
+    messages = [{'role': 'user', 'content': 'x', 'name': 'a'}]
+    reordered = [{'name': 'a', 'content': 'x', 'role': 'user'}]
+    assert response_cache_key("m", messages) == response_cache_key("m", reordered)
+    assert response_cache_key("m", messages) != response_cache_key("m", messages, tools=[{'name': 't'}])
+    assert response_cache_key("m", messages) != response_cache_key("other", messages)
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 ** 6)
+    for key in ("aa1", "bb2", "cc3"):
+        cache.put(key, {'content': key})
+    cache.max_bytes = cache._total_bytes - 1  # место ровно на две записи
+    assert cache.get("aa1") is not None      # aa1 становится самой свежей
+    cache.put("cc3", {'content': 'cc3'})
+
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") == {'content': 'aa1'}
+    assert cache.stats['evictions'] == 1
+
+
+def test_hits_report_saved_usage(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put("aa1", {'model': 'deepseek-chat', 'content': 'x',
+                      'usage': {'prompt_tokens': 1_000_000, 'completion_tokens': 0}})
+    cache.get("aa1")
+    cache.get("aa1")
+
+    saved = cache.report()['saved']
+    assert saved['prompt_tokens'] == 2_000_000
+    assert saved['usd'] == 0.54
+
+
+def test_cache_refused_outside_replay_modes(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, 'MODEL_RESPONSE_CACHE', True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(response_cache, '_cache', None)
+    monkeypatch.setattr(run_mode, 'BOT_RUN_MODE', 'live')
+    assert response_cache.get_response_cache() is None
+
+    monkeypatch.setattr(run_mode, 'BOT_RUN_MODE', 'replay')
+    assert response_cache.get_response_cache() is not None
+
+
+def _cycle_messages(now: datetime):
+    """Сообщения цикла, как их собирает main.py (fake_candle_info) и deepseek_client, на момент now."""
+    candle_info = {
+        'symbol': 'DOGEUSDT', 'interval': '15m',
+        'timestamp': int(now.timestamp() * 1000),
+        'start_time': int((now - timedelta(minutes=15)).timestamp() * 1000),
+    }
+    return [
+        {'role': 'system', 'content': f"Текущее время: {now.isoformat()}"},
+        {'role': 'user', 'content': f"Закрылась новая {candle_info['interval']}-минутная свеча для "
+                                    f"{candle_info['symbol']} в {candle_info['timestamp']}."},
+        {'role': 'assistant', 'content': '', 'tool_calls': [
+            {'id': 'call_1', 'type': 'function', 'function': {'name': 'get_positions', 'arguments': '{}'}}]},
+        {'role': 'tool', 'tool_call_id': 'call_1',
+         'content': f'{{"count": 0, "positions": [], "checked_at": "{now.strftime("%d.%m.%Y %H:%M")}"}}'},
+    ]
+
+
+def test_replay_of_recorded_cycle_hits(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    tools = [{'type': 'function', 'function': {'name': 'get_positions'}}]
+    recorded_at = datetime(2026, 10, 19, 9, 15, 2)
+
+    async def record_and_replay():
+        key = await cache.akey("deepseek-chat", _cycle_messages(recorded_at), tools)
+        await cache.aput(key, {'model': 'deepseek-chat', 'message': {'role': 'assistant', 'content': 'ждём'}})
+        replay_key = await cache.akey("deepseek-chat", _cycle_messages(recorded_at + timedelta(days=3, seconds=7)), tools)
+        return await cache.aget(replay_key)
+
+    assert asyncio.run(record_and_replay())['message']['content'] == 'ждём'
+    assert cache.stats['hits'] == 1
+
+
+def test_key_still_depends_on_market_data():
+    now = datetime(2026, 10, 19, 9, 15)
+    messages = _cycle_messages(now)
+    changed = _cycle_messages(now)
+    changed[3] = {**changed[3], 'content': changed[3]['content'].replace('"count": 0', '"count": 1')}
+    assert response_cache_key("m", messages) != response_cache_key("m", changed)
+
+
+def test_index_is_built_on_first_use(tmp_path):
+    ResponseCache(str(tmp_path)).put("aa1", {'content': 'x'})
+
+    cache = ResponseCache(str(tmp_path))
+    assert cache.report()['entries'] == 0  # конструктор не обходит каталог
+    assert cache.get("aa1") == {'content': 'x'}
+    assert cache.report()['entries'] == 1
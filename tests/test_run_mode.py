@@ -0,0 +1,28 @@
+import types
+
+from utils import run_mode
+
+ORDER_TOOL = types.SimpleNamespace(name="place_order")
+WRITE_TOOL = types.SimpleNamespace(name="set_trading_stop")
+FLAGGED_TOOL = types.SimpleNamespace(name="custom_entry", places_orders=True)
+READ_TOOL = types.SimpleNamespace(name="get_positions")
+
+
+def test_live_mode_runs_every_tool(monkeypatch):
+    monkeypatch.setattr(run_mode, "BOT_RUN_MODE", "live")
+    assert not run_mode.orders_blocked()
+    assert not any(run_mode.is_tool_blocked(tool) for tool in (ORDER_TOOL, WRITE_TOOL, FLAGGED_TOOL, READ_TOOL))
+
+
+def test_replay_blocks_only_exchange_writes(monkeypatch):
+    monkeypatch.setattr(run_mode, "BOT_RUN_MODE", "replay")
+    assert run_mode.is_tool_blocked(ORDER_TOOL)
+    assert run_mode.is_tool_blocked(WRITE_TOOL)
+    assert run_mode.is_tool_blocked(FLAGGED_TOOL)
+    assert not run_mode.is_tool_blocked(READ_TOOL)
+
+
+def test_unknown_mode_does_not_trade(monkeypatch):
+    monkeypatch.setattr(run_mode, "BOT_RUN_MODE", "paper")
+    assert run_mode.is_tool_blocked(ORDER_TOOL)
+    assert run_mode.simulated_result(ORDER_TOOL, {"qty": 1})["simulated"] is True
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from utils import state_dir
+from utils.state_dir import enter_worker_state_dir
+
+
+def test_worker_requires_own_locked_state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_dir, "LAUNCH_DIR", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(RuntimeError):
+        enter_worker_state_dir(None)
+
+    lock = enter_worker_state_dir("state/account-1")
+    try:
+        assert os.getcwd() == str(tmp_path / "state" / "account-1")
+        with pytest.raises(RuntimeError, match="занят"):
+            enter_worker_state_dir(str(tmp_path / "state" / "account-1"))
+    finally:
+        lock.close()
+
+
+def test_relative_paths_resolve_from_launch_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(state_dir, "LAUNCH_DIR", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    lock = enter_worker_state_dir("state/account-2")
+    try:
+        # После перехода в каталог состояния общий сокет хаба по-прежнему ищется от каталога запуска
+        assert state_dir.launch_path("hub.sock") == str(tmp_path / "hub.sock")
+        assert state_dir.launch_path("/tmp/hub.sock") == "/tmp/hub.sock"
+    finally:
+        lock.close()
+
+
+def test_module_uses_only_standard_library():
+    # Импортируется раньше utils.helpers (до перехода в каталог состояния) — без зависимостей проекта
+    with open(state_dir.__file__, encoding="utf-8") as f:
+        source = f.read()
+    assert "from utils" not in source and "import utils" not in source
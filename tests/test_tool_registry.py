@@ -0,0 +1,132 @@
+# tests/test_tool_registry.py
+import asyncio
+import importlib
+import os
+import sys
+import threading
+import types
+
+import pytest
+
+from utils import tool_registry
+
+
+def test_fingerprint_covers_tool_subpackages(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_registry, "TOOLS_DIR", str(tmp_path))
+    (tmp_path / "top_tool.py").write_text("X = 1\n")
+    nested = tmp_path / "exchange"
+    nested.mkdir()
+    (nested / "orders.py").write_text("Y = 1\n")
+    (tmp_path / "__pycache__").mkdir()
+    before = tool_registry._tools_fingerprint()
+
+    (tmp_path / "__pycache__" / "top_tool.cpython-311.pyc").write_bytes(b"\0")
+    assert tool_registry._tools_fingerprint() == before
+
+    (nested / "orders.py").write_text("Y = 22\n")
+    assert tool_registry._tools_fingerprint() != before
+
+
+def test_fingerprint_of_missing_dir_is_stable(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_registry, "TOOLS_DIR", os.path.join(str(tmp_path), "absent"))
+    assert tool_registry._tools_fingerprint() == tool_registry._tools_fingerprint()
+
+
+TOOL_MODULE = '''
+import threading
+
+GATE = threading.Event()
+GATE.set()
+
+
+class {cls}:
+    name = "{name}"
+
+    def __init__(self):
+        assert GATE.wait(5)
+
+    def to_function_definition(self):
+        return {{"type": "function", "function": {{"name": self.name, "parameters": {{}}}}}}
+'''
+
+
+@pytest.fixture
+def fake_tools(tmp_path, monkeypatch):
+    """Пакет из двух модулей инструментов и tools.get_all_tools, импортирующий оба."""
+    package = tmp_path / "fake_tools_pkg"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "alpha_tool.py").write_text(TOOL_MODULE.format(cls="AlphaTool", name="alpha"))
+    (package / "beta_tool.py").write_text(TOOL_MODULE.format(cls="BetaTool", name="beta"))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(tool_registry, "TOOLS_DIR", str(package))
+    monkeypatch.setattr(tool_registry, "TOOL_SCHEMAS_CACHE_FILE", str(tmp_path / "schemas.json"))
+
+    def get_all_tools():
+        from fake_tools_pkg.alpha_tool import AlphaTool
+        from fake_tools_pkg.beta_tool import BetaTool
+        return [AlphaTool(), BetaTool()]
+
+    monkeypatch.setitem(sys.modules, "tools", types.SimpleNamespace(get_all_tools=get_all_tools))
+    yield
+    for name in [m for m in sys.modules if m.startswith("fake_tools_pkg")]:
+        del sys.modules[name]
+
+
+def _forget_tool_modules():
+    for name in ("fake_tools_pkg.alpha_tool", "fake_tools_pkg.beta_tool"):
+        sys.modules.pop(name, None)
+
+
+def test_warm_schema_cache_loads_only_requested_module(fake_tools):
+    assert tool_registry.ToolRegistry().names() == ["alpha", "beta"]  # холодный кэш: загружаются все
+    _forget_tool_modules()
+
+    registry = tool_registry.ToolRegistry()
+    assert registry.get("alpha").name == "alpha"
+    assert "fake_tools_pkg.alpha_tool" in sys.modules
+    assert "fake_tools_pkg.beta_tool" not in sys.modules
+    assert registry.get("missing") is None
+    assert "fake_tools_pkg.beta_tool" not in sys.modules
+
+
+def test_aget_is_not_blocked_by_warm_up_of_another_tool(fake_tools):
+    tool_registry.ToolRegistry().schemas()
+    _forget_tool_modules()
+    beta_tool = importlib.import_module("fake_tools_pkg.beta_tool")
+    beta_tool.GATE.clear()  # создание beta «зависает», как медленный импорт при прогреве
+
+    registry = tool_registry.ToolRegistry()
+    warm_up = threading.Thread(target=registry.get, args=("beta",))
+    warm_up.start()
+    try:
+        alpha = asyncio.run(asyncio.wait_for(registry.aget("alpha"), timeout=2))
+        assert alpha.name == "alpha"
+        assert warm_up.is_alive()
+    finally:
+        beta_tool.GATE.set()
+        warm_up.join()
+    assert registry.get("beta").name == "beta"
+
+
+class _AsyncBeta:
+    name = "beta"
+
+    def to_function_definition(self):
+        return {"type": "function", "function": {"name": "beta", "parameters": {"async": True}}}
+
+
+@pytest.mark.parametrize("warm_cache", [False, True])
+def test_factory_replaces_builtin_with_same_name(fake_tools, warm_cache):
+    if warm_cache:
+        tool_registry.ToolRegistry().schemas()
+        _forget_tool_modules()
+
+    registry = tool_registry.ToolRegistry()
+    registry.register_factory("beta", _AsyncBeta)
+
+    assert registry.names() == ["alpha", "beta"]
+    assert registry.schemas()[1]["function"]["parameters"] == {"async": True}
+    assert isinstance(registry.get("beta"), _AsyncBeta)
+    registry.warm_up()
+    assert isinstance(registry.get("beta"), _AsyncBeta)
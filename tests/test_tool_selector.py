@@ -0,0 +1,89 @@
+# tests/test_tool_selector.py
+import pytest
+
+from utils import tool_selector
+from utils.tool_selector import ToolSelector
+
+NAMES = ["get_klines", "get_orderbook", "get_order_book", "place_order", "close_position",
+         "get_wallet_balance", "get_news", "wait_for_next_candle"]
+
+
+def schemas(names=NAMES):
+    return [{'type': 'function', 'function': {'name': name, 'parameters': {}}} for name in names]
+
+
+def names(selected):
+    return [schema['function']['name'] for schema in selected]
+
+
+@pytest.fixture
+def selector():
+    return ToolSelector(core_tools=("wait_for_next_candle",), enabled=True)
+
+
+@pytest.mark.parametrize("name, manages_position", [
+    ("close_position", True),
+    ("set_take_profit", True),
+    ("set_stop_loss", True),
+    ("get_positions", True),
+    ("place_order", False),
+    ("get_open_orders", False),
+    ("get_orderbook", False),
+    ("get_close_candles", False),
+    ("get_profit_history", False),  # "take_profit" — только два слова подряд
+    ("preorder_stats", False),
+])
+def test_whole_word_classification(name, manages_position):
+    result = (tool_selector._matches(name, tool_selector.POSITION_KEYWORDS)
+              and not tool_selector._matches(name, tool_selector.ANALYSIS_KEYWORDS))
+    assert result is manages_position
+
+
+def test_without_positions_only_position_management_is_dropped(selector):
+    selected = names(selector.select(schemas(), [], open_positions=False))
+    # Аналитические и неклассифицированные (get_news) инструменты остаются на весь цикл
+    assert selected == ["get_klines", "get_orderbook", "get_order_book", "place_order",
+                        "get_wallet_balance", "get_news", "wait_for_next_candle"]
+
+
+def test_open_positions_keep_all_tools(selector):
+    selected = names(selector.select(schemas(), [], open_positions=True))
+    assert selected == NAMES
+
+
+def test_recently_used_tools_stay_available(selector):
+    messages = [{'role': 'assistant', 'tool_calls': [{'function': {'name': 'close_position'}}]}]
+    selected = names(selector.select(schemas(), messages, open_positions=False))
+    assert "close_position" in selected
+
+
+class Usage:
+    def __init__(self, prompt_tokens, prompt_cache_hit_tokens=0):
+        self.prompt_tokens = prompt_tokens
+        self.prompt_cache_hit_tokens = prompt_cache_hit_tokens
+
+
+def test_savings_are_measured_from_prompt_tokens(selector):
+    full = schemas()
+    sent = selector.select(full, [], open_positions=False)
+    messages = [{'role': 'user', 'content': 'x' * 1000}]
+    request_chars = 1000 + tool_selector._schema_chars(sent)
+    omitted_chars = tool_selector._schema_chars(full) - tool_selector._schema_chars(sent)
+    # 1 токен на 2 символа запроса
+    selector.record_call(Usage(request_chars // 2, prompt_cache_hit_tokens=100), messages, sent, full)
+    report = selector.savings_report()
+    assert report['calls'] == 1
+    assert report['saved_schema_tokens'] == pytest.approx(omitted_chars / 2, abs=1)
+    assert report['prompt_cache_hit_ratio'] == pytest.approx(100 / (request_chars // 2), abs=1e-3)
+
+
+def test_full_schema_request_saves_nothing(selector):
+    full = schemas()
+    selector.record_call(Usage(500), [{'role': 'user', 'content': 'x'}], full, full)
+    assert selector.savings_report()['saved_schema_tokens'] == 0
+
+
+def test_disabled_selector_returns_all(selector):
+    selector.enabled = False
+    full = schemas()
+    assert selector.select(full, []) is full
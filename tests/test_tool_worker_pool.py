@@ -0,0 +1,43 @@
+# tests/test_tool_worker_pool.py
+import asyncio
+
+import pytest
+
+from utils import tool_worker_pool
+from utils.tool_worker_pool import ToolWorkerPool, _resolve_class
+
+
+class Outer:
+    class SumTool:
+        cpu_bound = True
+        name = "sum_tool"
+
+        @staticmethod
+        def compute(values):
+            return sum(values)
+
+
+def test_resolve_nested_class():
+    assert _resolve_class(__name__, "Outer.SumTool") is Outer.SumTool
+
+
+def test_resolve_rejects_function_local_class():
+    class Local:
+        pass
+
+    with pytest.raises(TypeError):
+        _resolve_class(__name__, Local.__qualname__)
+
+
+def test_nested_tool_runs_in_worker_process(monkeypatch):
+    # fork: процесс наследует модули-заглушки из conftest (spawn импортировал бы окружение заново)
+    monkeypatch.setattr(tool_worker_pool, "TOOL_WORKER_START_METHOD", "fork")
+
+    async def scenario():
+        pool = ToolWorkerPool(processes=1, max_queue=1)
+        try:
+            return await pool.run(Outer.SumTool(), {'values': [1, 2, 3]})
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(scenario()) == 6
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+import types
+
+from utils import transcript_archive
+from utils.transcript_archive import ARCHIVE_INDEX_FILE, TranscriptArchive
+
+
+def test_append_and_find_by_iteration(tmp_path):
+    archive = TranscriptArchive(str(tmp_path))
+    archive.append({'text': 'первый'}, symbol='DOGEUSDT', iteration=1)
+    archive.append({'text': 'второй'}, symbol='DOGEUSDT', iteration=2)
+    archive.close()
+
+    assert [record['text'] for record in archive.find(2)] == ['второй']
+    assert [record['text'] for record in archive.scan()] == ['первый', 'второй']
+
+
+def test_partial_index_line_is_truncated_on_load(tmp_path):
+    archive = TranscriptArchive(str(tmp_path))
+    archive.append({'text': 'целая'}, iteration=1)
+    archive.close()
+    index_path = tmp_path / ARCHIVE_INDEX_FILE
+    with open(index_path, 'a', encoding='utf-8') as f:
+        f.write('{"ts": 12')  # сбой посреди записи строки индекса
+
+    reopened = TranscriptArchive(str(tmp_path))
+    assert index_path.read_text(encoding='utf-8').endswith('\n')
+    reopened.append({'text': 'после сбоя'}, iteration=2)
+    reopened.close()
+
+    lines = index_path.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['iteration'] for line in lines] == [1, 2]
+    assert [record['text'] for record in TranscriptArchive(str(tmp_path)).scan()] == ['целая', 'после сбоя']
+
+
+def test_submit_serializes_record_at_call_time(tmp_path):
+    archive = TranscriptArchive(str(tmp_path))
+    messages = [{'role': 'user', 'content': 'вопрос'}]
+
+    async def scenario():
+        pending = archive.submit({'messages': messages}, iteration=1)
+        messages.append({'role': 'assistant', 'content': 'ответ'})
+        entry = await asyncio.wrap_future(pending)
+        second = await archive.append_async({'messages': messages}, iteration=2)
+        return entry, second
+
+    entry, second = asyncio.run(scenario())
+    archive.close()
+
+    assert len(archive.read(entry)['messages']) == 1
+    assert len(archive.read(second)['messages']) == 2
+
+
+def test_submit_serializes_in_writer_thread(tmp_path, monkeypatch):
+    archive = TranscriptArchive(str(tmp_path))
+    threads = []
+
+    def dumps(obj, **kwargs):
+        threads.append(threading.current_thread().name)
+        return json.dumps(obj, **kwargs)
+
+    monkeypatch.setattr(transcript_archive, "json", types.SimpleNamespace(dumps=dumps, loads=json.loads))
+    archive.submit({'messages': [{'role': 'user', 'content': 'вопрос'}]}, iteration=1).result()
+    archive.close()
+    # Запись индекса тоже сериализуется в потоке архива — в цикле событий json.dumps не вызывается
+    assert threads and all(name.startswith("transcript-archive") for name in threads)
+
+
+def test_dropped_messages_keep_order_and_full_versions():
+    system = {'role': 'system', 'content': 'промпт'}
+    old_user = {'role': 'user', 'content': 'старая свеча'}
+    long_tool = {'role': 'tool', 'tool_call_id': 'c1', 'content': 'x' * 100}
+    repeat = {'role': 'user', 'content': 'повтор'}
+    before = [system, old_user, long_tool, repeat, dict(repeat)]
+    # Усечение убрало старое сообщение, один из повторов и укоротило ответ инструмента
+    after = [system, {**long_tool, 'content': 'x' * 10}, repeat]
+    assert transcript_archive.dropped_messages(before, after) == [old_user, long_tool, repeat]
+    assert transcript_archive.dropped_messages(before, before) == []
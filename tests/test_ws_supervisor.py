@@ -0,0 +1,175 @@
+# tests/test_ws_supervisor.py
+import asyncio
+import time
+
+import pytest
+
+from utils import ws_supervisor
+from utils.ws_supervisor import RecentIds, WebSocketSupervisor
+
+
+class FakeWS:
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.exited = False
+
+    def is_connected(self):
+        return self.connected and not self.exited
+
+    def exit(self):
+        self.exited = True
+
+
+@pytest.fixture(autouse=True)
+def fast_timeouts(monkeypatch):
+    monkeypatch.setattr(ws_supervisor, "WS_READY_TIMEOUT", 0.1)
+    monkeypatch.setattr(ws_supervisor, "WS_BACKOFF_INITIAL", 0.01)
+
+
+def make_supervisor(connects, backfills=None, subscribed=None, **kwargs):
+    """connects — очередь результатов connect(): FakeWS или исключение."""
+    created = []
+
+    def connect():
+        result = connects.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        created.append(result)
+        return result
+
+    async def backfill(since):
+        backfills.append(since)
+
+    supervisor = WebSocketSupervisor(
+        "test", connect, lambda ws: subscribed.append(ws) if subscribed is not None else None,
+        backfill if backfills is not None else None, check_interval=0.01, **kwargs
+    )
+    return supervisor, created
+
+
+def test_recent_ids_rejects_repeats_and_forgets_oldest():
+    ids = RecentIds(limit=2)
+    assert ids.add("a") and ids.add("b")
+    assert not ids.add("a")
+    assert ids.add("c")       # "a" вытеснен
+    assert ids.add("a")
+
+
+def test_backfill_starts_from_last_received_message():
+    async def scenario():
+        backfills, subscribed = [], []
+        first, second = FakeWS(), FakeWS()
+        supervisor, _ = make_supervisor([first, second], backfills, subscribed)
+        supervisor.add_stream('execution')
+        await supervisor.start(first)
+        supervisor.note_message('execution', {'data': []})
+        last_message = supervisor.streams['execution'].last_message_wall
+        await asyncio.sleep(0.05)
+        first.connected = False
+        for _ in range(100):
+            if supervisor.reconnects:
+                break
+            await asyncio.sleep(0.01)
+        await supervisor.stop()
+        return supervisor, backfills, subscribed, first, second, last_message
+
+    supervisor, backfills, subscribed, first, second, last_message = asyncio.run(scenario())
+    assert supervisor.reconnects == 1
+    assert first.exited
+    assert subscribed == [second]
+    assert backfills == [pytest.approx(last_message)]
+    assert supervisor.ws is second
+
+
+def test_failed_startup_is_retried_in_background():
+    async def scenario():
+        ws = FakeWS()
+        stuck = FakeWS(connected=False)
+        subscribed = []
+        supervisor, created = make_supervisor([ConnectionError("нет сети"), stuck, ws], subscribed=subscribed)
+        assert await supervisor.start() is None
+        for _ in range(200):
+            if supervisor.ws is ws:
+                break
+            await asyncio.sleep(0.01)
+        await supervisor.stop()
+        return supervisor, subscribed, stuck, ws
+
+    supervisor, subscribed, stuck, ws = asyncio.run(scenario())
+    assert supervisor.ws is ws
+    assert subscribed == [ws]
+    assert stuck.exited  # не подключившийся сокет закрыт, а не брошен
+
+
+def test_missing_pong_is_a_problem():
+    supervisor, _ = make_supervisor([], heartbeat_timeout=30)
+    ws = FakeWS()
+    ws.ws = type("App", (), {'last_pong_tm': time.time() - 5})()
+    supervisor.ws = ws
+    assert supervisor._problem() is None
+    ws.ws.last_pong_tm = time.time() - 120
+    assert "ping" in supervisor._problem()
+
+
+def test_stale_pulse_stream_is_a_problem(monkeypatch):
+    supervisor, _ = make_supervisor([])
+    supervisor.add_stream('kline', max_silence=60)
+    supervisor.add_stream('liquidation')
+    supervisor.ws = FakeWS()
+    supervisor.note_message('kline', {'ts': int(time.time() * 1000)})
+    supervisor.streams['liquidation'].last_message_at = time.monotonic() - 3600
+    assert supervisor._problem() is None  # без max_silence тишина допустима
+    supervisor.streams['kline'].last_message_at = time.monotonic() - 61
+    assert "kline" in supervisor._problem()
+
+
+def test_failed_backfill_keeps_gap_start_and_is_retried():
+    async def scenario():
+        calls = []
+        failures = [ConnectionError("REST недоступен")] * 2
+        first, second, third = FakeWS(), FakeWS(), FakeWS()
+        connects = [second, third]
+
+        def connect():
+            return connects.pop(0)
+
+        async def backfill(since):
+            calls.append(since)
+            if failures:
+                raise failures.pop(0)
+
+        supervisor = WebSocketSupervisor("test", connect, lambda ws: None, backfill, check_interval=0.01)
+        supervisor.add_stream('execution')
+        await supervisor.start(first)
+        supervisor.note_message('execution', {'data': []})
+        gap_start = supervisor.streams['execution'].last_message_wall
+        await asyncio.sleep(0.02)
+
+        first.connected = False
+        for _ in range(100):
+            if calls:
+                break
+            await asyncio.sleep(0.01)
+        # Догрузка не удалась, а поток уже снова приносит сообщения
+        supervisor.note_message('execution', {'data': []})
+        assert supervisor.streams['execution'].last_message_wall > gap_start
+
+        # Следующий разрыв до успешного повтора: догрузка начинается с исходной границы
+        supervisor._cancel_backfill_retry()
+        second.connected = False
+        for _ in range(100):
+            if len(calls) >= 2:
+                break
+            await asyncio.sleep(0.01)
+        # Повтор по таймеру догружает тот же разрыв и сдвигает границу
+        for _ in range(200):
+            if supervisor._backfill_from is None:
+                break
+            await asyncio.sleep(0.01)
+        await supervisor.stop()
+        return supervisor, calls, gap_start
+
+    supervisor, calls, gap_start = asyncio.run(scenario())
+    assert calls[:3] == [pytest.approx(gap_start)] * 3
+    assert supervisor._backfill_from is None
+    assert supervisor._backfill_retry is None
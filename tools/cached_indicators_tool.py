@@ -0,0 +1,48 @@
+# tools/cached_indicators_tool.py
+from .base_tool import BaseTool
+from typing import Dict, Any
+from utils.indicator_engine import get_indicator_engine
+
+class CachedIndicatorsTool(BaseTool):
+    @property
+    def name(self):
+        return "get_cached_indicators"
+
+    @property
+    def description(self):
+        return "Возвращает последние значения индикаторов (EMA 9/21/50/200, RSI 14, ATR 14, MACD, полосы Боллинджера) и свечные паттерны по закрытым свечам из локального кэша, без запросов к бирже. Используй для быстрой оценки рынка; для истории паттернов укажи pattern_lookback."
+
+    @property
+    def parameters(self):
+        return {
+            "symbol": {
+                "type": "string",
+                "description": "Торговая пара, например 'DOGEUSDT'.",
+                "pattern": "^[A-Z0-9]+$"
+            },
+            "timeframe": {
+                "type": "string",
+                "description": "Таймфрейм свечей (по умолчанию '15m').",
+                "enum": ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "12h", "1d"],
+                "default": "15m"
+            },
+            "pattern_lookback": {
+                "type": "integer",
+                "description": "Сколько последних свечей просканировать на паттерны (0 — только последняя свеча).",
+                "default": 0
+            }
+        }
+
+    @property
+    def required_parameters(self):
+        return ["symbol"]
+
+    async def execute(self, symbol: str, timeframe: str = "15m", pattern_lookback: int = 0) -> Dict[str, Any]:
+        engine = get_indicator_engine()
+        snapshot = engine.snapshot(symbol, timeframe)
+        if snapshot is None:
+            return {"error": f"В кэше нет закрытых свечей {symbol} {timeframe}"}
+        result = {"symbol": symbol, "timeframe": timeframe, **snapshot}
+        if pattern_lookback:
+            result["pattern_history"] = engine.scan_patterns(symbol, timeframe, pattern_lookback)
+        return result
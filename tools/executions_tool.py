@@ -0,0 +1,47 @@
+# tools/executions_tool.py
+from .base_tool import BaseTool
+from typing import Dict, Any, Optional
+from utils.bybit_async_client import BybitAPIError, get_bybit_async_client
+
+EXECUTION_FIELDS = ("execId", "orderId", "symbol", "side", "execType", "execPrice", "execQty", "execFee",
+                    "closedSize", "isMaker", "execTime")
+MAX_LIMIT = 100
+
+
+class ExecutionsTool(BaseTool):
+    @property
+    def name(self):
+        return "get_executions"
+
+    @property
+    def description(self):
+        return "Возвращает последние исполнения (сделки) аккаунта от новых к старым: цена, объём, комиссия, закрытый объём. Без symbol — по всем парам."
+
+    @property
+    def parameters(self):
+        return {
+            "symbol": {
+                "type": "string",
+                "description": "Торговая пара, например 'DOGEUSDT'. Если не указана — все пары.",
+                "pattern": "^[A-Z0-9]+$"
+            },
+            "limit": {
+                "type": "integer",
+                "description": f"Сколько последних исполнений вернуть (по умолчанию 20, максимум {MAX_LIMIT}).",
+                "default": 20
+            }
+        }
+
+    @property
+    def required_parameters(self):
+        return []
+
+    async def execute(self, symbol: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        try:
+            # Одна страница: модели нужны последние исполнения, а не вся история
+            executions = await get_bybit_async_client().fetch_executions(symbol, limit=limit, pages=1)
+        except BybitAPIError as e:
+            return {"error": str(e)}
+        return {"count": len(executions),
+                "executions": [{field: execution.get(field) for field in EXECUTION_FIELDS} for execution in executions]}
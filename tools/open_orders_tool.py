@@ -0,0 +1,43 @@
+# tools/open_orders_tool.py
+from .base_tool import BaseTool
+from typing import Dict, Any, Optional
+from utils.bybit_async_client import BybitAPIError, get_bybit_async_client
+
+ORDER_FIELDS = ("orderId", "orderLinkId", "symbol", "side", "orderType", "price", "qty", "leavesQty",
+                "triggerPrice", "takeProfit", "stopLoss", "stopOrderType", "reduceOnly", "orderStatus", "createdTime")
+
+
+class OpenOrdersTool(BaseTool):
+    @property
+    def name(self):
+        return "get_open_orders"
+
+    @property
+    def description(self):
+        return "Возвращает активные ордера аккаунта, включая условные (TP/SL, стоп-ордера). Без symbol — все ордера по расчётной монете."
+
+    @property
+    def parameters(self):
+        return {
+            "symbol": {
+                "type": "string",
+                "description": "Торговая пара, например 'DOGEUSDT'. Если не указана — все ордера.",
+                "pattern": "^[A-Z0-9]+$"
+            },
+            "settle_coin": {
+                "type": "string",
+                "description": "Расчётная монета, когда symbol не указан (по умолчанию 'USDT').",
+                "default": "USDT"
+            }
+        }
+
+    @property
+    def required_parameters(self):
+        return []
+
+    async def execute(self, symbol: Optional[str] = None, settle_coin: str = "USDT") -> Dict[str, Any]:
+        try:
+            orders = await get_bybit_async_client().fetch_open_orders(symbol, settle_coin=settle_coin)
+        except BybitAPIError as e:
+            return {"error": str(e)}
+        return {"count": len(orders), "orders": [{field: order.get(field) for field in ORDER_FIELDS} for order in orders]}
@@ -0,0 +1,109 @@
+# tools/pattern_statistics_tool.py
+from .base_tool import BaseTool
+from typing import Dict, Any, List
+
+import numpy as np
+
+from utils.candle_store import DEFAULT_MAX_CANDLES, get_candle_store
+from utils.indicator_engine import detect_patterns
+
+DEFAULT_HORIZONS = (1, 4, 16)
+
+
+class PatternStatisticsTool(BaseTool):
+    # Скан всей истории и статистика по горизонтам — чистые вычисления, выполняются в пуле процессов
+    cpu_bound = True
+
+    @property
+    def name(self):
+        return "get_pattern_statistics"
+
+    @property
+    def description(self):
+        return "Сканирует историю закрытых свечей из локального кэша на свечные паттерны (doji, hammer, shooting_star, поглощения) и для каждого паттерна возвращает число срабатываний, долю роста и среднее/медианное изменение цены через заданное число свечей, а также время последних срабатываний. Используй, чтобы оценить, насколько паттерн на текущей свече исторически надёжен для этой пары."
+
+    @property
+    def parameters(self):
+        return {
+            "symbol": {
+                "type": "string",
+                "description": "Торговая пара, например 'DOGEUSDT'.",
+                "pattern": "^[A-Z0-9]+$"
+            },
+            "timeframe": {
+                "type": "string",
+                "description": "Таймфрейм свечей (по умолчанию '15m').",
+                "enum": ["1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "12h", "1d"],
+                "default": "15m"
+            },
+            "lookback": {
+                "type": "integer",
+                "description": f"Сколько последних свечей сканировать (по умолчанию и максимум {DEFAULT_MAX_CANDLES}).",
+                "default": DEFAULT_MAX_CANDLES
+            },
+            "horizons": {
+                "type": "array",
+                "items": {"type": "integer"},
+                "description": "Через сколько свечей после паттерна измерять изменение цены (по умолчанию [1, 4, 16]).",
+                "default": list(DEFAULT_HORIZONS)
+            }
+        }
+
+    @property
+    def required_parameters(self):
+        return ["symbol"]
+
+    async def prepare(self, symbol: str, timeframe: str = "15m", lookback: int = DEFAULT_MAX_CANDLES,
+                      horizons: List[int] = DEFAULT_HORIZONS) -> Dict[str, Any]:
+        """Копирует колонки из кэша свечей в цикле событий; в процесс уходят только массивы."""
+        lookback = max(2, min(int(lookback), DEFAULT_MAX_CANDLES))
+        columns = get_candle_store().tail(symbol, timeframe, lookback, ('timestamp', 'open', 'high', 'low', 'close'))
+        return {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "horizons": sorted({int(h) for h in horizons if int(h) > 0}),
+            **(columns or {}),
+        }
+
+    @staticmethod
+    def compute(symbol: str, timeframe: str, horizons: List[int], timestamp: np.ndarray = None,
+                open: np.ndarray = None, high: np.ndarray = None, low: np.ndarray = None,
+                close: np.ndarray = None) -> Dict[str, Any]:
+        if timestamp is None or len(timestamp) < 2:
+            return {"error": f"В кэше недостаточно закрытых свечей {symbol} {timeframe}"}
+        masks = detect_patterns(open, high, low, close)
+        forward = {}
+        for horizon in horizons:
+            change = np.full(len(close), np.nan)
+            if horizon < len(close):
+                change[:-horizon] = (close[horizon:] / close[:-horizon] - 1.0) * 100
+            forward[horizon] = change
+
+        patterns = {}
+        for pattern, mask in masks.items():
+            hits = np.flatnonzero(mask)
+            if not len(hits):
+                continue
+            stats = {"count": int(len(hits)), "last_timestamps": timestamp[hits[-5:]].tolist(), "horizons": {}}
+            for horizon, change in forward.items():
+                values = change[hits]
+                values = values[~np.isnan(values)]
+                if not len(values):
+                    continue
+                stats["horizons"][str(horizon)] = {
+                    "samples": int(len(values)),
+                    "up_ratio": round(float((values > 0).mean()), 3),
+                    "mean_change_pct": round(float(values.mean()), 4),
+                    "median_change_pct": round(float(np.median(values)), 4),
+                }
+            patterns[pattern] = stats
+
+        return {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "candles_scanned": int(len(timestamp)),
+            "from_timestamp": int(timestamp[0]),
+            "to_timestamp": int(timestamp[-1]),
+            "current_patterns": [pattern for pattern, mask in masks.items() if mask[-1]],
+            "patterns": patterns,
+        }
@@ -0,0 +1,46 @@
+# tools/positions_tool.py
+from .base_tool import BaseTool
+from typing import Dict, Any, Optional
+from utils.bybit_async_client import BybitAPIError, get_bybit_async_client
+
+POSITION_FIELDS = ("symbol", "side", "size", "avgPrice", "markPrice", "liqPrice", "leverage", "positionValue",
+                   "unrealisedPnl", "takeProfit", "stopLoss", "trailingStop", "positionIdx", "updatedTime")
+
+
+class PositionsTool(BaseTool):
+    @property
+    def name(self):
+        return "get_positions"
+
+    @property
+    def description(self):
+        return "Возвращает открытые позиции аккаунта (сторона, размер, цена входа, ликвидации, нереализованный PnL, TP/SL). Без symbol — все позиции по расчётной монете."
+
+    @property
+    def parameters(self):
+        return {
+            "symbol": {
+                "type": "string",
+                "description": "Торговая пара, например 'DOGEUSDT'. Если не указана — все позиции.",
+                "pattern": "^[A-Z0-9]+$"
+            },
+            "settle_coin": {
+                "type": "string",
+                "description": "Расчётная монета, когда symbol не указан (по умолчанию 'USDT').",
+                "default": "USDT"
+            }
+        }
+
+    @property
+    def required_parameters(self):
+        return []
+
+    async def execute(self, symbol: Optional[str] = None, settle_coin: str = "USDT") -> Dict[str, Any]:
+        try:
+            positions = await get_bybit_async_client().fetch_positions(symbol, settle_coin=settle_coin)
+        except BybitAPIError as e:
+            return {"error": str(e)}
+        # Bybit отдаёт и пустые слоты позиций (size 0) — модели они не нужны
+        opened = [{field: position.get(field) for field in POSITION_FIELDS}
+                  for position in positions if float(position.get("size") or 0)]
+        return {"count": len(opened), "positions": opened}
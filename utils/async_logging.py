@@ -0,0 +1,196 @@
+# utils/async_logging.py
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.helpers import logger
+
+# Уровень вывода в консоль: quiet — только предупреждения и ошибки, normal — события, verbose — всё,
+# включая полные тексты рассуждений моделей
+CONSOLE_VERBOSITY = os.getenv("CONSOLE_VERBOSITY", "normal")
+VERBOSITY_LEVELS = {'quiet': logging.WARNING, 'normal': logging.INFO, 'verbose': logging.DEBUG}
+# Тема консольных сообщений с полными текстами моделей: в events.jsonl они не пишутся (есть transcripts.log)
+MODEL_TEXT_TOPIC = 'model'
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+EVENTS_LOG_FILE = os.path.join(LOG_DIR, "events.jsonl")
+TRANSCRIPTS_LOG_FILE = os.path.join(LOG_DIR, "transcripts.log")
+LOG_FILE_MAX_BYTES = 50 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+LOG_QUEUE_SIZE = 100000
+
+# Ограничение частоты консольных сообщений по темам (сообщений в окне); сверх лимита — выборка 1 из N
+TOPIC_RATE_WINDOW = 10.0
+TOPIC_RATE_LIMITS = {
+    'liquidation': 20,
+    'position': 10,
+    'order': 50,
+    'execution': 50,
+    'wallet': 5,
+}
+DEFAULT_TOPIC_RATE_LIMIT = 100
+TOPIC_SAMPLE_EVERY = 100
+
+console_logger = logging.getLogger("console")
+console_logger.propagate = False
+transcript_logger = logging.getLogger("transcripts")
+transcript_logger.propagate = False
+transcript_logger.setLevel(logging.INFO)
+
+
+class TopicRateLimitFilter(logging.Filter):
+    """Пропускает не больше лимита записей темы за окно, дальше — каждую N-ю. Считает отброшенные."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._windows: Dict[str, list] = {}  # topic -> [начало окна, счётчик, отброшено]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        topic = getattr(record, 'topic', None)
+        if topic is None or record.levelno >= logging.WARNING:
+            return True
+        limit = TOPIC_RATE_LIMITS.get(topic, DEFAULT_TOPIC_RATE_LIMIT)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(topic)
+            if window is None or now - window[0] >= TOPIC_RATE_WINDOW:
+                if window is not None and window[2]:
+                    record.msg = f"{record.msg} (+{window[2]} подавлено за {TOPIC_RATE_WINDOW:.0f} с)"
+                window = self._windows[topic] = [now, 0, 0]
+            window[1] += 1
+            over = window[1] - limit
+            if over <= 0 or over % TOPIC_SAMPLE_EVERY == 0:
+                return True
+            window[2] += 1
+            return False
+
+
+def console_level() -> int:
+    return VERBOSITY_LEVELS.get(CONSOLE_VERBOSITY, logging.INFO)
+
+
+def _is_console_stream(handler: logging.Handler) -> bool:
+    """Обработчик пишет в консоль (StreamHandler, но не файловый)."""
+    return isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler)
+
+
+def _is_event_record(record: logging.LogRecord) -> bool:
+    """В events.jsonl попадают события, но не тексты моделей и не транскрипты."""
+    if record.name == transcript_logger.name:
+        return False
+    return not (record.name == console_logger.name and getattr(record, 'topic', None) == MODEL_TEXT_TOPIC)
+
+
+class JsonRecordFormatter(logging.Formatter):
+    """Структурная запись: одна JSON-строка на событие."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'topic': getattr(record, 'topic', None),
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload['fields'] = fields
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Никогда не блокирует вызывающий поток: при переполненной очереди запись отбрасывается."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_async_logging() -> logging.handlers.QueueListener:
+    """
+    Переводит логирование на очередь: вызывающий поток только кладёт запись в очередь,
+    а запись в консоль и файлы выполняет отдельный поток QueueListener.
+    Существующие обработчики логгера utils.helpers переносятся за очередь.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+    # --- Приёмники (работают в потоке QueueListener) ---
+    # Если у логгера нет своих обработчиков, он пишет через корневой — переносим их
+    sinks = list(logger.handlers) or list(logging.getLogger().handlers)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter("%(message)s"))
+    console_handler.addFilter(lambda record: record.name == console_logger.name)
+
+    events_handler = logging.handlers.RotatingFileHandler(
+        EVENTS_LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+    )
+    events_handler.setFormatter(JsonRecordFormatter())
+    events_handler.addFilter(_is_event_record)
+
+    transcripts_handler = logging.handlers.RotatingFileHandler(
+        TRANSCRIPTS_LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+    )
+    transcripts_handler.setFormatter(logging.Formatter("%(asctime)s [%(kind)s] %(message)s"))
+    transcripts_handler.addFilter(lambda record: record.name == transcript_logger.name)
+
+    for sink in sinks:
+        sink.addFilter(lambda record: record.name not in (console_logger.name, transcript_logger.name))
+        if _is_console_stream(sink):
+            # Консольные обработчики логгера подчиняются той же CONSOLE_VERBOSITY, что и console()
+            sink.addFilter(lambda record: record.levelno >= console_level())
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, *sinks, console_handler, events_handler, transcripts_handler, respect_handler_level=True
+    )
+
+    # --- Источники: вместо прямой записи кладут запись в очередь ---
+    queue_handler = DroppingQueueHandler(log_queue)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+
+    console_queue_handler = DroppingQueueHandler(log_queue)
+    console_queue_handler.addFilter(TopicRateLimitFilter())
+    console_logger.handlers = [console_queue_handler]
+    console_logger.setLevel(console_level())
+
+    transcript_logger.handlers = [DroppingQueueHandler(log_queue)]
+
+    _listener.start()
+    return _listener
+
+
+def shutdown_async_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает поток логирования."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def console(message: str, level: int = logging.INFO, topic: Optional[str] = None, **fields):
+    """Замена print(): неблокирующий вывод в консоль с учётом CONSOLE_VERBOSITY и лимитов темы."""
+    console_logger.log(level, message, extra={'topic': topic, 'fields': fields or None})
+
+
+def log_transcript(kind: str, text: str, **fields):
+    """Пишет крупный текст модели (рассуждения, ответы) в отдельный файл, минуя консоль."""
+    transcript_logger.info(text, extra={'kind': kind, 'topic': 'transcript', 'fields': fields or None})
@@ -0,0 +1,233 @@
+# utils/bybit_async_client.py
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+
+from config import BYBIT_API_KEY, BYBIT_API_SECRET
+from utils.helpers import logger
+
+BYBIT_REST_URL = os.getenv("BYBIT_REST_URL", "https://api.bybit.com")
+BYBIT_RECV_WINDOW = os.getenv("BYBIT_RECV_WINDOW", "5000")
+# Пул соединений: keep-alive, общее ограничение одновременных запросов
+HTTP_POOL_SIZE = int(os.getenv("BYBIT_HTTP_POOL_SIZE", "20"))
+HTTP_KEEPALIVE_SECONDS = 60
+HTTP_TIMEOUT_SECONDS = 10
+# Сколько запросов оставлять в запасе от лимита эндпоинта (X-Bapi-Limit-Status)
+RATE_LIMIT_RESERVE = 1
+RATE_LIMIT_RETRY_CODE = 10006  # "Too many visits"
+MAX_RATE_LIMIT_RETRIES = 3
+# Ограничение страниц при постраничной выборке (nextPageCursor), чтобы ошибка курсора не зациклила запрос
+MAX_PAGES = 50
+
+ReadRequest = Tuple[str, Dict[str, Any]]  # (путь, параметры) для batch_get
+
+
+class BybitAPIError(Exception):
+    def __init__(self, ret_code: int, ret_msg: str, path: str):
+        super().__init__(f"Bybit {path}: {ret_code} {ret_msg}")
+        self.ret_code = ret_code
+        self.ret_msg = ret_msg
+        self.path = path
+
+
+class _EndpointLimit:
+    """Остаток лимита эндпоинта по заголовкам ответа; запросы сверх остатка ждут сброса окна."""
+
+    __slots__ = ("remaining", "reset_at")
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+
+    async def acquire(self):
+        while self.remaining is not None and self.remaining <= RATE_LIMIT_RESERVE:
+            delay = self.reset_at - time.time()
+            if delay <= 0:
+                self.remaining = None  # окно сброшено, точный остаток придёт со следующим ответом
+                break
+            await asyncio.sleep(delay)
+        if self.remaining is not None:
+            self.remaining -= 1  # учитываем запросы, ответы на которые ещё не пришли
+
+    def update(self, headers):
+        remaining = headers.get("X-Bapi-Limit-Status")
+        reset_ms = headers.get("X-Bapi-Limit-Reset-Timestamp")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_ms is not None:
+            self.reset_at = int(reset_ms) / 1000
+
+
+class _Signer:
+    """Подпись запросов v5. HMAC с ключом создаётся один раз, на запрос копируется готовое состояние."""
+
+    def __init__(self, api_key: str, api_secret: str):
+        self.api_key = api_key
+        self._keyed = hmac.new(api_secret.encode("utf-8"), digestmod=hashlib.sha256)
+        self._prefix_tail = (api_key + BYBIT_RECV_WINDOW).encode("utf-8")
+
+    def headers(self, payload: str) -> Dict[str, str]:
+        timestamp = str(int(time.time() * 1000))
+        mac = self._keyed.copy()
+        mac.update(timestamp.encode("utf-8"))
+        mac.update(self._prefix_tail)
+        mac.update(payload.encode("utf-8"))
+        return {
+            "X-BAPI-API-KEY": self.api_key,
+            "X-BAPI-TIMESTAMP": timestamp,
+            "X-BAPI-RECV-WINDOW": BYBIT_RECV_WINDOW,
+            "X-BAPI-SIGN": mac.hexdigest(),
+        }
+
+
+class BybitAsyncClient:
+    """
+    Асинхронный доступ к REST API Bybit v5 без переходов в потоки: одна сессия aiohttp
+    с пулом keep-alive соединений, подпись с заранее подготовленным ключом, ожидание
+    по лимитам эндпоинтов и параллельное выполнение независимых чтений (batch_get).
+    """
+
+    def __init__(self, api_key: Optional[str] = BYBIT_API_KEY, api_secret: Optional[str] = BYBIT_API_SECRET,
+                 base_url: str = BYBIT_REST_URL):
+        self.base_url = base_url.rstrip("/")
+        self._signer = _Signer(api_key, api_secret) if api_key and api_secret else None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._limits: Dict[str, _EndpointLimit] = {}
+        self.stats = {'requests': 0, 'rate_limited': 0, 'errors': 0}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE_SECONDS, ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS),
+                json_serialize=lambda obj: json.dumps(obj, separators=(',', ':'))
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      signed: bool = False) -> Dict[str, Any]:
+        """Выполняет запрос и возвращает поле result. Ошибки API — BybitAPIError."""
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        limit = self._limits.setdefault(path, _EndpointLimit())
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await limit.acquire()
+            headers = {"Content-Type": "application/json"}
+            if method == "GET":
+                query = urlencode(sorted(params.items()))
+                url = f"{self.base_url}{path}?{query}" if query else f"{self.base_url}{path}"
+                body = None
+                payload = query
+            else:
+                url = f"{self.base_url}{path}"
+                body = payload = json.dumps(params, separators=(',', ':'))
+            if signed:
+                if self._signer is None:
+                    raise BybitAPIError(-1, "API ключи не заданы", path)
+                headers.update(self._signer.headers(payload))
+
+            self.stats['requests'] += 1
+            async with self._get_session().request(method, url, data=body, headers=headers) as response:
+                limit.update(response.headers)
+                data = await response.json(content_type=None)
+            ret_code = data.get("retCode", 0)
+            if ret_code == RATE_LIMIT_RETRY_CODE and attempt < MAX_RATE_LIMIT_RETRIES:
+                self.stats['rate_limited'] += 1
+                limit.remaining = 0
+                logger.warning(f"⏳ Лимит запросов Bybit {path}, ожидание сброса окна")
+                continue
+            if ret_code != 0:
+                self.stats['errors'] += 1
+                raise BybitAPIError(ret_code, data.get("retMsg", ""), path)
+            return data.get("result", {})
+        raise BybitAPIError(RATE_LIMIT_RETRY_CODE, "лимит запросов не сбросился", path)
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None, signed: bool = False):
+        return await self.request("GET", path, params, signed)
+
+    async def post(self, path: str, params: Dict[str, Any]):
+        return await self.request("POST", path, params, signed=True)
+
+    async def batch_get(self, requests: Iterable[ReadRequest], signed: bool = False) -> List[Any]:
+        """
+        Независимые чтения выполняются одновременно: общее время ~ одному запросу, а не сумме.
+        Ошибка отдельного запроса возвращается на его месте в списке (как исключение).
+        """
+        return await asyncio.gather(
+            *(self.get(path, params, signed) for path, params in requests), return_exceptions=True
+        )
+
+    # --- ЧАСТЫЕ ЗАПРОСЫ ---
+
+    async def fetch_klines(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+                           limit: int = 1000, category: str = "linear") -> List[list]:
+        """Свечи в формате ccxt fetch_ohlcv: [[ts, open, high, low, close, volume], ...] по возрастанию времени."""
+        result = await self.get("/v5/market/kline", {
+            "category": category, "symbol": symbol, "interval": interval, "start": start_ms, "limit": limit
+        })
+        rows = [[int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5])]
+                for row in result.get("list", [])]
+        rows.reverse()  # Bybit отдаёт свечи от новых к старым
+        return rows
+
+    async def _fetch_pages(self, path: str, params: Dict[str, Any], pages: int = MAX_PAGES) -> List[dict]:
+        """Элементы list со всех страниц подписанного запроса (nextPageCursor), не больше pages страниц."""
+        items: List[dict] = []
+        cursor = None
+        for _ in range(pages):
+            result = await self.get(path, {**params, "cursor": cursor}, signed=True)
+            items.extend(result.get("list", []))
+            cursor = result.get("nextPageCursor")
+            if not cursor:
+                return items
+        if pages == MAX_PAGES:
+            logger.warning(f"⚠️ {path}: достигнут предел в {MAX_PAGES} страниц, остальные не загружены")
+        return items
+
+    async def fetch_executions(self, symbol: Optional[str] = None, start_ms: Optional[int] = None,
+                               category: str = "linear", limit: int = 100, pages: int = MAX_PAGES) -> List[dict]:
+        """
+        Исполнения аккаунта в формате сообщений execution_stream (от новых к старым).
+        Без symbol — по всей категории, как приватный поток. Все страницы по nextPageCursor:
+        после долгого разрыва исполнений бывает больше limit.
+        """
+        return await self._fetch_pages("/v5/execution/list", {
+            "category": category, "symbol": symbol, "startTime": start_ms, "limit": limit
+        }, pages)
+
+    async def fetch_positions(self, symbol: Optional[str] = None, settle_coin: str = "USDT",
+                              category: str = "linear") -> List[dict]:
+        """Позиции аккаунта; без symbol — все по расчётной монете (Bybit требует symbol или settleCoin)."""
+        return await self._fetch_pages("/v5/position/list", {
+            "category": category, "symbol": symbol, "settleCoin": None if symbol else settle_coin, "limit": 200
+        })
+
+    async def fetch_open_orders(self, symbol: Optional[str] = None, settle_coin: str = "USDT",
+                                category: str = "linear") -> List[dict]:
+        """Активные ордера (включая условные); без symbol — все по расчётной монете."""
+        return await self._fetch_pages("/v5/order/realtime", {
+            "category": category, "symbol": symbol, "settleCoin": None if symbol else settle_coin, "limit": 50
+        })
+
+
+_client: Optional[BybitAsyncClient] = None
+
+
+def get_bybit_async_client() -> BybitAsyncClient:
+    global _client
+    if _client is None:
+        _client = BybitAsyncClient()
+    return _client
@@ -0,0 +1,227 @@
+# utils/candle_store.py
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.helpers import logger
+
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'turnover')
+
+# Интервалы Bybit kline -> таймфреймы инструментов
+BYBIT_INTERVAL_TO_TIMEFRAME = {
+    '1': '1m', '3': '3m', '5': '5m', '15': '15m', '30': '30m',
+    '60': '1h', '120': '2h', '240': '4h', '360': '6h', '720': '12h', 'D': '1d',
+}
+
+TIMEFRAME_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000, '12h': 43_200_000, '1d': 86_400_000,
+}
+
+DEFAULT_CAPACITY = 1024
+DEFAULT_MAX_CANDLES = 5000
+
+
+class CandleArray:
+    """
+    OHLCV-ряд одного символа/таймфрейма в виде непрерывных numpy-колонок.
+    Добавление амортизированно O(1): ёмкость удваивается, а при достижении max_candles
+    старая половина окна отбрасывается одним сдвигом.
+    """
+
+    def __init__(self, symbol: str, timeframe: str,
+                 capacity: int = DEFAULT_CAPACITY, max_candles: int = DEFAULT_MAX_CANDLES):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.max_candles = max_candles
+        self._size = 0
+        self._columns = self._allocate(min(capacity, max_candles))
+
+    @staticmethod
+    def _allocate(capacity: int) -> Dict[str, np.ndarray]:
+        columns = {name: np.empty(capacity, dtype=np.float64) for name in COLUMNS[1:]}
+        columns['timestamp'] = np.empty(capacity, dtype=np.int64)
+        return columns
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._columns['timestamp'])
+
+    def _make_room(self):
+        if self._size < self.capacity:
+            return
+        if self.capacity < self.max_candles:
+            new_columns = self._allocate(min(self.capacity * 2, self.max_candles))
+            for name, column in self._columns.items():
+                new_columns[name][:self._size] = column[:self._size]
+            self._columns = new_columns
+        else:
+            keep = self.max_candles // 2
+            for column in self._columns.values():
+                column[:keep] = column[self._size - keep:self._size]
+            self._size = keep
+
+    def append(self, timestamp: int, open_: float, high: float, low: float,
+               close: float, volume: float, turnover: float = 0.0) -> bool:
+        """
+        Добавляет закрытую свечу. Свеча с тем же timestamp перезаписывает последнюю,
+        более старые игнорируются. Возвращает True, если добавлена новая свеча.
+        """
+        if self._size and timestamp <= self._columns['timestamp'][self._size - 1]:
+            if timestamp == self._columns['timestamp'][self._size - 1]:
+                self._write(self._size - 1, timestamp, open_, high, low, close, volume, turnover)
+            return False
+        self._make_room()
+        self._write(self._size, timestamp, open_, high, low, close, volume, turnover)
+        self._size += 1
+        return True
+
+    def _write(self, i, timestamp, open_, high, low, close, volume, turnover):
+        c = self._columns
+        c['timestamp'][i] = timestamp
+        c['open'][i] = open_
+        c['high'][i] = high
+        c['low'][i] = low
+        c['close'][i] = close
+        c['volume'][i] = volume
+        c['turnover'][i] = turnover
+
+    def column(self, name: str) -> np.ndarray:
+        """Представление (без копирования) заполненной части колонки."""
+        return self._columns[name][:self._size]
+
+    def last_timestamp(self) -> Optional[int]:
+        return int(self._columns['timestamp'][self._size - 1]) if self._size else None
+
+    def last(self) -> Optional[Dict[str, float]]:
+        if not self._size:
+            return None
+        return {name: self._columns[name][self._size - 1].item() for name in COLUMNS}
+
+
+CandleListener = Callable[[CandleArray, bool], None]
+
+
+class CandleStore:
+    """Хранилище CandleArray по (symbol, timeframe) с уведомлением подписчиков о закрытии свечи."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._series: Dict[Tuple[str, str], CandleArray] = {}
+        self._listeners: List[CandleListener] = []
+        # Свечи, пришедшие после пропуска: ждут догрузки пропущенных свечей через REST
+        self._held: Dict[Tuple[str, str], List[tuple]] = {}
+
+    def get(self, symbol: str, timeframe: str, create: bool = False) -> Optional[CandleArray]:
+        key = (symbol, timeframe)
+        series = self._series.get(key)
+        if series is None and create:
+            with self._lock:
+                series = self._series.setdefault(key, CandleArray(symbol, timeframe))
+        return series
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Блокировка записи: под ней поток WebSocket добавляет свечи и вызывает подписчиков."""
+        return self._lock
+
+    def keys(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return list(self._series)
+
+    def tail(self, symbol: str, timeframe: str, count: int,
+             columns: Tuple[str, ...] = COLUMNS) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Копии последних count значений колонок. Колонки CandleArray — представления, которые поток
+        WebSocket сдвигает при добавлении свечей, поэтому читателям из других потоков нужна копия под блокировкой.
+        """
+        with self._lock:
+            series = self._series.get((symbol, timeframe))
+            if series is None or not len(series):
+                return None
+            start = max(0, len(series) - count)
+            return {name: series.column(name)[start:].copy() for name in columns}
+
+    def add_listener(self, listener: CandleListener):
+        self._listeners.append(listener)
+
+    def append(self, symbol: str, timeframe: str, timestamp: int, open_: float, high: float,
+               low: float, close: float, volume: float, turnover: float = 0.0):
+        series = self.get(symbol, timeframe, create=True)
+        with self._lock:
+            is_new = series.append(timestamp, open_, high, low, close, volume, turnover)
+            for listener in self._listeners:
+                try:
+                    listener(series, is_new)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обработчика свечей {symbol} {timeframe}: {e}")
+
+    def append_kline_message(self, message: dict) -> List[Tuple[str, str, int]]:
+        """
+        Добавляет закрытые свечи из сообщения kline-потока Bybit (topic 'kline.15.DOGEUSDT').
+        Если между последней сохранённой и новой свечой есть пропуск, новая свеча откладывается,
+        а в результате возвращается (symbol, timeframe, since_ms) — откуда догрузить свечи через REST.
+        """
+        topic = message.get('topic', '')
+        parts = topic.split('.')
+        if len(parts) != 3:
+            return []
+        _, interval, symbol = parts
+        timeframe = BYBIT_INTERVAL_TO_TIMEFRAME.get(interval, interval)
+        step = TIMEFRAME_MS.get(timeframe)
+        gaps = []
+        for kline in message.get('data', []):
+            if not kline.get('confirm'):
+                continue  # незакрытые свечи не хранятся
+            candle = (
+                int(kline['start']), float(kline['open']), float(kline['high']), float(kline['low']),
+                float(kline['close']), float(kline['volume']), float(kline.get('turnover', 0.0))
+            )
+            key = (symbol, timeframe)
+            with self._lock:
+                series = self.get(symbol, timeframe)
+                last_ts = series.last_timestamp() if series is not None else None
+                if key in self._held:
+                    self._held[key].append(candle)
+                elif step and last_ts is not None and candle[0] > last_ts + step:
+                    self._held[key] = [candle]
+                    gaps.append((symbol, timeframe, last_ts + step))
+                else:
+                    self.append(symbol, timeframe, *candle)
+        return gaps
+
+    def has_gap(self, symbol: str, timeframe: str) -> bool:
+        return (symbol, timeframe) in self._held
+
+    def resolve_gap(self, symbol: str, timeframe: str, rows: list):
+        """Заполняет пропуск свечами из REST (формат ccxt), затем добавляет отложенные свечи потока."""
+        with self._lock:
+            held = self._held.pop((symbol, timeframe), [])
+            first_held = held[0][0] if held else None
+            for row in rows:
+                if first_held is not None and int(row[0]) >= first_held:
+                    break
+                self.append(symbol, timeframe, int(row[0]), float(row[1]), float(row[2]),
+                            float(row[3]), float(row[4]), float(row[5]))
+            for candle in held:
+                self.append(symbol, timeframe, *candle)
+
+    def load_history(self, symbol: str, timeframe: str, rows: list):
+        """Загружает историю в формате ccxt fetch_ohlcv: [[ts, open, high, low, close, volume], ...]."""
+        for row in rows:
+            self.append(symbol, timeframe, int(row[0]), float(row[1]), float(row[2]),
+                        float(row[3]), float(row[4]), float(row[5]))
+
+
+_store: Optional[CandleStore] = None
+
+
+def get_candle_store() -> CandleStore:
+    global _store
+    if _store is None:
+        _store = CandleStore()
+    return _store
@@ -0,0 +1,208 @@
+# utils/cycle_budget.py
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Optional
+
+from utils.helpers import logger
+
+# --- ЛИМИТЫ ЦИКЛА (можно переопределить переменными окружения) ---
+MAX_ITERATIONS_PER_CYCLE = int(os.getenv("MAX_ITERATIONS_PER_CYCLE", "8"))
+MAX_PROMPT_TOKENS_PER_CYCLE = int(os.getenv("MAX_PROMPT_TOKENS_PER_CYCLE", "600000"))
+MAX_COMPLETION_TOKENS_PER_CYCLE = int(os.getenv("MAX_COMPLETION_TOKENS_PER_CYCLE", "60000"))
+# Цикл должен укладываться в 15-минутное окно с запасом
+MAX_CYCLE_SECONDS = float(os.getenv("MAX_CYCLE_SECONDS", "600"))
+# Дневной лимит расходов (USD), 0 — без лимита
+DAILY_SPEND_LIMIT_USD = float(os.getenv("DAILY_SPEND_LIMIT_USD", "5.0"))
+# Доля лимита, после которой рассуждающая модель заменяется более дешёвой
+DOWNGRADE_THRESHOLD = float(os.getenv("BUDGET_DOWNGRADE_THRESHOLD", "0.8"))
+# Модель, на которую переходят обе модели клиента при приближении к лимитам
+DOWNGRADE_MODEL = os.getenv("BUDGET_DOWNGRADE_MODEL", "deepseek-chat")
+
+DAILY_SPEND_FILE = os.getenv("DAILY_SPEND_FILE", "daily_spend.json")
+
+# Цены за 1M токенов (USD)
+MODEL_PRICES = {
+    "deepseek-chat": {"prompt": 0.27, "completion": 1.10},
+    "deepseek-reasoner": {"prompt": 0.55, "completion": 2.19},
+}
+DEFAULT_MODEL_PRICE = {"prompt": 0.55, "completion": 2.19}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Оценивает стоимость вызова модели в USD."""
+    price = MODEL_PRICES.get(model, DEFAULT_MODEL_PRICE)
+    return (prompt_tokens * price["prompt"] + completion_tokens * price["completion"]) / 1_000_000
+
+
+def _price_level(model: str) -> float:
+    price = MODEL_PRICES.get(model, DEFAULT_MODEL_PRICE)
+    return price["prompt"] + price["completion"]
+
+
+class CycleBudget:
+    """
+    Бюджет одного цикла анализа (итерации, токены, время) и дневной лимит расходов.
+    Токены цикла считаются как разница с self.token_usage клиента на момент старта цикла.
+    """
+
+    def __init__(self):
+        self.max_iterations = MAX_ITERATIONS_PER_CYCLE
+        self.max_prompt_tokens = MAX_PROMPT_TOKENS_PER_CYCLE
+        self.max_completion_tokens = MAX_COMPLETION_TOKENS_PER_CYCLE
+        self.max_seconds = MAX_CYCLE_SECONDS
+        self.daily_limit = DAILY_SPEND_LIMIT_USD
+
+        self.iterations = 0
+        self._cycle_started_at: Optional[float] = None  # None — цикл не идёт
+        self._start_usage: Dict[str, int] = {}
+        self.last_stop_reason: Optional[str] = None
+
+        self._spend_day, self._spent_today = self._load_daily_spend()
+        # Расходы копятся в памяти и пишутся на диск пачкой (в конце цикла), а не на каждый вызов модели
+        self._spend_dirty = False
+        self._save_lock = threading.Lock()
+
+    # --- ДНЕВНЫЕ РАСХОДЫ ---
+
+    def _load_daily_spend(self):
+        today = date.today().isoformat()
+        try:
+            with open(DAILY_SPEND_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("day") == today:
+                return today, float(data.get("spent_usd", 0.0))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать {DAILY_SPEND_FILE}: {e}")
+        return today, 0.0
+
+    def _write_daily_spend(self, snapshot: Dict[str, Any]):
+        with self._save_lock:
+            try:
+                tmp_path = f"{DAILY_SPEND_FILE}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, DAILY_SPEND_FILE)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить {DAILY_SPEND_FILE}: {e}")
+
+    def _take_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Снимок несохранённых расходов (None — сохранять нечего). Снимается в потоке цикла событий."""
+        if not self._spend_dirty:
+            return None
+        self._spend_dirty = False
+        return {"day": self._spend_day, "spent_usd": round(self._spent_today, 6)}
+
+    def save_daily_spend(self):
+        """Синхронно сохраняет накопленные расходы (вне цикла событий и при остановке)."""
+        snapshot = self._take_snapshot()
+        if snapshot is not None:
+            self._write_daily_spend(snapshot)
+
+    async def persist(self):
+        """Сохраняет накопленные расходы в потоке, не блокируя цикл событий."""
+        snapshot = self._take_snapshot()
+        if snapshot is not None:
+            await asyncio.to_thread(self._write_daily_spend, snapshot)
+
+    def _roll_day(self):
+        today = date.today().isoformat()
+        if today != self._spend_day:
+            self._spend_day, self._spent_today = today, 0.0
+
+    @property
+    def spent_today(self) -> float:
+        self._roll_day()
+        return self._spent_today
+
+    def record_spend(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Учитывает стоимость вызова в дневных расходах. Возвращает стоимость вызова."""
+        self._roll_day()
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        self._spent_today += cost
+        self._spend_dirty = True
+        return cost
+
+    # --- БЮДЖЕТ ЦИКЛА ---
+
+    def start_cycle(self, token_usage: Dict[str, int]):
+        self.iterations = 0
+        self._cycle_started_at = time.monotonic()
+        self._start_usage = dict(token_usage)
+        self.last_stop_reason = None
+
+    def finish_cycle(self):
+        self._cycle_started_at = None
+
+    def next_iteration(self):
+        self.iterations += 1
+
+    def elapsed(self) -> float:
+        if self._cycle_started_at is None:
+            return 0.0
+        return time.monotonic() - self._cycle_started_at
+
+    def remaining_seconds(self) -> Optional[float]:
+        """Сколько секунд осталось до лимита времени цикла; None вне цикла (вызов без ограничения)."""
+        if self._cycle_started_at is None:
+            return None
+        return max(0.0, self.max_seconds - self.elapsed())
+
+    def cycle_tokens(self, token_usage: Dict[str, int]) -> Dict[str, int]:
+        return {
+            key: token_usage.get(key, 0) - self._start_usage.get(key, 0)
+            for key in ('total_prompt_tokens', 'total_completion_tokens', 'total_tokens')
+        }
+
+    def exhausted_reason(self, token_usage: Dict[str, int]) -> Optional[str]:
+        """Возвращает причину исчерпания бюджета или None, если бюджет ещё есть."""
+        used = self.cycle_tokens(token_usage)
+        if self.daily_limit and self.spent_today >= self.daily_limit:
+            reason = f"дневной лимит расходов ${self.daily_limit:.2f} исчерпан (${self.spent_today:.4f})"
+        elif self.iterations >= self.max_iterations:
+            reason = f"достигнут лимит итераций цикла ({self.max_iterations})"
+        elif used['total_prompt_tokens'] >= self.max_prompt_tokens:
+            reason = f"лимит prompt-токенов цикла ({used['total_prompt_tokens']}/{self.max_prompt_tokens})"
+        elif used['total_completion_tokens'] >= self.max_completion_tokens:
+            reason = f"лимит completion-токенов цикла ({used['total_completion_tokens']}/{self.max_completion_tokens})"
+        elif self.elapsed() >= self.max_seconds:
+            reason = f"лимит времени цикла ({self.elapsed():.0f}/{self.max_seconds:.0f} с)"
+        else:
+            return None
+        self.last_stop_reason = reason
+        return reason
+
+    def should_downgrade(self, token_usage: Dict[str, int]) -> bool:
+        """True, если бюджет близок к исчерпанию и стоит перейти на более дешёвую модель."""
+        used = self.cycle_tokens(token_usage)
+        if self.daily_limit and self.spent_today >= self.daily_limit * DOWNGRADE_THRESHOLD:
+            return True
+        if used['total_prompt_tokens'] >= self.max_prompt_tokens * DOWNGRADE_THRESHOLD:
+            return True
+        if used['total_completion_tokens'] >= self.max_completion_tokens * DOWNGRADE_THRESHOLD:
+            return True
+        return self.elapsed() >= self.max_seconds * DOWNGRADE_THRESHOLD
+
+    def model_for(self, model: str, token_usage: Dict[str, int]) -> str:
+        """
+        Модель для очередного вызова: при приближении к лимитам — DOWNGRADE_MODEL,
+        если она дешевле запрошенной (иначе замена ничего не экономит).
+        """
+        if model == DOWNGRADE_MODEL or _price_level(DOWNGRADE_MODEL) >= _price_level(model):
+            return model
+        return DOWNGRADE_MODEL if self.should_downgrade(token_usage) else model
+
+    def report(self, token_usage: Dict[str, int]) -> Dict[str, Any]:
+        return {
+            'iterations': self.iterations,
+            'elapsed_seconds': round(self.elapsed(), 1),
+            'cycle_tokens': self.cycle_tokens(token_usage),
+            'spent_today_usd': round(self.spent_today, 4),
+            'daily_limit_usd': self.daily_limit,
+            'stop_reason': self.last_stop_reason,
+        }
@@ -0,0 +1,161 @@
+# utils/cycle_journal.py
+import asyncio
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from utils.helpers import logger
+
+CYCLE_JOURNAL_FILE = os.getenv("CYCLE_JOURNAL_FILE", "cycle_journal.json")
+
+# --- СОСТОЯНИЯ ШАГА ЦИКЛА ---
+# started -> tools_requested -> tools_done -> reasoner_done -> committed
+PHASE_STARTED = "started"                  # шаг начат, ответа инструментальной модели ещё нет
+PHASE_TOOLS_REQUESTED = "tools_requested"  # ответ модели получен, инструменты выполняются
+PHASE_TOOLS_DONE = "tools_done"            # все инструменты выполнены
+PHASE_REASONER_DONE = "reasoner_done"      # ответ рассуждающей модели получен
+PHASE_COMMITTED = "committed"              # оба контекста сохранены
+
+INTERRUPTED_TOOL_ERROR = (
+    "Выполнение инструмента было прервано сбоем процесса, результат неизвестен. "
+    "Проверь фактическое состояние (ордера, позиции) перед повторным вызовом."
+)
+
+
+class CycleJournal:
+    """
+    Журнал текущего шага цикла анализа. Каждый переход сохраняется атомарно (tmp + fsync + os.replace),
+    поэтому после сбоя шаг продолжается с последнего сохранённого состояния:
+    без повторных вызовов моделей и без повторного выполнения инструментов.
+    Запись на диск выполняется в потоке (asyncio.to_thread): переход завершается, когда состояние
+    уже на диске, но цикл событий на время fsync не блокируется.
+    """
+
+    def __init__(self, path: str = CYCLE_JOURNAL_FILE):
+        self.path = path
+        self.state: Optional[Dict[str, Any]] = None
+        # Параллельные инструменты завершаются одновременно: записи идут строго по очереди
+        self._write_lock = asyncio.Lock()
+
+    async def _persist(self):
+        # Снимок — в цикле событий: состояние меняется только там, поток получает готовые данные
+        data = json.dumps(self.state, ensure_ascii=False)
+        async with self._write_lock:
+            await asyncio.to_thread(self._write, data)
+
+    def _write(self, data: str):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load_unfinished(self) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает незавершённый шаг из журнала или None.
+        Повреждённый журнал переименовывается в *.corrupt, чтобы не разбирать его на каждом цикле.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if not isinstance(state, dict) or 'phase' not in state or not isinstance(state.get('iteration'), int):
+                raise ValueError("нет фазы или номера итерации шага")
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"❌ Журнал цикла повреждён, восстановление невозможно: {e}")
+            self._set_aside()
+            return None
+        if state.get('phase') == PHASE_COMMITTED:
+            return None
+        self.state = state
+        return state
+
+    def _set_aside(self):
+        try:
+            os.replace(self.path, f"{self.path}.corrupt")
+        except OSError as e:
+            logger.warning(f"Не удалось отложить повреждённый журнал {self.path}: {e}")
+
+    async def discard(self):
+        """Отбрасывает незавершённый шаг, который не удалось восстановить: при следующем запуске он не повторяется."""
+        iteration = self.state.get('iteration', 0) if isinstance(self.state, dict) else 0
+        self.state = {'phase': PHASE_COMMITTED, 'iteration': iteration}
+        try:
+            await self._persist()
+        except Exception as e:
+            logger.error(f"❌ Не удалось сбросить журнал цикла: {e}")
+            self._set_aside()
+
+    # --- ПЕРЕХОДЫ ---
+
+    async def begin(self, iteration: int, pending_messages: List[Dict[str, Any]],
+                    tool_names: Optional[List[str]] = None):
+        """
+        pending_messages — сообщения, добавленные в контекст после последнего сохранения;
+        tool_names — набор инструментов цикла (utils.tool_selector), нужен при восстановлении.
+        """
+        self.state = {
+            'phase': PHASE_STARTED,
+            'iteration': iteration,
+            'tool_names': list(tool_names) if tool_names is not None else None,
+            'pending_messages': list(pending_messages),
+            'assistant_msg': None,
+            'tools_started': [],
+            'tool_results': {},
+            'reasoner_user_content': None,
+            'reasoner_response': None,
+            'wait': False,
+        }
+        await self._persist()
+
+    async def tools_requested(self, assistant_msg: Dict[str, Any]):
+        self.state['phase'] = PHASE_TOOLS_REQUESTED
+        self.state['assistant_msg'] = assistant_msg
+        await self._persist()
+
+    async def tools_started(self, tool_call_ids: List[str]):
+        self.state['tools_started'].extend(tool_call_ids)
+        await self._persist()
+
+    async def tool_done(self, tool_result: Dict[str, Any]):
+        self.state['tool_results'][tool_result['tool_call_id']] = tool_result
+        await self._persist()
+
+    async def tools_done(self, wait: bool):
+        self.state['phase'] = PHASE_TOOLS_DONE
+        self.state['wait'] = wait
+        await self._persist()
+
+    async def reasoner_done(self, user_content: str, response: str):
+        self.state['phase'] = PHASE_REASONER_DONE
+        self.state['reasoner_user_content'] = user_content
+        self.state['reasoner_response'] = response
+        await self._persist()
+
+    async def committed(self):
+        self.state = {'phase': PHASE_COMMITTED, 'iteration': self.state['iteration'] if self.state else 0}
+        await self._persist()
+
+    # --- ЧТЕНИЕ ---
+
+    @property
+    def phase(self) -> Optional[str]:
+        return self.state['phase'] if self.state else None
+
+    def in_progress(self) -> bool:
+        return self.state is not None and self.state['phase'] != PHASE_COMMITTED
+
+    def ordered_tool_results(self) -> List[Dict[str, Any]]:
+        """Результаты инструментов в порядке tool_calls ассистента."""
+        calls = (self.state.get('assistant_msg') or {}).get('tool_calls') or []
+        results = self.state['tool_results']
+        return [results[call['id']] for call in calls if call['id'] in results]
+
+    def interrupted_tool_result(self, tool_call_id: str) -> Dict[str, Any]:
+        return {
+            'role': 'tool',
+            'tool_call_id': tool_call_id,
+            'content': json.dumps({"error": INTERRUPTED_TOOL_ERROR}, ensure_ascii=False)
+        }
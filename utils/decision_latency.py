@@ -0,0 +1,267 @@
+# utils/decision_latency.py
+import contextvars
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.helpers import logger
+
+# Сколько завершённых решений держать для скользящего отчёта
+DECISION_REPORT_WINDOW = int(os.getenv("DECISION_REPORT_WINDOW", "200"))
+# Через сколько секунд после конца цикла ордер без подтверждения считается потерянным
+ORDER_ACK_TIMEOUT = float(os.getenv("ORDER_ACK_TIMEOUT", "300"))
+# Подтверждения, пришедшие раньше ответа REST инструменту, ждут сопоставления в ограниченном буфере
+RECENT_ACKS_LIMIT = 1000
+# Инструменты, выставляющие ордера (через запятую), в дополнение к атрибуту places_orders = True у инструмента.
+# orderId из результатов остальных инструментов (история, открытые ордера) к решению не привязываются
+ORDER_TOOLS = {name.strip() for name in os.getenv("ORDER_TOOLS", "place_order,create_order").split(",") if name.strip()}
+
+TRIGGER_CANDLE = "candle"
+TRIGGER_LIQUIDATION = "liquidation"
+
+# Решение, к которому относится текущий код: задаётся на цикл анализа и наследуется
+# задачами asyncio.gather (инструменты) и asyncio.to_thread
+_current_decision: contextvars.ContextVar[Optional["Decision"]] = contextvars.ContextVar(
+    "current_decision", default=None
+)
+
+
+class Decision:
+    """Одно торговое решение: от рыночного события до подтверждения ордера на order_stream."""
+
+    __slots__ = ("id", "trigger", "event_at", "info", "cycle_started_at", "cycle_finished_at",
+                 "spans", "orders", "acks", "executions", "completed_at", "outcome")
+
+    def __init__(self, trigger: str, event_at: float, info: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.event_at = event_at  # время события (epoch, с): закрытие свечи или последняя ликвидация
+        self.info = info or {}
+        self.cycle_started_at = time.time()
+        self.cycle_finished_at: Optional[float] = None
+        self.spans: List[tuple] = []                      # (стадия, начало, конец)
+        self.orders: Dict[str, float] = {}                # orderId -> время, когда инструмент вернул ордер
+        self.acks: Dict[str, Dict[str, float]] = {}       # orderId -> {'received', 'exchange'}
+        self.executions: Dict[str, float] = {}            # orderId -> время первого исполнения
+        self.completed_at: Optional[float] = None
+        self.outcome: Optional[str] = None
+
+    def stage_seconds(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for stage, started, finished in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + (finished - started)
+        return totals
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Разбивка задержки в миллисекундах."""
+        ms = lambda seconds: round(seconds * 1000, 1)
+        stages = self.stage_seconds()
+        result: Dict[str, Any] = {
+            'decision_id': self.id,
+            'trigger': self.trigger,
+            'outcome': self.outcome,
+            'event_to_cycle_start_ms': ms(self.cycle_started_at - self.event_at),
+            'stages_ms': {stage: ms(seconds) for stage, seconds in stages.items()},
+        }
+        if self.cycle_finished_at is not None:
+            result['cycle_ms'] = ms(self.cycle_finished_at - self.cycle_started_at)
+        if self.acks:
+            first_order = min(self.orders.values())
+            first_ack = min(ack['received'] for ack in self.acks.values())
+            result['tool_to_ack_ms'] = ms(first_ack - first_order)
+            result['event_to_ack_ms'] = ms(first_ack - self.event_at)
+            exchange_acks = [ack['exchange'] for ack in self.acks.values() if ack.get('exchange')]
+            if exchange_acks:
+                result['event_to_exchange_ack_ms'] = ms(min(exchange_acks) - self.event_at)
+        if self.executions:
+            result['event_to_first_fill_ms'] = ms(min(self.executions.values()) - self.event_at)
+        result['orders'] = list(self.orders)
+        return result
+
+
+def current_decision() -> Optional[Decision]:
+    return _current_decision.get()
+
+
+def current_decision_id() -> Optional[str]:
+    decision = _current_decision.get()
+    return decision.id if decision is not None else None
+
+
+def _find_order_ids(value: Any, found: List[str]):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in ('orderId', 'order_id') and isinstance(item, (str, int)) and item:
+                found.append(str(item))
+            else:
+                _find_order_ids(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _find_order_ids(item, found)
+
+
+def places_orders(tool: Any) -> bool:
+    return bool(getattr(tool, 'places_orders', False)) or getattr(tool, 'name', None) in ORDER_TOOLS
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class DecisionTracker:
+    """
+    Связывает рыночное событие, цикл анализа, вызовы моделей, инструмент с ордером и
+    подтверждение ордера из приватного потока через идентификатор решения (contextvars)
+    и orderId. Завершённые решения попадают в скользящий отчёт.
+    """
+
+    def __init__(self, window: int = DECISION_REPORT_WINDOW):
+        self._completed: deque = deque(maxlen=window)
+        self._awaiting_ack: Dict[str, Decision] = {}  # orderId -> решение
+        self._recent_acks: "OrderedDict[str, Dict[str, float]]" = OrderedDict()  # orderId -> подтверждение без решения
+
+    @contextmanager
+    def decision(self, trigger: str, event_at: float, **info) -> Iterator[Decision]:
+        """Оборачивает цикл анализа: всё, что выполняется внутри, относится к этому решению."""
+        decision = Decision(trigger, event_at, info)
+        token = _current_decision.set(decision)
+        logger.info(f"🧭 Решение {decision.id}: триггер {trigger}, "
+                    f"задержка до старта цикла {decision.cycle_started_at - event_at:.2f} с")
+        try:
+            yield decision
+        finally:
+            _current_decision.reset(token)
+            decision.cycle_finished_at = time.time()
+            if not decision.orders:
+                self._complete(decision, 'no_order')
+            else:
+                # Ордера уже ждут подтверждения в _awaiting_ack; если все подтверждены — решение завершается
+                self._maybe_complete(decision)
+            self._expire_stale()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        """Замер стадии текущего решения (вызов модели, инструмент). Вне решения ничего не делает."""
+        decision = _current_decision.get()
+        started = time.time()
+        try:
+            yield
+        finally:
+            if decision is not None:
+                decision.spans.append((stage, started, time.time()))
+
+    def note_tool_result(self, tool: Any, result: Any):
+        """Ищет orderId в результате инструмента, выставляющего ордера, и привязывает ордер к текущему решению."""
+        decision = _current_decision.get()
+        if decision is None or not places_orders(tool):
+            return
+        if isinstance(result, str):
+            try:
+                result = json.loads(result)
+            except (json.JSONDecodeError, TypeError):
+                return
+        order_ids: List[str] = []
+        _find_order_ids(result, order_ids)
+        now = time.time()
+        for order_id in order_ids:
+            decision.orders.setdefault(order_id, now)
+            # Поток ордеров нередко опережает ответ REST: такое подтверждение уже лежит в буфере
+            ack = self._recent_acks.pop(order_id, None)
+            if ack is not None:
+                decision.acks[order_id] = ack
+            else:
+                self._awaiting_ack.setdefault(order_id, decision)
+        if order_ids:
+            logger.info(f"🧭 Решение {decision.id}: ордера {order_ids}")
+
+    def on_order_messages(self, messages: List[dict]):
+        """Вызывается обработчиком пачки order_stream: первое обновление ордера — его подтверждение."""
+        received = time.time()
+        for message in messages:
+            for order in message.get('data') or []:
+                order_id = str(order.get('orderId'))
+                created = order.get('createdTime') or message.get('creationTime')
+                ack = {'received': received, 'exchange': int(created) / 1000 if created else None}
+                decision = self._awaiting_ack.get(order_id)
+                if decision is None:
+                    if order_id not in self._recent_acks:
+                        self._recent_acks[order_id] = ack
+                        if len(self._recent_acks) > RECENT_ACKS_LIMIT:
+                            self._recent_acks.popitem(last=False)
+                    continue
+                if order_id in decision.acks:
+                    continue
+                decision.acks[order_id] = ack
+                self._maybe_complete(decision)
+        self._expire_stale()
+
+    def on_execution_messages(self, messages: List[dict]):
+        received = time.time()
+        for message in messages:
+            for execution in message.get('data') or []:
+                order_id = str(execution.get('orderId'))
+                for decision in (self._awaiting_ack.get(order_id), *self._completed):
+                    if decision is not None and order_id in decision.orders:
+                        decision.executions.setdefault(order_id, received)
+                        break
+
+    def _maybe_complete(self, decision: Decision):
+        if decision.cycle_finished_at is None or len(decision.acks) < len(decision.orders):
+            return
+        for order_id in decision.orders:
+            self._awaiting_ack.pop(order_id, None)
+        self._complete(decision, 'acknowledged')
+
+    def _complete(self, decision: Decision, outcome: str):
+        decision.outcome = outcome
+        decision.completed_at = time.time()
+        self._completed.append(decision)
+        logger.info(f"⏱️ Задержка решения: {decision.breakdown()}")
+
+    def _expire_stale(self):
+        now = time.time()
+        stale = {decision for decision in self._awaiting_ack.values()
+                 if decision.cycle_finished_at is not None and now - decision.cycle_finished_at > ORDER_ACK_TIMEOUT}
+        for decision in stale:
+            for order_id in decision.orders:
+                self._awaiting_ack.pop(order_id, None)
+            self._complete(decision, 'ack_timeout')
+
+    def report(self) -> Dict[str, Any]:
+        """Скользящий отчёт: медиана и p95 по каждой стадии и сквозным задержкам (мс)."""
+        self._expire_stale()
+        series: Dict[str, List[float]] = {}
+        for decision in self._completed:
+            breakdown = decision.breakdown()
+            for key, value in breakdown.items():
+                if key.endswith('_ms') and isinstance(value, (int, float)):
+                    series.setdefault(key, []).append(value)
+            for stage, value in breakdown['stages_ms'].items():
+                series.setdefault(f"stage:{stage}", []).append(value)
+        outcomes: Dict[str, int] = {}
+        for decision in self._completed:
+            outcomes[decision.outcome] = outcomes.get(decision.outcome, 0) + 1
+        return {
+            'decisions': len(self._completed),
+            'outcomes': outcomes,
+            'awaiting_ack': len(self._awaiting_ack),
+            'latency_ms': {
+                key: {'p50': _percentile(values, 0.5), 'p95': _percentile(values, 0.95), 'max': max(values)}
+                for key, values in series.items()
+            },
+        }
+
+
+_tracker: Optional[DecisionTracker] = None
+
+
+def get_decision_tracker() -> DecisionTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = DecisionTracker()
+    return _tracker
@@ -1,8 +1,9 @@
 # utils/deepseek_client.py
 import asyncio
 import json
+import logging
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 from openai import AsyncOpenAI
 from config import (
     DEEPSEEK_API_KEY, DEEPSEEK_BASE_URL,
@@ -10,8 +11,18 @@ from config import (
     DEEPSEEK_REASONER_MODEL,
     MAX_CONTEXT_TOKENS
 )
-from tools import get_all_tools
 from utils.helpers import logger
+from utils.async_logging import MODEL_TEXT_TOPIC, console, log_transcript
+from utils.tool_registry import get_tool_registry
+from utils.tool_selector import ToolSelector
+from utils.tool_worker_pool import get_tool_worker_pool
+from utils.cycle_budget import CycleBudget, estimate_cost
+from utils.cycle_journal import CycleJournal
+from utils.transcript_archive import dropped_messages, get_transcript_archive
+from utils.response_cache import get_response_cache, usage_fields
+from utils.run_mode import BOT_RUN_MODE, is_tool_blocked, simulated_result
+from utils.message_store import compact_message, compact_messages, create_message, get_content_pool
+from utils.decision_latency import get_decision_tracker, current_decision_id
 from utils.context_manager import (
     save_context_to_file, load_context_from_file,
     truncate_context_adaptive, count_tokens_in_messages,
@@ -19,6 +30,11 @@ from utils.context_manager import (
 )
 
 
+def _log_archive_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Не удалось записать транскрипт в архив: {future.exception()}")
+
+
 class DeepSeekClient:
     def __init__(self):
         self.model = DEEPSEEK_CHAT_MODEL
@@ -34,19 +50,53 @@ class DeepSeekClient:
         )
         # -------------------------------
         self._verify_tools_initialization()
-        self.tools = get_all_tools()
-        self.tool_schemas = [tool.to_function_definition() for tool in self.tools]
-        self.tool_map = {tool.name: tool for tool in self.tools}
-        from utils.reasoner_context_manager import load_reasoner_context_from_file
-        self.reasoner_context, _ = load_reasoner_context_from_file()
+        # Инструменты создаются лениво, схемы кэшируются реестром
+        self.tool_registry = get_tool_registry()
+        self.tool_selector = ToolSelector()
+        # Контекст рассуждений загружается с диска при первом обращении
+        self._reasoner_context = None
+        # Номер итерации, с которым контекст рассуждений последний раз сохранён (по нему восстанавливается шаг)
+        self._reasoner_iteration = 0
         self.token_usage = {
             'total_prompt_tokens': 0,
             'total_completion_tokens': 0,
             'total_tokens': 0
         }
+        self.budget = CycleBudget()
+        self.journal = CycleJournal()
+        # Кэш ответов моделей (MODEL_RESPONSE_CACHE=1 при BOT_RUN_MODE=replay/dry_run, где ордера не отправляются)
+        self.response_cache = get_response_cache()
+        self.decisions = get_decision_tracker()
+        self.current_symbol: Optional[str] = None
 
         logger.info(f"DeepSeek клиент инициализирован с моделями: {self.model}, {self.reasoner_model}")
 
+    @property
+    def tools(self) -> list:
+        return self.tool_registry.all()
+
+    @property
+    def tool_schemas(self) -> List[Dict[str, Any]]:
+        return self.tool_registry.schemas()
+
+    @property
+    def reasoner_context(self) -> list:
+        if self._reasoner_context is None:
+            from utils.reasoner_context_manager import load_reasoner_context_from_file
+            self.reasoner_context, iteration = load_reasoner_context_from_file()
+            self._reasoner_iteration = iteration or 0
+        return self._reasoner_context
+
+    @reasoner_context.setter
+    def reasoner_context(self, value: list):
+        # Загруженные и усечённые контексты приводятся к компактным сообщениям с общими строками
+        self._reasoner_context = compact_messages(value)
+
+    def _save_reasoner_context(self, iteration: int):
+        from utils.reasoner_context_manager import save_reasoner_context_to_file
+        save_reasoner_context_to_file(self.reasoner_context, iteration)
+        self._reasoner_iteration = iteration
+
     def _verify_tools_initialization(self):
         import utils.globals as globals_module
         logger.info("🔍 Проверка инициализации инструментов...")
@@ -65,7 +115,7 @@ class DeepSeekClient:
         if missing:
             logger.warning(f"⚠️ Не инициализированы: {missing}")
 
-    def _log_token_usage(self, usage: Any, stage: str = ""):
+    def _log_token_usage(self, usage: Any, stage: str = "", model: Optional[str] = None):
         if not usage:
             return
         try:
@@ -75,14 +125,53 @@ class DeepSeekClient:
             self.token_usage['total_prompt_tokens'] += prompt
             self.token_usage['total_completion_tokens'] += completion
             self.token_usage['total_tokens'] += total
-            logger.info(f"🔢 [Tokens {stage}] Prompt: {prompt}, Completion: {completion}, Total: {total}")
-            print(f"\n[Tokens {stage}] Prompt: {prompt}, Completion: {completion}, Total: {total}\n")
+            cost = self.budget.record_spend(model or self.model, prompt, completion)
+            logger.info(f"🔢 [Tokens {stage}] Prompt: {prompt}, Completion: {completion}, Total: {total}, "
+                        f"Cost: ${cost:.4f}, Today: ${self.budget.spent_today:.4f}")
         except Exception as e:
             logger.warning(f"Ошибка при логировании токенов: {e}")
 
+    def _log_cache_hit(self, stage: str, cached: Dict[str, Any]):
+        """Попадание в кэш не тратит токены: экономия показывается отдельно от расходов (token_usage)."""
+        usage = cached.get('usage') or {}
+        saved = estimate_cost(cached.get('model', ''), usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        logger.info(f"♻️ [Cache {stage}] Ответ взят из кэша, сэкономлено: Prompt: {usage.get('prompt_tokens', 0)}, "
+                    f"Completion: {usage.get('completion_tokens', 0)}, Cost: ${saved:.4f}")
+
+    def _archive_step(self, iteration: int, kind: str, record: Dict[str, Any]):
+        """
+        Ставит полный транскрипт шага в очередь сжатого архива и не ждёт записи
+        (ошибка архива не прерывает торговый цикл).
+        """
+        try:
+            future = get_transcript_archive().submit(
+                {'iteration': iteration, 'symbol': self.current_symbol, 'decision_id': current_decision_id(), **record},
+                symbol=self.current_symbol, iteration=iteration, kind=kind
+            )
+        except Exception as e:
+            logger.warning(f"Не удалось записать транскрипт в архив: {e}")
+            return
+        future.add_done_callback(_log_archive_failure)
+
+    def _archive_truncated(self, iteration: int, context: str, before: list, after: list):
+        """Архивирует сообщения, которые усечение убрало из контекста (kind='truncated')."""
+        dropped = dropped_messages(before, after)
+        if dropped:
+            self._archive_step(iteration, 'truncated', {'context': context, 'dropped': dropped})
+
+    def _truncate_context(self, messages: list, iteration: int) -> list:
+        """Усечение основного контекста (сначала по циклам, потом по токенам) с архивированием отброшенного."""
+        truncated = truncate_context_by_cycles(messages, max_cycles=8)
+        truncated = truncate_context_adaptive(truncated, max_tokens=900000)
+        truncated = self._clean_incomplete_tool_calls(truncated)
+        self._archive_truncated(iteration, 'main', messages, truncated)
+        return truncated
+
     def _clean_incomplete_tool_calls(self, messages: list) -> list:
+        """Удаляет непарные tool_calls/tool-ответы. Если удалять нечего, возвращает тот же список без копии."""
         cleaned = []
         pending = set()
+        dropped = False
         for msg in messages:
             if msg['role'] == 'assistant' and 'tool_calls' in msg:
                 cleaned.append(msg)
@@ -94,8 +183,11 @@ class DeepSeekClient:
                     pending.remove(msg['tool_call_id'])
                 else:
                     logger.warning(f"Лишний tool response: {msg['tool_call_id']}")
+                    dropped = True
             else:
                 cleaned.append(msg)
+        if not pending and not dropped:
+            return messages
         if pending:
             logger.warning(f"Незавершённые tool_calls: {pending}. Очищаем.")
             cleaned = [m for m in cleaned if not (
@@ -105,82 +197,144 @@ class DeepSeekClient:
         return cleaned
 
     async def _execute_tool(self, tool_instance, function_args: dict, tool_call_id: str) -> dict:
+        if is_tool_blocked(tool_instance):
+            # replay / dry_run: запросы, меняющие аккаунт, на биржу не уходят
+            logger.warning(f"🧪 {tool_instance.name} не выполнен (BOT_RUN_MODE={BOT_RUN_MODE}): {function_args}")
+            return create_message('tool', json.dumps(simulated_result(tool_instance, function_args)),
+                                  tool_call_id=tool_call_id)
         try:
             logger.info(f"⚡ Выполнение инструмента {tool_instance.name}...")
-            result = await tool_instance.execute(**function_args)
+            with self.decisions.span(f"tool:{tool_instance.name}"):
+                if getattr(tool_instance, 'cpu_bound', False):
+                    # CPU-тяжёлые инструменты выполняются в пуле процессов, не блокируя цикл событий
+                    result = await get_tool_worker_pool().run(tool_instance, function_args)
+                elif not asyncio.iscoroutinefunction(tool_instance.execute):
+                    # Синхронный execute (блокирующий REST) — в потоке, параллельно с остальными вызовами
+                    result = await asyncio.to_thread(tool_instance.execute, **function_args)
+                else:
+                    result = await tool_instance.execute(**function_args)
+            # Ордер из результата привязывается к текущему решению (для замера до подтверждения биржей)
+            self.decisions.note_tool_result(tool_instance, result)
             logger.info(f"✅ Инструмент {tool_instance.name} выполнен")
-            return {
-                'role': 'tool',
-                'tool_call_id': tool_call_id,
-                'content': json.dumps(result) if not isinstance(result, str) else result
-            }
+            return create_message(
+                'tool',
+                json.dumps(result) if not isinstance(result, str) else result,
+                tool_call_id=tool_call_id
+            )
         except Exception as e:
             logger.error(f"❌ Ошибка в {tool_instance.name}: {e}")
-            return {
-                'role': 'tool',
-                'tool_call_id': tool_call_id,
-                'content': json.dumps({"error": str(e)})
-            }
+            return create_message('tool', json.dumps({"error": str(e)}), tool_call_id=tool_call_id)
 
     # ✅ Возвращаем ПОЛНОЕ сообщение ассистента (включая tool_calls)
-    async def call_model_with_tools(self, messages: list) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    async def call_model_with_tools(
+        self,
+        messages: list,
+        tool_schemas: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        assistant_msg = await self._request_tool_model(messages, tool_schemas)
+        tool_results = await self._execute_tool_calls(assistant_msg['tool_calls'])
+        return assistant_msg, tool_results
+
+    async def _request_tool_model(
+        self,
+        messages: list,
+        tool_schemas: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Вызывает инструментальную модель и возвращает сообщение ассистента (без выполнения инструментов)."""
         formatted = format_messages_for_deepseek(messages)
-        logger.info("🔄 Вызов модели с инструментами...")
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=formatted,
-                tools=self.tool_schemas,
-                tool_choice="auto"
-            )
-        except Exception as e:
-            logger.error(f"❌ Ошибка вызова модели: {e}")
-            error_msg = {'role': 'assistant', 'content': f"Ошибка: {str(e)}", 'tool_calls': []}
-            return error_msg, []
+        tools = tool_schemas if tool_schemas is not None else self.tool_schemas
+        # При приближении к лимитам бюджета инструментальная модель тоже переходит на более дешёвую
+        model = self.budget.model_for(self.model, self.token_usage)
+        if model != self.model:
+            logger.warning(f"💸 Бюджет почти исчерпан, инструментальная модель заменена на {model}")
+        cache_key = await self.response_cache.akey(model, formatted, tools) if self.response_cache else None
+        cached = await self.response_cache.aget(cache_key) if cache_key else None
+        if cached is not None:
+            assistant_msg = cached['message']
+            self._log_cache_hit("tools", cached)
+        else:
+            logger.info("🔄 Вызов модели с инструментами...")
+            try:
+                with self.decisions.span("tool_model"):
+                    response = await asyncio.wait_for(self.client.chat.completions.create(
+                        model=model,
+                        messages=formatted,
+                        tools=tools,
+                        tool_choice="auto"
+                    ), timeout=self.budget.remaining_seconds())
+            except asyncio.TimeoutError:
+                logger.error("❌ Вызов модели прерван: исчерпан лимит времени цикла")
+                return {'role': 'assistant', 'content': "Ошибка: исчерпан лимит времени цикла", 'tool_calls': []}
+            except Exception as e:
+                logger.error(f"❌ Ошибка вызова модели: {e}")
+                return {'role': 'assistant', 'content': f"Ошибка: {str(e)}", 'tool_calls': []}
 
-        self._log_token_usage(response.usage)
-        msg = response.choices[0].message
+            self._log_token_usage(response.usage, model=model)
+            self.tool_selector.record_call(response.usage, formatted, tools, self.tool_schemas)
+            msg = response.choices[0].message
 
-        assistant_msg = {
-            'role': msg.role,
-            'content': msg.content or '',
-            'tool_calls': []
-        }
+            assistant_msg = {
+                'role': msg.role,
+                'content': msg.content or '',
+                'tool_calls': []
+            }
 
-        if msg.tool_calls:
-            assistant_msg['tool_calls'] = [
-                {
-                    'id': call.id,
-                    'type': call.type,
-                    'function': {
-                        'name': call.function.name,
-                        'arguments': call.function.arguments
-                    }
-                } for call in msg.tool_calls
-            ]
+            if msg.tool_calls:
+                assistant_msg['tool_calls'] = [
+                    {
+                        'id': call.id,
+                        'type': call.type,
+                        'function': {
+                            'name': call.function.name,
+                            'arguments': call.function.arguments
+                        }
+                    } for call in msg.tool_calls
+                ]
+            if cache_key:
+                await self.response_cache.aput(cache_key, {
+                    'model': model, 'message': assistant_msg, 'usage': usage_fields(response.usage)
+                })
+
+        log_transcript('trader', assistant_msg['content'], tool_calls=len(assistant_msg['tool_calls']))
+        console(f"\n[🤖 Ответ трейдера]:\n{assistant_msg['content'] or '(без текста)'}\n", topic=MODEL_TEXT_TOPIC)
+        return assistant_msg
 
+    async def _execute_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        on_done: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Выполняет вызовы инструментов параллельно. on_done вызывается по завершении каждого."""
         tool_results = []
-        if msg.tool_calls:
-            logger.info(f"🛠️ Модель хочет вызвать {len(msg.tool_calls)} инструментов.")
+        if tool_calls:
+            logger.info(f"🛠️ Модель хочет вызвать {len(tool_calls)} инструментов.")
             tasks = []
-            for tool_call in msg.tool_calls:
-                name = tool_call.function.name
-                args = json.loads(tool_call.function.arguments)
+            for tool_call in tool_calls:
+                name = tool_call['function']['name']
+                args = json.loads(tool_call['function']['arguments'])
                 logger.info(f"🔧 Вызов: {name} с {args}")
-                if tool := self.tool_map.get(name):
-                    tasks.append(self._execute_tool(tool, args, tool_call.id))
+                if tool := await self.tool_registry.aget(name):
+                    tasks.append(self._execute_tool(tool, args, tool_call['id']))
                 else:
                     logger.error(f"❌ Инструмент не найден: {name}")
                     tool_results.append({
                         'role': 'tool',
-                        'tool_call_id': tool_call.id,
+                        'tool_call_id': tool_call['id'],
                         'content': json.dumps({"error": f"Инструмент '{name}' не найден"})
                     })
+            if on_done:
+                for result in tool_results:
+                    await on_done(result)
+                tasks = [self._notify_when_done(task, on_done) for task in tasks]
             if tasks:
                 tool_results.extend(await asyncio.gather(*tasks))
+        return tool_results
 
-        print(f"\n[🤖 Ответ трейдера]:\n{assistant_msg['content'] or '(без текста)'}\n")
-        return assistant_msg, tool_results
+    @staticmethod
+    async def _notify_when_done(coro, on_done: Callable[[Dict[str, Any]], Awaitable[None]]) -> Dict[str, Any]:
+        result = await coro
+        await on_done(result)
+        return result
 
     # --- ОБНОВЛЁННАЯ ФУНКЦИЯ: вызов рассуждающей модели с её полным контекстом ---
     async def call_reasoner_model(
@@ -229,16 +383,17 @@ class DeepSeekClient:
             from utils.reasoner_context_manager import (
                 truncate_reasoner_context_by_cycles,
                 truncate_reasoner_context,  # по токенам
-                save_reasoner_context_to_file
             )
 
             # Шаг 1: оставляем последние 10 циклов
             truncated = truncate_reasoner_context_by_cycles(self.reasoner_context, max_cycles=10)
             # Шаг 2: на всякий случай — проверяем по токенам (например, лимит 90k)
             truncated = truncate_reasoner_context(truncated, max_tokens=90000)
+            self._archive_truncated(self._reasoner_iteration, 'reasoner', self.reasoner_context, truncated)
 
             self.reasoner_context = truncated
-            save_reasoner_context_to_file(self.reasoner_context, iteration=0)
+            # Усечённый контекст сохраняется с номером последней записанной итерации: по нему восстанавливается шаг
+            self._save_reasoner_context(self._reasoner_iteration)
             messages_for_reasoner.extend(truncated)
 
         # Добавляем текущий запрос (от инструментальной модели)
@@ -247,26 +402,50 @@ class DeepSeekClient:
             "content": user_message_content
         })
 
-        logger.info("🧠 Вызов рассуждающей модели с историей...")
-        try:
-            response = await self.reasoner_client.chat.completions.create(
-                model=self.reasoner_model,
-                messages=messages_for_reasoner,
-            )
-        except Exception as e:
-            logger.error(f"❌ Ошибка вызова рассуждающей модели: {e}")
-            return f"Ошибка рассуждающей модели: {str(e)}"
-
-        self._log_token_usage(response.usage, stage="reasoner")
-        final_content = response.choices[0].message.content or "(пустой ответ)"
-
-        # Проверяем, есть ли у ответа рассуждения (например, если reasoner модель поддерживает reasoning_content)
-        reasoning_content = getattr(response.choices[0].message, 'reasoning_content', None)
+        # При приближении к лимитам бюджета переключаемся на более дешёвую модель
+        reasoner_model = self.budget.model_for(self.reasoner_model, self.token_usage)
+        if reasoner_model != self.reasoner_model:
+            logger.warning(f"💸 Бюджет почти исчерпан, рассуждающая модель заменена на {reasoner_model}")
+
+        cache_key = await self.response_cache.akey(reasoner_model, messages_for_reasoner) if self.response_cache else None
+        cached = await self.response_cache.aget(cache_key) if cache_key else None
+        if cached is not None:
+            final_content = cached['content']
+            self._log_cache_hit("reasoner", cached)
+            reasoning_content = cached.get('reasoning_content')
+        else:
+            logger.info("🧠 Вызов рассуждающей модели с историей...")
+            try:
+                with self.decisions.span("reasoner_model"):
+                    response = await asyncio.wait_for(self.reasoner_client.chat.completions.create(
+                        model=reasoner_model,
+                        messages=messages_for_reasoner,
+                    ), timeout=self.budget.remaining_seconds())
+            except asyncio.TimeoutError:
+                logger.error("❌ Вызов рассуждающей модели прерван: исчерпан лимит времени цикла")
+                return "Ошибка рассуждающей модели: исчерпан лимит времени цикла"
+            except Exception as e:
+                logger.error(f"❌ Ошибка вызова рассуждающей модели: {e}")
+                return f"Ошибка рассуждающей модели: {str(e)}"
+
+            self._log_token_usage(response.usage, stage="reasoner", model=reasoner_model)
+            final_content = response.choices[0].message.content or "(пустой ответ)"
+
+            # Проверяем, есть ли у ответа рассуждения (например, если reasoner модель поддерживает reasoning_content)
+            reasoning_content = getattr(response.choices[0].message, 'reasoning_content', None)
+            if cache_key:
+                await self.response_cache.aput(cache_key, {
+                    'model': reasoner_model, 'content': final_content, 'reasoning_content': reasoning_content,
+                    'usage': usage_fields(response.usage)
+                })
 
+        # Полные рассуждения — в отдельный журнал; в консоль только при CONSOLE_VERBOSITY=verbose
         if reasoning_content:
-            print(f"\n[🧠 Думки рассуждающей модели]:\n{reasoning_content}\n")
+            log_transcript('reasoning', reasoning_content, model=reasoner_model)
+            console(f"\n[🧠 Думки рассуждающей модели]:\n{reasoning_content}\n", level=logging.DEBUG, topic=MODEL_TEXT_TOPIC)
 
-        print(f"\n[💡 Ответ рассуждающей модели]:\n{final_content}\n")
+        log_transcript('reasoner', final_content, model=reasoner_model)
+        console(f"\n[💡 Ответ рассуждающей модели]:\n{final_content}\n", topic=MODEL_TEXT_TOPIC)
         return final_content
 
     async def run_autonomous_tool_cycle(self, initial_prompt: str):
@@ -280,9 +459,9 @@ class DeepSeekClient:
             ]
             iteration = 0
 
-        print(f"\n--- 🚀 Запуск ДВУХМОДЕЛЬНОГО автономного цикла ---")
-        print(f"📅 Итерация: {iteration}")
-        print("🛑 Остановка по Ctrl+C")
+        console(f"\n--- 🚀 Запуск ДВУХМОДЕЛЬНОГО автономного цикла ---")
+        console(f"📅 Итерация: {iteration}")
+        console("🛑 Остановка по Ctrl+C")
 
         while True:
             iteration += 1
@@ -290,13 +469,11 @@ class DeepSeekClient:
             try:
 
                 # Сначала по циклам, потом по токенам — на всякий случай
-                messages = truncate_context_by_cycles(messages, max_cycles=8)
-                messages = truncate_context_adaptive(messages, max_tokens=900000)  # или используй простое усечение по токенам
-                messages = self._clean_incomplete_tool_calls(messages)
+                messages = self._truncate_context(messages, iteration)
                 estimated = count_tokens_in_messages(messages)
                 logger.info(f"📊 Токены перед итерацией {iteration}: ~{estimated}")
-                print(f"\n--- 🔄 Итерация {iteration} ---")
-                print(f"[Токены: ~{estimated} / 100000]\n")
+                console(f"\n--- 🔄 Итерация {iteration} ---")
+                console(f"[Токены: ~{estimated} / 100000]\n", level=logging.DEBUG)
 
                 # --- ШАГ 1: вызов инструментальной модели ---
                 assistant_msg, tool_results = await self.call_model_with_tools(messages)
@@ -348,8 +525,7 @@ class DeepSeekClient:
                 })
 
                 # --- СОХРАНЯЕМ КОНТЕКСТ РАССУЖДЕНИЙ ---
-                from utils.reasoner_context_manager import save_reasoner_context_to_file
-                save_reasoner_context_to_file(self.reasoner_context, iteration)
+                self._save_reasoner_context(iteration)
 
                 # --- ШАГ 4: добавляем всё в основной контекст ---
                 # assistant -> tool -> user (с ответом reasoner)
@@ -362,19 +538,26 @@ class DeepSeekClient:
 
                 # Сохраняем контекст
                 save_context_to_file(messages, iteration)
+                self._archive_step(iteration, 'step', {
+                    'assistant_msg': assistant_msg,
+                    'tool_results': tool_results,
+                    'reasoner_user_content': user_message_content,
+                    'reasoner_response': reasoner_response,
+                })
+                await self.budget.persist()
 
-                print(f"\n⏸️ Пауза 1 секунд...")
+                console(f"\n⏸️ Пауза 1 секунд...")
                 await asyncio.sleep(30)
 
             except KeyboardInterrupt:
                 logger.info("🛑 Цикл прерван.")
-                print(f"\n--- 🛑 ЦИКЛ ПРЕРВАН ---")
-                print(f"📊 Итоги: {self.token_usage}")
+                console(f"\n--- 🛑 ЦИКЛ ПРЕРВАН ---")
+                console(f"📊 Итоги: {self.token_usage}")
                 save_context_to_file(messages, iteration)
                 break
             except Exception as e:
                 logger.error(f"❌ Ошибка в итерации {iteration}: {e}")
-                print(f"❌ Ошибка: {e}")
+                console(f"❌ Ошибка: {e}", level=logging.ERROR)
                 messages = self._clean_incomplete_tool_calls(messages)
                 messages.append({
                     'role': 'user',
@@ -386,6 +569,9 @@ class DeepSeekClient:
     def get_token_statistics(self) -> Dict[str, int]:
         return self.token_usage.copy()
 
+    def get_budget_report(self) -> Dict[str, Any]:
+        return self.budget.report(self.token_usage)
+
     # --- ОБНОВЛЁННЫЙ МЕТОД: запуск одиночного цикла анализа ---
     async def run_single_analysis_cycle(self, candle_info: dict = None):
         """
@@ -394,7 +580,7 @@ class DeepSeekClient:
         Не входит в бесконечный цикл.
         Возвращает True, если ИИ запросил ожидание следующей свечи.
         """
-        print(f"\n--- 🚀 Запуск ОДИНОЧНОГО цикла анализа ---")
+        console(f"\n--- 🚀 Запуск ОДИНОЧНОГО цикла анализа ---")
         messages, iteration = load_context_from_file()
         if not messages:
             from utils.system_prompt import generate_system_prompt
@@ -414,7 +600,8 @@ class DeepSeekClient:
 
         # Выполняем одну итерацию
         updated_messages, should_wait = await self._run_single_iteration(messages, iteration)
-        print(f"--- ✅ ОДИНОЧНЫЙ цикл анализа завершен ---")
+        await self.budget.persist()
+        console(f"--- ✅ ОДИНОЧНЫЙ цикл анализа завершен ---")
         # Контекст уже сохранен внутри _run_single_iteration
         return should_wait  # Возвращаем флаг ожидания
 
@@ -426,14 +613,11 @@ class DeepSeekClient:
         Возвращает обновленный список сообщений и флаг, указывающий, нужно ли ждать следующей свечи.
         """
         # Сначала по циклам, потом по токенам — на всякий случай
-        messages = truncate_context_by_cycles(messages, max_cycles=8)
-        messages = truncate_context_adaptive(messages,
-                                             max_tokens=900000)  # или используй простое усечение по токенам
-        messages = self._clean_incomplete_tool_calls(messages)
+        messages = self._truncate_context(messages, iteration)
         estimated = count_tokens_in_messages(messages)
         logger.info(f"📊 Токены перед итерацией {iteration}: ~{estimated}")
-        print(f"\n--- 🔄 Итерация {iteration} ---")
-        print(f"[Токены: ~{estimated} / 100000]\n")
+        console(f"\n--- 🔄 Итерация {iteration} ---")
+        console(f"[Токены: ~{estimated} / 100000]\n", level=logging.DEBUG)
 
         # --- ШАГ 1: вызов инструментальной модели ---
         # Теперь в messages есть и старый контекст, и сообщение о новой свече
@@ -455,11 +639,11 @@ class DeepSeekClient:
                         try:
                             result_content = json.loads(last_tool_result.get('content', '{}'))
                             if result_content.get('status') == 'waiting_for_next_candle':
-                                print(
+                                console(
                                     f"✅ Обнаружен сигнал ожидания следующей свечи: {result_content.get('message', 'Ожидание свечи')}")
                                 wait_for_candle = True
                         except json.JSONDecodeError:
-                            print("⚠️ Не удалось распознать результат инструмента wait_for_next_candle.")
+                            console("⚠️ Не удалось распознать результат инструмента wait_for_next_candle.", level=logging.WARNING)
         # --- КОНЕЦ ПРОВЕРКИ ---
 
         # Если сигнал ожидания получен, НЕ вызываем рассуждающую модель и НЕ добавляем инструменты в контекст.
@@ -470,6 +654,9 @@ class DeepSeekClient:
                 messages.append(assistant_msg)
             # Сохраняем контекст
             save_context_to_file(messages, iteration)
+            self._archive_step(iteration, 'step', {
+                'assistant_msg': assistant_msg, 'tool_results': tool_results, 'wait': True
+            })
             return messages, True  # <-- Указывает, что нужно ждать
 
         # --- ШАГ 2: Подготовка данных ДЛЯ REASONER'А ---
@@ -519,8 +706,7 @@ class DeepSeekClient:
         })
 
         # --- СОХРАНЯЕМ КОНТЕКСТ РАССУЖДЕНИЙ ---
-        from utils.reasoner_context_manager import save_reasoner_context_to_file
-        save_reasoner_context_to_file(self.reasoner_context, iteration)
+        self._save_reasoner_context(iteration)
 
         # --- ШАГ 4: добавляем всё в основной контекст ---
         # assistant -> tool -> user (с ответом reasoner)
@@ -533,160 +719,341 @@ class DeepSeekClient:
 
         # Сохраняем контекст
         save_context_to_file(messages, iteration)
+        self._archive_step(iteration, 'step', {
+            'assistant_msg': assistant_msg,
+            'tool_results': tool_results,
+            'reasoner_user_content': user_message_content,
+            'reasoner_response': reasoner_response,
+        })
         return messages, False  # <-- Указывает, что НЕ нужно ждать
 
+    # --- ШАГ ПОЛНОГО ЦИКЛА КАК МАШИНА СОСТОЯНИЙ (с журналом для восстановления после сбоя) ---
+
+    @staticmethod
+    def _is_wait_signal(assistant_msg: Dict[str, Any], tool_results: List[Dict[str, Any]]) -> bool:
+        """True, если последним инструментом был успешно вызван wait_for_next_candle."""
+        if not assistant_msg.get('tool_calls'):
+            return False
+        # Проверяем, был ли последним вызванным инструментом wait_for_next_candle
+        last_tool_call = assistant_msg['tool_calls'][-1]
+        if last_tool_call.get('function', {}).get('name') != 'wait_for_next_candle' or not tool_results:
+            return False
+        last_tool_result = tool_results[-1]
+        if last_tool_result.get('role') != 'tool' or last_tool_result.get('tool_call_id') != last_tool_call['id']:
+            return False
+        try:
+            result_content = json.loads(last_tool_result.get('content', '{}'))
+        except json.JSONDecodeError:
+            console("⚠️ Не удалось распознать результат инструмента wait_for_next_candle.", level=logging.WARNING)
+            return False
+        if result_content.get('status') == 'waiting_for_next_candle':
+            console(f"✅ Обнаружен сигнал ожидания следующей свечи сразу после инструментальной модели: "
+                  f"{result_content.get('message', 'Ожидание свечи')}")
+            return True
+        return False
+
+    @staticmethod
+    def _build_reasoner_user_content(assistant_msg: Dict[str, Any], tool_results: List[Dict[str, Any]]) -> str:
+        """Формирует вход reasoner'а (user) так же, как call_reasoner_model."""
+        assistant_text = assistant_msg.get('content', '') or "(инструментальная модель не предоставила пояснений)"
+        tool_contents = []
+        for tr in tool_results:
+            content = tr.get('content', '')
+            try:
+                parsed = json.loads(content)
+                content = json.dumps(parsed, ensure_ascii=False, indent=2)
+            except (json.JSONDecodeError, TypeError):
+                pass
+            tool_contents.append(content)
+        tool_results_text = "\n\n".join(tool_contents) if tool_contents else "(результаты инструментов отсутствуют)"
+        return (
+            f"### Пояснение от трейдера:\n{assistant_text}\n\n"
+            f"### Данные от инструментов:\n{tool_results_text}"
+        )
+
+    async def _run_journaled_tools(self, assistant_msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Выполняет ещё не выполненные инструменты шага. Инструменты, начатые до сбоя и не завершённые,
+        не перезапускаются (возможен побочный эффект) — вместо результата модель получает ошибку.
+        """
+        state = self.journal.state
+        started = set(state['tools_started'])
+        to_run = []
+        for call in assistant_msg.get('tool_calls') or []:
+            if call['id'] in state['tool_results']:
+                continue
+            if call['id'] in started:
+                logger.warning(f"⚠️ Инструмент {call['function']['name']} ({call['id']}) был прерван сбоем, не повторяем")
+                await self.journal.tool_done(self.journal.interrupted_tool_result(call['id']))
+                continue
+            to_run.append(call)
+        if to_run:
+            await self.journal.tools_started([call['id'] for call in to_run])
+            await self._execute_tool_calls(to_run, on_done=self.journal.tool_done)
+        return self.journal.ordered_tool_results()
+
+    async def _run_cycle_step(self, messages: list, tool_schemas: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """
+        Выполняет (или продолжает) шаг из журнала начиная с сохранённого состояния:
+        started -> tools_requested -> tools_done -> reasoner_done -> committed.
+        Возвращает True, если модель вызвала wait_for_next_candle.
+        """
+        from utils.cycle_journal import (
+            PHASE_STARTED, PHASE_TOOLS_REQUESTED, PHASE_TOOLS_DONE
+        )
+        state = self.journal.state
+
+        # --- ШАГ 1: вызов инструментальной модели ---
+        if state['phase'] == PHASE_STARTED:
+            assistant_msg = await self._request_tool_model(messages, tool_schemas)
+            await self.journal.tools_requested(assistant_msg)
+        assistant_msg = state['assistant_msg']
+
+        # --- ШАГ 2: выполнение инструментов ---
+        if state['phase'] == PHASE_TOOLS_REQUESTED:
+            tool_results = await self._run_journaled_tools(assistant_msg)
+            await self.journal.tools_done(wait=self._is_wait_signal(assistant_msg, tool_results))
+        tool_results = self.journal.ordered_tool_results()
+
+        # Если сигнал ожидания получен сразу после инструментальной модели, reasoner не вызывается
+        if state['wait']:
+            await self._commit_cycle_step(messages)
+            return True
+
+        # --- ШАГ 3: Вызов reasoner'а ---
+        if state['phase'] == PHASE_TOOLS_DONE:
+            from utils.system_prompt_reasoner import generate_reasoner_system_prompt
+            reasoner_response = await self.call_reasoner_model(
+                system_prompt_for_reasoner=generate_reasoner_system_prompt(),
+                assistant_content=assistant_msg.get('content', ''),  # Передаём ТОЛЬКО content (без tool_calls!)
+                tool_results=tool_results
+            )
+            await self.journal.reasoner_done(self._build_reasoner_user_content(assistant_msg, tool_results), reasoner_response)
+
+        # --- ШАГ 4: фиксация обоих контекстов ---
+        await self._commit_cycle_step(messages)
+        return False
+
+    async def _commit_cycle_step(self, messages: list, main_saved: bool = False, reasoner_saved: bool = False):
+        """Добавляет результаты шага в контексты и сохраняет их; затем шаг помечается зафиксированным."""
+        state = self.journal.state
+        iteration = state['iteration']
+        reasoner_response = state['reasoner_response']
+
+        # --- СОХРАНЯЕМ user и assistant в reasoner_context ---
+        if reasoner_response is not None and not reasoner_saved:
+            # Если системный промпт ещё не добавлен в этот сеанс (например, после перезапуска)
+            if not self.reasoner_context or self.reasoner_context[0].get('role') != 'system':
+                from utils.system_prompt_reasoner import generate_reasoner_system_prompt
+                self.reasoner_context.append(create_message("system", generate_reasoner_system_prompt()))
+            self.reasoner_context.append(create_message("user", state['reasoner_user_content']))
+            self.reasoner_context.append(create_message("assistant", reasoner_response))
+            self._save_reasoner_context(iteration)
+
+        # --- добавляем всё в основной контекст: assistant -> tool -> user (с ответом reasoner) ---
+        if not main_saved:
+            messages.append(compact_message(state['assistant_msg']))
+            messages.extend(compact_message(result) for result in self.journal.ordered_tool_results())
+            if reasoner_response is not None:
+                # Та же строка, что и в reasoner_context, — хранится один раз
+                messages.append(create_message('user', reasoner_response))
+            save_context_to_file(messages, iteration)
+            self._archive_step(iteration, 'step', {
+                'pending_messages': state['pending_messages'],
+                'assistant_msg': state['assistant_msg'],
+                'tool_results': self.journal.ordered_tool_results(),
+                'reasoner_user_content': state['reasoner_user_content'],
+                'reasoner_response': reasoner_response,
+                'wait': state['wait'],
+            })
+
+        await self.journal.committed()
+
+    async def _resume_from_journal(self, messages: list, iteration: int) -> Tuple[list, int]:
+        """
+        Продолжает шаг из журнала, если он не завершён. Ошибка восстановления (повреждённая запись,
+        сбой инструмента) не останавливает бота: запись отбрасывается, контексты перечитываются с диска.
+        """
+        try:
+            if not self.journal.load_unfinished():
+                return messages, iteration
+            return await self._resume_unfinished_step(messages or [], iteration or 0)
+        except Exception as e:
+            logger.error(f"❌ Не удалось восстановить шаг из журнала: {e}. Запись журнала отброшена.")
+            console(f"⚠️ Восстановление шага не удалось ({e}), шаг пропущен", level=logging.WARNING)
+            await self.journal.discard()
+            # Восстановление могло частично изменить контексты в памяти — берём сохранённые
+            self._reasoner_context = None
+            messages, iteration = load_context_from_file()
+            compact_messages(messages)
+            return messages, iteration
+
+    async def _resume_unfinished_step(self, messages: list, iteration: int) -> Tuple[list, int]:
+        """Продолжает шаг, прерванный сбоем, с того состояния, которое успело попасть в журнал."""
+        from utils.cycle_journal import PHASE_REASONER_DONE
+        from utils.reasoner_context_manager import load_reasoner_context_from_file
+        state = self.journal.state
+        step_iteration = state['iteration']
+        logger.warning(f"♻️ Восстановление шага {step_iteration} после сбоя (состояние: {state['phase']})")
+        console(f"♻️ Восстановление незавершённого шага {step_iteration} ({state['phase']})")
+
+        # Сохранённые контексты помечены номером итерации — по нему видно, что уже успело записаться
+        main_saved = iteration >= step_iteration
+        self.reasoner_context, reasoner_iteration = load_reasoner_context_from_file()
+        self._reasoner_iteration = reasoner_iteration or 0
+        reasoner_saved = (reasoner_iteration or 0) >= step_iteration
+
+        if not main_saved:
+            messages.extend(state['pending_messages'])
+            messages = self._clean_incomplete_tool_calls(messages)
+
+        if state['phase'] == PHASE_REASONER_DONE or main_saved:
+            await self._commit_cycle_step(messages, main_saved=main_saved, reasoner_saved=reasoner_saved)
+        else:
+            # Тот же набор схем, что и у прерванного шага (имена сохранены в журнале)
+            tool_names = state.get('tool_names')
+            all_schemas = await asyncio.to_thread(self.tool_registry.schemas)
+            if tool_names is None:
+                tool_schemas = self.tool_selector.select(all_schemas, messages)
+            else:
+                tool_schemas = [s for s in all_schemas if s['function']['name'] in tool_names]
+            await self._run_cycle_step(messages, tool_schemas)
+        return messages, max(iteration, step_iteration)
+
+    @staticmethod
+    def _trigger_message(trigger: Dict[str, Any]) -> str:
+        return (
+            f"Внеплановый анализ: всплеск ликвидаций по {trigger.get('symbol')} — "
+            f"{trigger.get('liquidations')} ликвидаций на {trigger.get('notional_usdt')} USDT "
+            f"за {trigger.get('window_seconds'):.0f} с, смещение цены {trigger.get('price_displacement_pct')}%. "
+            f"Данные срабатывания: {json.dumps(trigger, ensure_ascii=False)}"
+        )
+
     async def run_full_analysis_cycle_until_wait(self, candle_info: dict = None):
         """
         Загружает контекст, добавляет информацию о новой свече (если есть),
         запускает цикл: инструментальная модель -> рассуждающая модель,
         до тех пор, пока инструментальная модель не вызовет инструмент 'wait_for_next_candle'.
+        Каждый шаг ведётся через журнал (utils.cycle_journal) и после сбоя продолжается с места остановки.
         Возвращает True, если был вызван wait_for_next_candle, иначе False.
         """
-        print(f"\n--- 🚀 Запуск ПОЛНОГО цикла анализа до команды 'ждать' ---")
+        console(f"\n--- 🚀 Запуск ПОЛНОГО цикла анализа до команды 'ждать' ---")
         messages, iteration = load_context_from_file()
-        if not messages:
-            from utils.system_prompt import generate_system_prompt
-            system_prompt = generate_system_prompt()
-            messages = [
-                {'role': 'system', 'content': system_prompt},
-            ]
-            iteration = 0
-        else:
-            # Добавляем информацию о новой свече к существующему контексту
-            if candle_info:
-                candle_message = f"Закрылась новая {candle_info['interval']}-минутная свеча для {candle_info['symbol']} в {candle_info['timestamp']}."
-                messages.append({'role': 'user', 'content': candle_message})
-            iteration += 1  # Увеличиваем номер итерации
+        compact_messages(messages)
 
-        # Цикл анализа до команды 'ждать'
-        while True:
-            iteration += 1
-            logger.info(f"--- 🔄 Итерация полного цикла {iteration} ---")
-            try:
-                # Сначала по циклам, потом по токенам — на всякий случай
-                messages = truncate_context_by_cycles(messages, max_cycles=8)
-                messages = truncate_context_adaptive(messages, max_tokens=900000)
-                messages = self._clean_incomplete_tool_calls(messages)
-                estimated = count_tokens_in_messages(messages)
-                logger.info(f"📊 Токены перед итерацией {iteration}: ~{estimated}")
-                print(f"\n--- 🔄 Итерация {iteration} ---")
-                print(f"[Токены: ~{estimated} / 100000]\n")
+        # Бюджет цикла действует и на восстановление шага (вызовы моделей ограничены временем цикла)
+        self.budget.start_cycle(self.token_usage)
 
-                # --- ШАГ 1: вызов инструментальной модели ---
-                assistant_msg, tool_results = await self.call_model_with_tools(messages)
+        try:
+            # --- ВОССТАНОВЛЕНИЕ ШАГА, ПРЕРВАННОГО СБОЕМ ---
+            messages, iteration = await self._resume_from_journal(messages, iteration)
 
-                # --- ПРОВЕРКА: вызван ли wait_for_next_candle СРАЗУ после инструментальной модели? ---
-                wait_for_candle_immediate = False
-                if assistant_msg.get('tool_calls'):
-                    # Проверяем, был ли последним вызванным инструментом wait_for_next_candle
-                    last_tool_call = assistant_msg['tool_calls'][-1]  # Берем последний вызов
-                    if last_tool_call.get('function', {}).get('name') == 'wait_for_next_candle':
-                        # Проверяем результат вызова инструмента
-                        if tool_results:  # Если есть результаты инструментов
-                            last_tool_result = tool_results[-1]  # Берем последний результат
-                            if last_tool_result.get('role') == 'tool' and last_tool_result.get('tool_call_id') == \
-                                    last_tool_call['id']:
-                                try:
-                                    result_content = json.loads(last_tool_result.get('content', '{}'))
-                                    if result_content.get('status') == 'waiting_for_next_candle':
-                                        print(
-                                            f"✅ Обнаружен сигнал ожидания следующей свечи сразу после инструментальной модели: {result_content.get('message', 'Ожидание свечи')}")
-                                        wait_for_candle_immediate = True
-                                except json.JSONDecodeError:
-                                    print("⚠️ Не удалось распознать результат инструмента wait_for_next_candle.")
-                # --- КОНЕЦ ПРОВЕРКИ ---
-
-                # Если сигнал ожидания получен сразу после инструментальной модели, ВЫХОДИМ ИЗ ЦИКЛА
-                if wait_for_candle_immediate:
-                    # Добавляем сообщение инструментальной модели и результат инструмента в контекст
-                    messages.append(assistant_msg)
-                    messages.extend(tool_results)  # Результат wait_for_next_candle уже в tool_results
-                    # Сохраняем контекст
+            if candle_info:
+                self.current_symbol = candle_info.get('symbol')
+
+            # Сообщения, добавленные после последнего сохранения контекста (попадают в журнал шага)
+            pending_messages = []
+            if not messages:
+                from utils.system_prompt import generate_system_prompt
+                system_prompt = generate_system_prompt()
+                messages = [
+                    create_message('system', system_prompt),
+                ]
+                pending_messages = list(messages)
+                iteration = 0
+            else:
+                # Добавляем информацию о новой свече к существующему контексту
+                if candle_info and not candle_info.get('trigger'):
+                    candle_message = f"Закрылась новая {candle_info['interval']}-минутная свеча для {candle_info['symbol']} в {candle_info['timestamp']}."
+                    messages.append({'role': 'user', 'content': candle_message})
+                    pending_messages.append(messages[-1])
+                iteration += 1  # Увеличиваем номер итерации
+
+            # Внеплановый запуск по событию рынка: сообщаем модели причину и данные срабатывания
+            if candle_info and candle_info.get('trigger'):
+                messages.append({'role': 'user', 'content': self._trigger_message(candle_info['trigger'])})
+                pending_messages.append(messages[-1])
+
+            # Схемы строятся в потоке: при холодном кэше это импорт всех модулей инструментов
+            all_schemas = await asyncio.to_thread(self.tool_registry.schemas)
+            # Набор инструментов выбирается один раз на цикл: одинаковые схемы на всех шагах сохраняют кэш префикса
+            tool_schemas = self.tool_selector.select(all_schemas, messages)
+            tool_names = [schema['function']['name'] for schema in tool_schemas]
+
+            # Цикл анализа до команды 'ждать'
+            while True:
+                # --- ПРОВЕРКА БЮДЖЕТА: при исчерпании — принудительное ожидание ---
+                budget_reason = self.budget.exhausted_reason(self.token_usage)
+                if budget_reason:
+                    logger.warning(f"💸 Бюджет цикла исчерпан: {budget_reason}. Принудительное ожидание следующей свечи.")
+                    console(f"💸 Бюджет цикла исчерпан: {budget_reason}. Принудительное ожидание.")
+                    messages = self._clean_incomplete_tool_calls(messages)
+                    messages.append({
+                        'role': 'user',
+                        'content': f"Бюджет цикла анализа исчерпан ({budget_reason}). "
+                                   f"Анализ приостановлен до следующей свечи."
+                    })
                     save_context_to_file(messages, iteration)
-                    print(f"--- ✅ ПОЛНЫЙ цикл анализа завершен по команде 'ждать' ---")
-                    return True  # <-- Указывает, что нужно ждать
-
-                # --- ШАГ 2: Подготовка данных ДЛЯ REASONER'А ---
-                from utils.system_prompt_reasoner import generate_reasoner_system_prompt
-                reasoner_system_prompt = generate_reasoner_system_prompt()
-
-                # Передаём ТОЛЬКО content (без tool_calls!)
-                assistant_content_only = assistant_msg.get('content', '')  # ← именно это!
-
-                # --- ШАГ 3: Вызов reasoner'а ---
-                reasoner_response = await self.call_reasoner_model(
-                    system_prompt_for_reasoner=reasoner_system_prompt,
-                    assistant_content=assistant_content_only,
-                    tool_results=tool_results  # ← уже содержит только результаты
-                )
-
-                # --- ФОРМИРУЕМ ТЕКУЩИЙ ВХОД ДЛЯ REASONER'А (user) ---
-                # (Повторяем логику из call_reasoner_model для формирования user_message_content)
-                assistant_text = assistant_msg.get('content',
-                                                   '') or "(инструментальная модель не предоставила пояснений)"
-                tool_contents = []
-                for tr in tool_results:
-                    content = tr.get('content', '')
-                    try:
-                        parsed = json.loads(content)
-                        content = json.dumps(parsed, ensure_ascii=False, indent=2)
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-                    tool_contents.append(content)
-                tool_results_text = "\n\n".join(
-                    tool_contents) if tool_contents else "(результаты инструментов отсутствуют)"
-                user_message_content = (
-                    f"### Пояснение от трейдера:\n{assistant_text}\n\n"
-                    f"### Данные от инструментов:\n{tool_results_text}"
-                )
-
-                # --- СОХРАНЯЕМ user и assistant в reasoner_context ---
-                # Если системный промпт ещё не добавлен в этот сеанс (например, после перезапуска)
-                if not self.reasoner_context or self.reasoner_context[0].get('role') != 'system':
-                    self.reasoner_context.append({"role": "system", "content": reasoner_system_prompt})
-
-                self.reasoner_context.append({
-                    "role": "user",
-                    "content": user_message_content
-                })
-                self.reasoner_context.append({
-                    "role": "assistant",
-                    "content": reasoner_response
-                })
-
-                # --- СОХРАНЯЕМ КОНТЕКСТ РАССУЖДЕНИЙ ---
-                from utils.reasoner_context_manager import save_reasoner_context_to_file
-                save_reasoner_context_to_file(self.reasoner_context, iteration)
-
-                # --- ШАГ 4: добавляем всё в основной контекст ---
-                # assistant -> tool -> user (с ответом reasoner)
-                messages.append(assistant_msg)
-                messages.extend(tool_results)
-                messages.append({
-                    'role': 'user',
-                    'content': reasoner_response
-                })
-
-                # Сохраняем контекст
-                save_context_to_file(messages, iteration)
-
-                # Цикл продолжается, возвращаемся к вызову инструментальной модели
-
-            except KeyboardInterrupt:
-                logger.info("🛑 Цикл прерван пользователем.")
-                print(f"\n--- 🛑 ЦИКЛ ПРЕРВАН ---")
-                save_context_to_file(messages, iteration)
-                return False  # <-- Возвращаем False, так как не было команды 'ждать'
-            except Exception as e:
-                logger.error(f"❌ Ошибка в итерации полного цикла {iteration}: {e}")
-                print(f"❌ Ошибка: {e}")
-                messages = self._clean_incomplete_tool_calls(messages)
-                messages.append({
-                    'role': 'user',
-                    'content': f"Произошла ошибка: {e}. Продолжай работу."
-                })
-                save_context_to_file(messages, iteration)
-                # Возвращаем False, чтобы main.py не ждал, а продолжил ожидание свечи
-                # Или можно решить по-другому, например, продолжить цикл
-                # Пока что вернем False
-                return False
+                    self._archive_step(iteration, 'budget_stop', {
+                        'pending_messages': pending_messages, 'message': messages[-1], 'budget': self.get_budget_report()
+                    })
+                    logger.info(f"📊 Бюджет цикла: {self.get_budget_report()}")
+                    return True
+
+                iteration += 1
+                self.budget.next_iteration()
+                logger.info(f"--- 🔄 Итерация полного цикла {iteration} ---")
+                try:
+                    # Сначала по циклам, потом по токенам — на всякий случай
+                    messages = self._truncate_context(messages, iteration)
+                    estimated = count_tokens_in_messages(messages)
+                    logger.info(f"📊 Токены перед итерацией {iteration}: ~{estimated}")
+                    console(f"\n--- 🔄 Итерация {iteration} ---")
+                    console(f"[Токены: ~{estimated} / 100000]\n", level=logging.DEBUG)
+
+                    # --- ШАГ ЦИКЛА (инструментальная модель -> инструменты -> reasoner -> сохранение) ---
+                    await self.journal.begin(iteration, pending_messages, tool_names=tool_names)
+                    should_wait = await self._run_cycle_step(messages, tool_schemas)
+                    pending_messages = []
+
+                    # Если сигнал ожидания получен сразу после инструментальной модели, ВЫХОДИМ ИЗ ЦИКЛА
+                    if should_wait:
+                        console(f"--- ✅ ПОЛНЫЙ цикл анализа завершен по команде 'ждать' ---")
+                        logger.info(f"📊 Бюджет цикла: {self.get_budget_report()}")
+                        logger.info(f"🧰 Экономия на схемах инструментов: {self.tool_selector.savings_report()}")
+                        if self.response_cache:
+                            logger.info(f"♻️ Кэш ответов моделей: {self.response_cache.report()}")
+                        logger.info(f"🧵 Пул строк контекста: {get_content_pool().report()}")
+                        return True  # <-- Указывает, что нужно ждать
+
+                    # Цикл продолжается, возвращаемся к вызову инструментальной модели
+
+                except KeyboardInterrupt:
+                    logger.info("🛑 Цикл прерван пользователем.")
+                    console(f"\n--- 🛑 ЦИКЛ ПРЕРВАН ---")
+                    # Незавершённый шаг остаётся в журнале и будет продолжен при следующем запуске
+                    if not self.journal.in_progress():
+                        save_context_to_file(messages, iteration)
+                    return False  # <-- Возвращаем False, так как не было команды 'ждать'
+                except Exception as e:
+                    logger.error(f"❌ Ошибка в итерации полного цикла {iteration}: {e}")
+                    console(f"❌ Ошибка: {e}", level=logging.ERROR)
+                    messages = self._clean_incomplete_tool_calls(messages)
+                    messages.append({
+                        'role': 'user',
+                        'content': f"Произошла ошибка: {e}. Продолжай работу."
+                    })
+                    save_context_to_file(messages, iteration)
+                    self._archive_step(iteration, 'error', {
+                        'pending_messages': pending_messages, 'message': messages[-1], 'error': str(e)
+                    })
+                    if self.journal.in_progress():
+                        await self.journal.committed()
+                    # Возвращаем False, чтобы main.py не ждал, а продолжил ожидание свечи
+                    # Или можно решить по-другому, например, продолжить цикл
+                    # Пока что вернем False
+                    return False
+        finally:
+            self.budget.finish_cycle()
+            # Дневные расходы цикла сохраняются одной записью в потоке
+            await self.budget.persist()
@@ -0,0 +1,145 @@
+# utils/event_dispatcher.py
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.helpers import logger
+
+DEFAULT_TOPIC_CAPACITY = 10000
+
+BatchHandler = Callable[[List[Any]], Awaitable[None]]
+CoalesceKey = Callable[[dict], Any]
+
+
+class TopicBuffer:
+    """
+    Потокобезопасный буфер одной темы.
+    Без coalesce_key — кольцевой буфер сообщений (при переполнении вытесняются самые старые).
+    С coalesce_key — хранится только последнее состояние по каждому ключу (элементы message['data']).
+    """
+
+    def __init__(self, topic: str, handler: BatchHandler, capacity: int, coalesce_key: Optional[CoalesceKey]):
+        self.topic = topic
+        self.handler = handler
+        self.capacity = capacity
+        self.coalesce_key = coalesce_key
+        self.lock = threading.Lock()
+        self.ring: deque = deque(maxlen=capacity)
+        self.latest: Dict[Any, dict] = {}
+        self.scheduled = False
+        self.wakeup: Optional[asyncio.Event] = None
+        self.stats = {'published': 0, 'delivered': 0, 'dropped': 0, 'coalesced': 0, 'batches': 0, 'max_batch': 0}
+
+    def push(self, message: dict) -> bool:
+        """Кладёт сообщение в буфер. Возвращает True, если потребителя нужно разбудить."""
+        with self.lock:
+            self.stats['published'] += 1
+            if self.coalesce_key is None:
+                if len(self.ring) == self.capacity:
+                    self.stats['dropped'] += 1
+                self.ring.append(message)
+            else:
+                for item in message.get('data') or []:
+                    key = self.coalesce_key(item)
+                    if key in self.latest:
+                        self.stats['coalesced'] += 1
+                    self.latest[key] = item
+            if self.scheduled:
+                return False
+            self.scheduled = True
+            return True
+
+    def drain(self) -> List[Any]:
+        with self.lock:
+            if self.coalesce_key is None:
+                batch = list(self.ring)
+                self.ring.clear()
+            else:
+                batch = list(self.latest.values())
+                self.latest.clear()
+            self.scheduled = False
+        if batch:
+            self.stats['delivered'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+        return batch
+
+    def depth(self) -> int:
+        return len(self.ring) if self.coalesce_key is None else len(self.latest)
+
+
+class EventDispatcher:
+    """
+    Единая точка входа для колбэков pybit (они вызываются в потоке WebSocket).
+    publish() только кладёт сообщение в буфер темы; в цикл событий переход выполняется один раз
+    на пачку (call_soon_threadsafe), а обработчик темы получает всю накопленную пачку.
+    """
+
+    def __init__(self):
+        self._topics: Dict[str, TopicBuffer] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._consumers: List[asyncio.Task] = []
+        self._no_loop_warned = False
+
+    def register(self, topic: str, handler: BatchHandler,
+                 capacity: int = DEFAULT_TOPIC_CAPACITY, coalesce_key: Optional[CoalesceKey] = None):
+        self._topics[topic] = TopicBuffer(topic, handler, capacity, coalesce_key)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Запускает потребителей тем в цикле событий (вызывать из этого цикла)."""
+        self._loop = loop
+        for buffer in self._topics.values():
+            buffer.wakeup = asyncio.Event()
+            self._consumers.append(loop.create_task(self._consume(buffer)))
+
+    async def stop(self):
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers.clear()
+        self._loop = None
+
+    def publish(self, topic: str, message: dict):
+        """Вызывается из потока pybit: без блокирующих операций, O(1) на сообщение."""
+        buffer = self._topics.get(topic)
+        if buffer is None:
+            return
+        loop = self._loop
+        if loop is None:
+            buffer.stats['dropped'] += 1
+            if not self._no_loop_warned:
+                self._no_loop_warned = True
+                logger.warning(f"EventDispatcher: цикл событий не запущен, событие '{topic}' НЕ обработано.")
+            return
+        if buffer.push(message):
+            try:
+                loop.call_soon_threadsafe(buffer.wakeup.set)
+            except RuntimeError:
+                # Цикл уже закрыт (остановка бота)
+                pass
+
+    async def _consume(self, buffer: TopicBuffer):
+        while True:
+            await buffer.wakeup.wait()
+            buffer.wakeup.clear()
+            batch = buffer.drain()
+            if not batch:
+                continue
+            try:
+                await buffer.handler(batch)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика темы '{buffer.topic}': {e}")
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {topic: {**buffer.stats, 'depth': buffer.depth()} for topic, buffer in self._topics.items()}
+
+
+_dispatcher: Optional[EventDispatcher] = None
+
+
+def get_event_dispatcher() -> EventDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = EventDispatcher()
+    return _dispatcher
@@ -0,0 +1,150 @@
+# utils/event_triggers.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from utils.helpers import logger
+
+# Пороги внепланового анализа по ликвидациям (можно переопределить переменными окружения)
+LIQUIDATION_WINDOW_SECONDS = float(os.getenv("LIQUIDATION_WINDOW_SECONDS", "60"))
+LIQUIDATION_NOTIONAL_THRESHOLD = float(os.getenv("LIQUIDATION_NOTIONAL_THRESHOLD", "250000"))  # USDT за окно
+LIQUIDATION_DISPLACEMENT_PCT = float(os.getenv("LIQUIDATION_DISPLACEMENT_PCT", "1.0"))  # % движения цены за окно
+# Сколько ждать после пересечения порога, чтобы собрать весь всплеск в один запуск
+LIQUIDATION_DEBOUNCE_SECONDS = float(os.getenv("LIQUIDATION_DEBOUNCE_SECONDS", "5"))
+# Минимальный интервал после анализа, запущенного триггером
+LIQUIDATION_COOLDOWN_SECONDS = float(os.getenv("LIQUIDATION_COOLDOWN_SECONDS", "300"))
+# Короткая тишина после планового анализа: он уже учёл обстановку, но новый всплеск не должен ждать весь cooldown
+POST_ANALYSIS_QUIET_SECONDS = float(os.getenv("POST_ANALYSIS_QUIET_SECONDS", "30"))
+
+
+class LiquidationTrigger:
+    """
+    Следит за потоком ликвидаций и сигналит о необходимости внепланового анализа,
+    когда за скользящее окно превышен объём ликвидаций или смещение цены.
+    Всплеск собирается в течение debounce-паузы, повторные срабатывания гасятся cooldown'ом.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = LIQUIDATION_WINDOW_SECONDS,
+        notional_threshold: float = LIQUIDATION_NOTIONAL_THRESHOLD,
+        displacement_pct: float = LIQUIDATION_DISPLACEMENT_PCT,
+        debounce_seconds: float = LIQUIDATION_DEBOUNCE_SECONDS,
+        cooldown_seconds: float = LIQUIDATION_COOLDOWN_SECONDS,
+        post_analysis_quiet_seconds: float = POST_ANALYSIS_QUIET_SECONDS
+    ):
+        self.window_seconds = window_seconds
+        self.notional_threshold = notional_threshold
+        self.displacement_pct = displacement_pct
+        self.debounce_seconds = debounce_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.post_analysis_quiet_seconds = post_analysis_quiet_seconds
+
+        self._events: deque = deque()  # (monotonic, notional, price, side, symbol, exchange_ts)
+        self._window_notional = 0.0
+        self._above = False  # окно уже выше порога: пересечением считается только переход снизу вверх
+        self._cooldown_until = 0.0
+        self._debounce_handle: Optional[asyncio.TimerHandle] = None
+        self._fired = asyncio.Event()
+        self._context: Optional[Dict[str, Any]] = None
+        self.stats = {'events': 0, 'crossings': 0, 'fired': 0, 'suppressed': 0}
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._window_notional -= self._events.popleft()[1]
+
+    def _displacement(self) -> float:
+        if len(self._events) < 2:
+            return 0.0
+        first_price = self._events[0][2]
+        last_price = self._events[-1][2]
+        return (last_price - first_price) / first_price * 100 if first_price else 0.0
+
+    def on_liquidation(self, liquidation: dict):
+        """Вызывается в цикле событий для каждой ликвидации (поля Bybit: s, S, v, p, T)."""
+        try:
+            volume = float(liquidation.get('v'))
+            price = float(liquidation.get('p'))
+        except (TypeError, ValueError):
+            return
+        now = time.monotonic()
+        notional = volume * price
+        self._events.append((now, notional, price, liquidation.get('S'), liquidation.get('s'), liquidation.get('T')))
+        self._window_notional += notional
+        self._prune(now)
+        self.stats['events'] += 1
+
+        crossed = (
+            self._window_notional >= self.notional_threshold
+            or abs(self._displacement()) >= self.displacement_pct
+        )
+        if not crossed:
+            self._above = False
+            return
+        if not self._above:
+            self._above = True
+            self.stats['crossings'] += 1
+            if now < self._cooldown_until:
+                self.stats['suppressed'] += 1
+        if self._debounce_handle is not None or now < self._cooldown_until:
+            return
+        logger.info(f"⚡ Порог ликвидаций пересечён: {self._window_notional:,.0f} USDT, "
+                    f"смещение {self._displacement():+.2f}% — запуск через {self.debounce_seconds:.0f} с")
+        self._debounce_handle = asyncio.get_running_loop().call_later(self.debounce_seconds, self._fire)
+
+    def _fire(self):
+        self._debounce_handle = None
+        now = time.monotonic()
+        self._prune(now)
+        if not self._events:
+            return
+        by_side: Dict[str, float] = {}
+        for _, notional, _, side, _, _ in self._events:
+            by_side[side] = by_side.get(side, 0.0) + notional
+        self._context = {
+            'reason': 'liquidation_cascade',
+            'symbol': self._events[-1][4],
+            'window_seconds': self.window_seconds,
+            'liquidations': len(self._events),
+            'notional_usdt': round(self._window_notional, 2),
+            'notional_by_side': {side: round(value, 2) for side, value in by_side.items()},
+            'largest_usdt': round(max(event[1] for event in self._events), 2),
+            'price_displacement_pct': round(self._displacement(), 3),
+            'first_price': self._events[0][2],
+            'last_price': self._events[-1][2],
+            'last_liquidation_ts': self._events[-1][5],
+        }
+        self._cooldown_until = now + self.cooldown_seconds
+        self.stats['fired'] += 1
+        self._fired.set()
+
+    def note_analysis_started(self):
+        """
+        Любой запуск анализа учитывает текущую обстановку: ожидающий сигнал сбрасывается.
+        Полный cooldown уже назначен в _fire для запусков по триггеру; плановый запуск даёт только короткую тишину.
+        """
+        self._fired.clear()
+        self._context = None
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + self.post_analysis_quiet_seconds)
+
+    async def wait(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Ждёт срабатывания не дольше timeout секунд. Возвращает контекст срабатывания или None."""
+        try:
+            await asyncio.wait_for(self._fired.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+        self._fired.clear()
+        context, self._context = self._context, None
+        return context
+
+
+_liquidation_trigger: Optional[LiquidationTrigger] = None
+
+
+def get_liquidation_trigger() -> LiquidationTrigger:
+    global _liquidation_trigger
+    if _liquidation_trigger is None:
+        _liquidation_trigger = LiquidationTrigger()
+    return _liquidation_trigger
@@ -0,0 +1,206 @@
+# utils/indicator_engine.py
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from utils.candle_store import CandleArray, CandleStore, get_candle_store
+
+EMA_PERIODS = (9, 21, 50, 200)
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+BOLLINGER_PERIOD, BOLLINGER_STD = 20, 2.0
+PATTERN_LOOKBACK = 50
+
+
+def detect_patterns(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> Dict[str, np.ndarray]:
+    """Векторный поиск свечных паттернов. Возвращает булевы маски той же длины, что и входные колонки."""
+    body = np.abs(c - o)
+    candle_range = np.maximum(h - l, 1e-12)
+    upper_shadow = h - np.maximum(o, c)
+    lower_shadow = np.minimum(o, c) - l
+    bullish = c > o
+    bearish = c < o
+
+    prev_o = np.roll(o, 1)
+    prev_c = np.roll(c, 1)
+    prev_bullish = np.roll(bullish, 1)
+    prev_bearish = np.roll(bearish, 1)
+    has_prev = np.arange(len(c)) > 0
+
+    return {
+        'doji': body <= candle_range * 0.1,
+        'hammer': (lower_shadow >= body * 2) & (upper_shadow <= body * 0.5) & (body > 0),
+        'shooting_star': (upper_shadow >= body * 2) & (lower_shadow <= body * 0.5) & (body > 0),
+        'bullish_engulfing': has_prev & prev_bearish & bullish & (o <= prev_c) & (c >= prev_o),
+        'bearish_engulfing': has_prev & prev_bullish & bearish & (o >= prev_c) & (c <= prev_o),
+    }
+
+
+class SeriesIndicators:
+    """Инкрементальное состояние индикаторов одного ряда: O(1) на закрытую свечу."""
+
+    def __init__(self):
+        self.count = 0
+        self.prev_close: Optional[float] = None
+        self.ema: Dict[int, float] = {}
+        self.macd_fast: Optional[float] = None
+        self.macd_slow: Optional[float] = None
+        self.macd_signal: Optional[float] = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.atr: Optional[float] = None
+        self.latest: Dict[str, Any] = {}
+        self._before_last: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def _ema_step(prev: Optional[float], value: float, period: int, n: int) -> float:
+        """Шаг EMA для n-го значения ряда: первые period значений дают SMA (затравка), дальше — EMA."""
+        if prev is None:
+            return value
+        if n <= period:
+            return prev + (value - prev) / n
+        alpha = 2.0 / (period + 1)
+        return prev + alpha * (value - prev)
+
+    def _state(self) -> Dict[str, Any]:
+        return {
+            'count': self.count, 'prev_close': self.prev_close, 'ema': dict(self.ema),
+            'macd_fast': self.macd_fast, 'macd_slow': self.macd_slow, 'macd_signal': self.macd_signal,
+            'avg_gain': self.avg_gain, 'avg_loss': self.avg_loss, 'atr': self.atr,
+        }
+
+    def _restore(self, state: Dict[str, Any]):
+        for key, value in state.items():
+            setattr(self, key, dict(value) if key == 'ema' else value)
+
+    def update(self, series: CandleArray, is_new: bool):
+        """Обновляет индикаторы по последней свече ряда (при перезаписи свечи шаг пересчитывается)."""
+        if is_new:
+            self._before_last = self._state()
+        elif self._before_last is not None:
+            self._restore(self._before_last)
+        else:
+            return
+
+        n = len(series)
+        close = series.column('close')[n - 1]
+        high = series.column('high')[n - 1]
+        low = series.column('low')[n - 1]
+
+        n_closes = self.count + 1
+        for period in EMA_PERIODS:
+            self.ema[period] = self._ema_step(self.ema.get(period), close, period, n_closes)
+
+        self.macd_fast = self._ema_step(self.macd_fast, close, MACD_FAST, n_closes)
+        self.macd_slow = self._ema_step(self.macd_slow, close, MACD_SLOW, n_closes)
+        macd = self.macd_fast - self.macd_slow
+        # Сигнальная линия — EMA линии MACD, которая определена начиная с MACD_SLOW-й свечи
+        if n_closes >= MACD_SLOW:
+            self.macd_signal = self._ema_step(self.macd_signal, macd, MACD_SIGNAL, n_closes - MACD_SLOW + 1)
+
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            if self.count <= RSI_PERIOD:
+                # Накопление начального среднего (простое среднее первых RSI_PERIOD изменений)
+                self.avg_gain += (gain - self.avg_gain) / self.count
+                self.avg_loss += (loss - self.avg_loss) / self.count
+            else:
+                self.avg_gain = (self.avg_gain * (RSI_PERIOD - 1) + gain) / RSI_PERIOD
+                self.avg_loss = (self.avg_loss * (RSI_PERIOD - 1) + loss) / RSI_PERIOD
+            if self.atr is None or self.count <= ATR_PERIOD:
+                self.atr = true_range if self.atr is None else self.atr + (true_range - self.atr) / self.count
+            else:
+                self.atr = (self.atr * (ATR_PERIOD - 1) + true_range) / ATR_PERIOD
+        self.prev_close = close
+        self.count += 1
+
+        self.latest = self._build_snapshot(series, macd)
+
+    def _build_snapshot(self, series: CandleArray, macd: float) -> Dict[str, Any]:
+        n = len(series)
+        snapshot: Dict[str, Any] = {
+            'timestamp': int(series.column('timestamp')[n - 1]),
+            'close': float(self.prev_close),
+            'candles': self.count,
+        }
+        for period in EMA_PERIODS:
+            snapshot[f'ema_{period}'] = float(self.ema[period]) if self.count >= period else None
+
+        snapshot['macd'] = float(macd) if self.count >= MACD_SLOW else None
+        snapshot['macd_signal'] = (float(self.macd_signal)
+                                   if self.count >= MACD_SLOW + MACD_SIGNAL - 1 else None)
+
+        if self.count > RSI_PERIOD:
+            if self.avg_loss:
+                snapshot['rsi_14'] = 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+            else:
+                # Без падений RSI = 100, а ряд без изменений цены нейтрален
+                snapshot['rsi_14'] = 100.0 if self.avg_gain else 50.0
+        else:
+            snapshot['rsi_14'] = None
+        snapshot['atr_14'] = float(self.atr) if self.atr is not None and self.count > ATR_PERIOD else None
+
+        if n >= BOLLINGER_PERIOD:
+            window = series.column('close')[n - BOLLINGER_PERIOD:]
+            mean = float(window.mean())
+            std = float(window.std())
+            snapshot['sma_20'] = mean
+            snapshot['bb_upper'] = mean + BOLLINGER_STD * std
+            snapshot['bb_lower'] = mean - BOLLINGER_STD * std
+        else:
+            snapshot['sma_20'] = snapshot['bb_upper'] = snapshot['bb_lower'] = None
+
+        # Паттерны по последним двум свечам (для engulfing нужна предыдущая)
+        start = max(0, n - 2)
+        masks = detect_patterns(series.column('open')[start:], series.column('high')[start:],
+                                series.column('low')[start:], series.column('close')[start:])
+        snapshot['patterns'] = [name for name, mask in masks.items() if mask[-1]]
+        return snapshot
+
+
+class IndicatorEngine:
+    """Поддерживает индикаторы всех рядов CandleStore в актуальном состоянии по мере закрытия свечей."""
+
+    def __init__(self, store: CandleStore):
+        self.store = store
+        self._series: Dict[Tuple[str, str], SeriesIndicators] = {}
+        store.add_listener(self._on_candle)
+
+    def _on_candle(self, series: CandleArray, is_new: bool):
+        key = (series.symbol, series.timeframe)
+        state = self._series.get(key)
+        if state is None:
+            state = self._series[key] = SeriesIndicators()
+        state.update(series, is_new)
+
+    def snapshot(self, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+        # Снимок строится в потоке WebSocket под блокировкой хранилища — копируем под ней же
+        with self.store.lock:
+            state = self._series.get((symbol, timeframe))
+            if state is None or not state.latest:
+                return None
+            snapshot = dict(state.latest)
+            snapshot['patterns'] = list(snapshot['patterns'])
+            return snapshot
+
+    def scan_patterns(self, symbol: str, timeframe: str, lookback: int = PATTERN_LOOKBACK) -> Dict[str, list]:
+        """Векторный поиск паттернов по последним lookback свечам. Возвращает timestamps срабатываний."""
+        columns = self.store.tail(symbol, timeframe, lookback, ('timestamp', 'open', 'high', 'low', 'close'))
+        if columns is None:
+            return {}
+        timestamps = columns['timestamp']
+        masks = detect_patterns(columns['open'], columns['high'], columns['low'], columns['close'])
+        return {name: timestamps[mask].tolist() for name, mask in masks.items() if mask.any()}
+
+
+_engine: Optional[IndicatorEngine] = None
+
+
+def get_indicator_engine() -> IndicatorEngine:
+    global _engine
+    if _engine is None:
+        _engine = IndicatorEngine(get_candle_store())
+    return _engine
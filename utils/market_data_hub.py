@@ -0,0 +1,231 @@
+# utils/market_data_hub.py
+import asyncio
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Set
+
+from utils.candle_store import CandleArray, get_candle_store
+from utils.helpers import logger
+from utils.state_dir import launch_path
+
+# Относительный путь считается от каталога запуска: worker к этому моменту уже в своём каталоге состояния
+MARKET_HUB_SOCKET = launch_path(os.getenv("MARKET_HUB_SOCKET", "/tmp/bybit_market_hub.sock"))
+HUB_CLIENT_QUEUE_SIZE = 10000      # кадров на подписчика; медленный подписчик теряет самые старые
+HUB_SNAPSHOT_CANDLES = 500         # свечей каждого ряда в снимке при подключении
+HUB_HEARTBEAT_INTERVAL = 5.0
+HUB_MAX_SILENCE = 3 * HUB_HEARTBEAT_INTERVAL
+HUB_BACKOFF_INITIAL = 0.5
+HUB_BACKOFF_MAX = 30.0
+
+# Кадры протокола: одна JSON-строка на кадр
+FRAME_SNAPSHOT = "candles"
+FRAME_CANDLE = "candle"
+FRAME_HEARTBEAT = "heartbeat"
+
+
+def _encode(frame: Dict[str, Any]) -> bytes:
+    return json.dumps(frame, ensure_ascii=False, separators=(',', ':')).encode("utf-8") + b"\n"
+
+
+def _candle_frame(series: CandleArray) -> Dict[str, Any]:
+    return {'topic': FRAME_CANDLE, 'symbol': series.symbol, 'timeframe': series.timeframe, 'candle': series.last()}
+
+
+class _Subscriber:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=HUB_CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, payload: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(payload)
+
+
+class MarketDataHub:
+    """
+    Процесс-хаб владеет публичными потоками и кэшем свечей и раздаёт их процессам-стратегиям
+    через Unix-сокет. Кадр кодируется один раз и рассылается всем подписчикам, поэтому
+    число соединений с биржей и стоимость разбора не растут с числом стратегий.
+    Новый подписчик получает снимок кэша свечей, затем поток закрытых свечей и ликвидаций.
+    """
+
+    def __init__(self, socket_path: str = MARKET_HUB_SOCKET):
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Set[_Subscriber] = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.stats = {'connections': 0, 'frames': 0, 'dropped': 0}
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # сокет от предыдущего запуска
+        self._server = await asyncio.start_unix_server(self._serve, path=self.socket_path)
+        # Закрытые свечи (из потока и из догрузки через REST) уходят подписчикам в порядке кэша
+        get_candle_store().add_listener(self._on_candle)
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        logger.info(f"📡 Хаб рыночных данных слушает {self.socket_path}")
+
+    async def stop(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for subscriber in list(self._subscribers):
+            subscriber.writer.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def publish(self, topic: str, message: dict):
+        """Рассылает сообщение потока подписчикам. Потокобезопасно (можно вызывать из потока pybit)."""
+        self._broadcast_threadsafe({'topic': topic, 'message': message})
+
+    def _on_candle(self, series: CandleArray, is_new: bool):
+        self._broadcast_threadsafe(_candle_frame(series))
+
+    def _broadcast_threadsafe(self, frame: Dict[str, Any]):
+        loop = self._loop
+        if loop is None:
+            return
+        payload = _encode(frame)
+        try:
+            loop.call_soon_threadsafe(self._broadcast, payload)
+        except RuntimeError:
+            # Цикл уже закрыт (остановка хаба)
+            pass
+
+    def _broadcast(self, payload: bytes):
+        self.stats['frames'] += 1
+        for subscriber in self._subscribers:
+            subscriber.offer(payload)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HUB_HEARTBEAT_INTERVAL)
+            self._broadcast(_encode({'topic': FRAME_HEARTBEAT}))
+
+    def _snapshot(self) -> list:
+        store = get_candle_store()
+        names = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+        frames = []
+        for symbol, timeframe in store.keys():
+            # Копии под блокировкой хранилища: поток WebSocket может одновременно добавлять свечи
+            columns = store.tail(symbol, timeframe, HUB_SNAPSHOT_CANDLES, names)
+            if columns is None:
+                continue
+            rows = list(zip(*(columns[name].tolist() for name in names)))
+            frames.append(_encode({
+                'topic': FRAME_SNAPSHOT, 'symbol': symbol, 'timeframe': timeframe, 'rows': rows
+            }))
+        return frames
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscriber = _Subscriber(writer)
+        # Снимок ставится в очередь до регистрации: живые кадры придут строго после него
+        for payload in self._snapshot():
+            subscriber.offer(payload)
+        self._subscribers.add(subscriber)
+        self.stats['connections'] += 1
+        logger.info(f"🔗 Хаб: подключился подписчик (всего {len(self._subscribers)})")
+        try:
+            while True:
+                writer.write(await subscriber.queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._subscribers.discard(subscriber)
+            self.stats['dropped'] += subscriber.dropped
+            writer.close()
+            logger.info(f"🔌 Хаб: подписчик отключился (осталось {len(self._subscribers)})")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'subscribers': len(self._subscribers),
+            'queue_depths': [subscriber.queue.qsize() for subscriber in self._subscribers],
+        }
+
+
+class MarketDataHubClient:
+    """
+    Подписка процесса-стратегии на хаб: снимок и закрытые свечи попадают в локальный кэш свечей
+    (индикаторы пересчитываются как обычно), остальные потоки передаются в on_message(topic, message).
+    При обрыве или тишине хаба переподключается с экспоненциальной задержкой и получает снимок заново.
+    """
+
+    def __init__(self, on_message: Callable[[str, dict], None], socket_path: str = MARKET_HUB_SOCKET):
+        self.socket_path = socket_path
+        self._on_message = on_message
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+        self.reconnects = 0
+        self.frames = 0
+        self.bad_frames = 0
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        delay = HUB_BACKOFF_INITIAL
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=2 ** 24)
+            except OSError as e:
+                logger.warning(f"🔌 Хаб рыночных данных недоступен ({e}), повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, HUB_BACKOFF_MAX)
+                continue
+            delay = HUB_BACKOFF_INITIAL
+            self.connected = True
+            logger.info(f"✅ Подключено к хабу рыночных данных {self.socket_path}")
+            try:
+                await self._read(reader)
+            except (ConnectionError, ValueError, asyncio.TimeoutError) as e:
+                logger.warning(f"🔌 Соединение с хабом потеряно: {e or type(e).__name__}")
+            finally:
+                self.connected = False
+                writer.close()
+            self.reconnects += 1
+
+    async def _read(self, reader: asyncio.StreamReader):
+        store = get_candle_store()
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=HUB_MAX_SILENCE)
+            if not line:
+                raise ConnectionError("хаб закрыл соединение")
+            self.frames += 1
+            # Некорректный кадр пропускается: из-за одного кадра не стоит рвать соединение и заново грузить снимок
+            try:
+                self._handle_frame(store, json.loads(line))
+            except Exception as e:
+                self.bad_frames += 1
+                logger.error(f"❌ Ошибка обработки кадра хаба: {type(e).__name__}: {e}")
+
+    def _handle_frame(self, store, frame: Dict[str, Any]):
+        topic = frame['topic']
+        if topic == FRAME_CANDLE:
+            candle = frame['candle']
+            store.append(frame['symbol'], frame['timeframe'], candle['timestamp'], candle['open'],
+                         candle['high'], candle['low'], candle['close'], candle['volume'], candle['turnover'])
+        elif topic == FRAME_SNAPSHOT:
+            store.load_history(frame['symbol'], frame['timeframe'], frame['rows'])
+        elif topic != FRAME_HEARTBEAT:
+            self._on_message(topic, frame['message'])
+
+    def metrics(self) -> Dict[str, Any]:
+        return {'connected': self.connected, 'reconnects': self.reconnects, 'frames': self.frames,
+                'bad_frames': self.bad_frames}
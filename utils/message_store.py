@@ -0,0 +1,81 @@
+# utils/message_store.py
+import hashlib
+import sys
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+# Короче этого строки не интернируются: выигрыш меньше стоимости поиска
+INTERN_MIN_LENGTH = 256
+
+
+class _Blob(str):
+    """Строка пула: в отличие от str поддерживает слабые ссылки (и по-прежнему без __dict__)."""
+
+    __slots__ = ('__weakref__',)
+
+
+class ContentPool:
+    """
+    Пул общих строк содержимого сообщений. Одинаковые большие тексты (системные промпты,
+    повторяющийся JSON инструментов, ответ рассуждающей модели в обоих контекстах, контексты
+    после загрузки с диска) хранятся в одном экземпляре. Пул держит строки по слабым ссылкам
+    (ключ — blake2b-дайджест текста): строка исчезает из пула, как только её перестают держать сообщения.
+    """
+
+    def __init__(self, min_length: int = INTERN_MIN_LENGTH):
+        self.min_length = min_length
+        self._lock = threading.Lock()
+        self._blobs: "weakref.WeakValueDictionary[bytes, _Blob]" = weakref.WeakValueDictionary()
+        self.stats = {'interned': 0, 'shared': 0, 'bytes_saved': 0}
+
+    def intern(self, text: Any) -> Any:
+        if not isinstance(text, str) or len(text) < self.min_length:
+            return text
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is not None and blob == text:
+                if blob is not text:
+                    self.stats['shared'] += 1
+                    self.stats['bytes_saved'] += sys.getsizeof(text)
+                return blob
+            blob = text if type(text) is _Blob else _Blob(text)
+            self._blobs[digest] = blob
+            self.stats['interned'] += 1
+        return blob
+
+    def report(self) -> Dict[str, Any]:
+        return {**self.stats, 'blobs': len(self._blobs)}
+
+
+_pool = ContentPool()
+
+
+def get_content_pool() -> ContentPool:
+    return _pool
+
+
+def create_message(role: str, content: Any = None, **fields) -> Dict[str, Any]:
+    """Обычный dict сообщения: содержимое из общего пула строк, пустые поля не добавляются."""
+    message = {'role': role, 'content': _pool.intern(content)}
+    for key, value in fields.items():
+        if value is not None:
+            message[key] = value
+    return message
+
+
+def compact_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Переводит содержимое сообщения в общий пул (на месте) и возвращает то же сообщение."""
+    content = message.get('content')
+    if isinstance(content, str) and type(content) is not _Blob:
+        message['content'] = _pool.intern(content)
+    return message
+
+
+def compact_messages(messages: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """compact_message для каждого сообщения списка (на месте, без копии списка); возвращает тот же список."""
+    if messages:
+        for message in messages:
+            compact_message(message)
+    return messages
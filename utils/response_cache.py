@@ -0,0 +1,194 @@
+# utils/response_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from utils import run_mode
+from utils.cycle_budget import estimate_cost
+from utils.helpers import logger
+
+# Кэш ответов моделей для повторных прогонов (replay / dry-run): включается явно и только в режимах, где
+# ордера не уходят на биржу (utils.run_mode) — в живой торговле повтор старого ответа означал бы решение без модели
+MODEL_RESPONSE_CACHE = os.getenv("MODEL_RESPONSE_CACHE", "0").lower() in ("1", "true", "yes", "on")
+MODEL_RESPONSE_CACHE_DIR = os.getenv("MODEL_RESPONSE_CACHE_DIR", "model_cache")
+MODEL_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("MODEL_RESPONSE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Метки времени меняются от прогона к прогону (время запуска цикла, datetime.now() в описании свечи),
+# поэтому в ключе заменяются заглушкой: повтор того же цикла попадает в кэш
+_VOLATILE_PATTERNS = (
+    re.compile(r"\b1\d{12}\b"),  # epoch в миллисекундах
+    re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?"),  # ISO 8601
+    re.compile(r"\b\d{2}\.\d{2}\.\d{4} \d{2}:\d{2}(?::\d{2})?"),  # format_readable_time
+    re.compile(r"\b\d{2}:\d{2}:\d{2}\b"),  # время суток
+)
+
+
+def _normalise_volatile(text: str) -> str:
+    for pattern in _VOLATILE_PATTERNS:
+        text = pattern.sub("<t>", text)
+    return text
+
+
+def response_cache_key(model: str, messages: List[Dict[str, Any]],
+                       tools: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Адрес ответа: sha256 канонического JSON модели, отформатированных сообщений и схем инструментов
+    с нормализованными метками времени.
+    """
+    canonical = json.dumps(
+        {'model': model, 'messages': messages, 'tools': tools},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.sha256(_normalise_volatile(canonical).encode("utf-8")).hexdigest()
+
+
+def usage_fields(usage: Any) -> Dict[str, int]:
+    """Токены вызова из response.usage для записи в кэш."""
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+    }
+
+
+class ResponseCache:
+    """
+    Контентно-адресуемый кэш ответов моделей на диске: один файл на ответ (<dir>/ab/abcdef….json).
+    Порядок LRU держится в памяти и восстанавливается при первом обращении по времени последнего обращения
+    к файлам; при превышении max_bytes удаляются самые давно использованные ответы.
+    Из цикла событий вызываются aget/aput: обход каталога и чтение/запись файлов выполняются в потоке.
+    """
+
+    def __init__(self, directory: str = MODEL_RESPONSE_CACHE_DIR, max_bytes: int = MODEL_RESPONSE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # ключ -> размер файла
+        self._total_bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        # Сэкономлено попаданиями: токены и стоимость вызовов, которые не понадобились
+        self.saved = {'prompt_tokens': 0, 'completion_tokens': 0, 'usd': 0.0}
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load(self):
+        """Строит индекс по файлам каталога (один раз, при первом get/put; get/put ждут его готовности)."""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            found = []
+            if os.path.isdir(self.directory):
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        if not name.endswith(".json"):
+                            continue
+                        st = os.stat(os.path.join(root, name))
+                        found.append((st.st_mtime, name[:-5], st.st_size))
+            with self._lock:
+                for _, key, size in sorted(found):
+                    self._entries[key] = size
+                    self._total_bytes += size
+            self._loaded = True
+        if found:
+            logger.info(f"♻️ Кэш ответов моделей: {len(found)} записей, {self._total_bytes / 1e6:.1f} МБ")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._load()
+        with self._lock:
+            if key not in self._entries:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # порядок LRU переживает перезапуск
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Кэш ответов моделей: запись {key[:12]} не прочитана ({e}), удаляется")
+            self._discard(key)
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        usage = value.get('usage')
+        if usage:
+            with self._lock:
+                self.saved['prompt_tokens'] += usage['prompt_tokens']
+                self.saved['completion_tokens'] += usage['completion_tokens']
+                self.saved['usd'] += estimate_cost(value.get('model', ''), usage['prompt_tokens'],
+                                                   usage['completion_tokens'])
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._load()
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.stats['stores'] += 1
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self.stats['evictions'] += 1
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    async def akey(self, model: str, messages: List[Dict[str, Any]],
+                   tools: Optional[List[Dict[str, Any]]] = None) -> str:
+        """response_cache_key в потоке: сериализация всего контекста не задерживает цикл событий."""
+        return await asyncio.to_thread(response_cache_key, model, messages, tools)
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, value: Dict[str, Any]):
+        await asyncio.to_thread(self.put, key, value)
+
+    def _discard(self, key: str):
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats, 'entries': len(self._entries), 'megabytes': round(self._total_bytes / 1e6, 2),
+            'saved': {**self.saved, 'usd': round(self.saved['usd'], 4)},
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_refused = False
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Кэш ответов или None, если MODEL_RESPONSE_CACHE не включён или ордера уходят на биржу (BOT_RUN_MODE=live)."""
+    global _cache, _refused
+    if _cache is None and MODEL_RESPONSE_CACHE:
+        if not run_mode.orders_blocked():
+            if not _refused:
+                logger.error(f"❌ MODEL_RESPONSE_CACHE допустим только при BOT_RUN_MODE={run_mode.BOT_RUN_MODE_REPLAY} "
+                             f"или {run_mode.BOT_RUN_MODE_DRY_RUN}, где ордера не отправляются; кэш ответов отключён")
+                _refused = True
+            return None
+        _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,45 @@
+# utils/run_mode.py
+import os
+from typing import Any
+
+from utils.decision_latency import places_orders
+
+# Режим запуска: live — торговля; replay — повторный прогон (ответы моделей можно брать из кэша);
+# dry_run — анализ без торговли. Во всех режимах, кроме live, инструменты, меняющие состояние
+# аккаунта на бирже, не выполняются: модель получает результат-имитацию
+BOT_RUN_MODE_LIVE = "live"
+BOT_RUN_MODE_REPLAY = "replay"
+BOT_RUN_MODE_DRY_RUN = "dry_run"
+BOT_RUN_MODE = os.getenv("BOT_RUN_MODE", BOT_RUN_MODE_LIVE)
+# Инструменты, меняющие состояние аккаунта (через запятую), в дополнение к инструментам ордеров (places_orders)
+EXCHANGE_WRITE_TOOLS = {
+    name.strip() for name in os.getenv(
+        "EXCHANGE_WRITE_TOOLS",
+        "place_order,create_order,amend_order,cancel_order,cancel_all_orders,close_position,"
+        "set_trading_stop,set_stop_loss,set_take_profit,set_leverage"
+    ).split(",") if name.strip()
+}
+
+
+def orders_blocked() -> bool:
+    """Ордера не уходят на биржу в любом режиме, кроме live (неизвестный режим тоже не торгует)."""
+    return BOT_RUN_MODE != BOT_RUN_MODE_LIVE
+
+
+def writes_to_exchange(tool: Any) -> bool:
+    return places_orders(tool) or getattr(tool, 'name', None) in EXCHANGE_WRITE_TOOLS
+
+
+def is_tool_blocked(tool: Any) -> bool:
+    return orders_blocked() and writes_to_exchange(tool)
+
+
+def simulated_result(tool: Any, arguments: dict) -> dict:
+    """Ответ вместо выполнения заблокированного инструмента: модель видит, что ордер не отправлен."""
+    return {
+        "simulated": True,
+        "run_mode": BOT_RUN_MODE,
+        "tool": getattr(tool, 'name', None),
+        "arguments": arguments,
+        "message": f"Режим {BOT_RUN_MODE}: запрос на биржу не отправлен",
+    }
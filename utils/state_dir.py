@@ -0,0 +1,44 @@
+# utils/state_dir.py
+# Только стандартная библиотека: модуль импортируется в main.py раньше всех utils.*, до перехода
+# процесса worker в свой каталог состояния (utils.helpers открывает файл логов уже при импорте).
+import fcntl
+import os
+from typing import Optional
+
+# Режим процесса: standalone — всё в одном процессе, hub — только рыночные данные,
+# worker — стратегия/аккаунт, получающий рыночные данные от хаба
+BOT_MODE_STANDALONE = "standalone"
+BOT_MODE_HUB = "hub"
+BOT_MODE_WORKER = "worker"
+BOT_MODE = os.getenv("BOT_MODE", BOT_MODE_STANDALONE)
+# Каталог состояния процесса worker: журнал цикла, архив транскриптов, расход за день, логи.
+# Файлы состояния задаются относительными путями, поэтому каждому worker'у нужен свой каталог
+BOT_STATE_DIR = os.getenv("BOT_STATE_DIR")
+STATE_DIR_LOCK_FILE = ".worker.lock"
+# Каталог запуска: относительные пути общих ресурсов (сокет хаба) разрешаются от него, а не от каталога состояния
+LAUNCH_DIR = os.getcwd()
+
+
+def launch_path(path: str) -> str:
+    """Абсолютный путь относительно каталога запуска процесса."""
+    return os.path.abspath(os.path.join(LAUNCH_DIR, path))
+
+
+def enter_worker_state_dir(state_dir: Optional[str] = BOT_STATE_DIR):
+    """
+    Делает state_dir рабочим каталогом процесса worker и блокирует его файлом-замком (flock),
+    чтобы два worker'а не писали в одни и те же файлы состояния. Вызывается до импорта utils.*
+    (открытия логов) и файлов состояния. Возвращает открытый файл-замок: блокировка держится, пока он открыт.
+    """
+    if not state_dir:
+        raise RuntimeError("BOT_MODE=worker требует отдельный каталог состояния: задайте BOT_STATE_DIR")
+    state_dir = launch_path(state_dir)
+    os.makedirs(state_dir, exist_ok=True)
+    lock_file = open(os.path.join(state_dir, STATE_DIR_LOCK_FILE), "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError(f"Каталог состояния {state_dir} уже занят другим процессом worker")
+    os.chdir(state_dir)
+    return lock_file
@@ -0,0 +1,214 @@
+# utils/tool_registry.py
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.helpers import logger
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+TOOL_SCHEMAS_CACHE_FILE = os.getenv("TOOL_SCHEMAS_CACHE_FILE", "tool_schemas_cache.json")
+
+
+def _tools_fingerprint() -> str:
+    """Отпечаток исходников инструментов во всём tools/ (путь, размер, mtime) — дёшево, без импорта модулей."""
+    h = hashlib.sha1()
+    for root, dirs, files in os.walk(TOOLS_DIR):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                h.update(f"{os.path.relpath(path, TOOLS_DIR)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def _import_tool_class(module_name: str, qualname: str):
+    target = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return target
+
+
+class ToolRegistry:
+    """
+    Ленивый реестр инструментов.
+    Вместе со схемами на диске хранится, в каком модуле объявлен каждый инструмент, поэтому при тёплом
+    кэше обращение к инструменту импортирует и создаёт только его модуль. Все встроенные инструменты
+    (tools.get_all_tools) загружаются разом, только когда кэша схем нет или он устарел (изменились файлы в tools/).
+    Дополнительные инструменты (register_factory) создаются по одному; инструмент с именем встроенного
+    заменяет его (схема встаёт на место встроенной, сам встроенный в реестр не попадает).
+    Каждый инструмент загружается под своей блокировкой: прогрев в фоне не держит общую блокировку,
+    а вызовы из цикла событий идут через aget() в потоке.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()  # короткая: словари реестра и блокировки по именам
+        self._builtin_lock = threading.Lock()
+        self._schemas_lock = threading.Lock()
+        self._name_locks: Dict[str, threading.Lock] = {}
+        self._instances: Dict[str, Any] = {}
+        self._order: List[str] = []
+        self._extra_factories: Dict[str, Callable[[], Any]] = {}
+        self._builtin_loaded = False
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+        self._builtin_schemas: List[Dict[str, Any]] = []
+        # Имя инструмента -> [модуль, __qualname__ класса] (из кэша схем или после загрузки встроенных)
+        self._locations: Dict[str, List[str]] = {}
+
+    # --- РЕГИСТРАЦИЯ ---
+
+    def register_factory(self, name: str, factory: Callable[[], Any]):
+        """Регистрирует дополнительный инструмент; он будет создан при первом обращении."""
+        with self._lock:
+            self._extra_factories[name] = factory
+            if self._instances.pop(name, None) is not None:
+                self._order.remove(name)
+            self._schemas = None
+
+    # --- ЗАГРУЗКА ---
+
+    def _name_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._name_locks.setdefault(name, threading.Lock())
+
+    def _add(self, name: str, tool) -> Any:
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = tool
+                self._order.append(name)
+            return self._instances[name]
+
+    def _load_builtin(self):
+        """Импортирует и создаёт все встроенные инструменты (нужно только для построения схем)."""
+        if self._builtin_loaded:
+            return
+        with self._builtin_lock:
+            if self._builtin_loaded:
+                return
+            from tools import get_all_tools
+            for tool in get_all_tools():
+                self._locations[tool.name] = [type(tool).__module__, type(tool).__qualname__]
+                self._builtin_schemas.append(tool.to_function_definition())
+                if tool.name not in self._extra_factories:
+                    self._add(tool.name, tool)
+            self._builtin_loaded = True
+            logger.info(f"🧰 Загружено встроенных инструментов: {len(self._locations)}")
+
+    def _load_one(self, name: str):
+        """Импортирует модуль одного встроенного инструмента и создаёт только его."""
+        with self._name_lock(name):
+            if name in self._instances:
+                return self._instances[name]
+            module_name, qualname = self._locations[name]
+            try:
+                tool = _import_tool_class(module_name, qualname)()
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить {name} из {module_name}: {e}. Загружаем все встроенные.")
+                self._load_builtin()
+                return self._instances.get(name)
+            return self._add(name, tool)
+
+    def _load_extra(self, name: str):
+        with self._name_lock(name):
+            if name in self._instances:
+                return self._instances[name]
+            return self._add(name, self._extra_factories[name]())
+
+    def warm_up(self):
+        """Загружает все инструменты заранее, по одному (вызывать в фоне после старта)."""
+        for name in self.names():
+            self.get(name)
+
+    # --- ДОСТУП ---
+
+    def get(self, name: str):
+        """Инструмент по имени. При тёплом кэше схем импортируется только модуль этого инструмента."""
+        if name in self._instances:
+            return self._instances[name]
+        if name in self._extra_factories:
+            return self._load_extra(name)
+        # После schemas() расположения известны для всех встроенных (из кэша или полной загрузки)
+        self.schemas()
+        return self._load_one(name) if name in self._locations else None
+
+    async def aget(self, name: str):
+        """get() для цикла событий: загрузка инструмента (импорт модуля) выполняется в потоке."""
+        tool = self._instances.get(name)
+        if tool is not None:
+            return tool
+        return await asyncio.to_thread(self.get, name)
+
+    def names(self) -> List[str]:
+        return [schema["function"]["name"] for schema in self.schemas()]
+
+    def all(self) -> List[Any]:
+        """Все инструменты (создаёт каждый). В цикле событий не вызывать — только для отладки и прогрева."""
+        return [self.get(name) for name in self.names()]
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        if self._schemas is not None:
+            return self._schemas
+        with self._schemas_lock:
+            if self._schemas is not None:
+                return self._schemas
+            fingerprint = _tools_fingerprint()
+            cached = self._load_schemas_cache(fingerprint)
+            if cached is not None:
+                schemas, locations = cached
+                for name, location in locations.items():
+                    self._locations.setdefault(name, location)
+            else:
+                self._load_builtin()
+                schemas = self._builtin_schemas
+                self._save_schemas_cache(fingerprint, schemas, self._locations)
+            # Замены встроенных встают на их место, остальные дополнительные дописываются в конец — порядок стабилен
+            builtin_names = [s["function"]["name"] for s in schemas]
+            schemas = [self._load_extra(name).to_function_definition() if name in self._extra_factories else schema
+                       for name, schema in zip(builtin_names, schemas)]
+            for name in self._extra_factories:
+                if name not in builtin_names:
+                    schemas.append(self._load_extra(name).to_function_definition())
+            self._schemas = schemas
+            return schemas
+
+    # --- ДИСКОВЫЙ КЭШ СХЕМ ---
+
+    @staticmethod
+    def _load_schemas_cache(fingerprint: str):
+        """(схемы, расположения) из дискового кэша или None, если кэша нет или он устарел."""
+        try:
+            with open(TOOL_SCHEMAS_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Кэш без расположений (старый формат) перестраивается
+            if data.get("fingerprint") == fingerprint and "locations" in data:
+                return data["schemas"], data["locations"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш схем инструментов: {e}")
+        return None
+
+    @staticmethod
+    def _save_schemas_cache(fingerprint: str, schemas: List[Dict[str, Any]], locations: Dict[str, List[str]]):
+        try:
+            tmp_path = f"{TOOL_SCHEMAS_CACHE_FILE}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "schemas": schemas, "locations": locations},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, TOOL_SCHEMAS_CACHE_FILE)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить кэш схем инструментов: {e}")
+
+
+_registry: Optional[ToolRegistry] = None
+
+
+def get_tool_registry() -> ToolRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ToolRegistry()
+    return _registry
@@ -0,0 +1,153 @@
+# utils/tool_selector.py
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.helpers import logger
+
+# Включение/выключение отбора подмножества инструментов
+TOOL_SUBSETTING_ENABLED = os.getenv("TOOL_SUBSETTING_ENABLED", "1") == "1"
+# Инструменты, которые отправляются модели всегда
+CORE_TOOLS = tuple(filter(None, os.getenv("CORE_TOOLS", "wait_for_next_candle").split(",")))
+# Сколько последних ответов ассистента учитывать как "недавно использованные" инструменты
+RECENT_TOOL_WINDOW = int(os.getenv("RECENT_TOOL_WINDOW", "3"))
+
+# Группы инструментов по ключевым словам в имени. Сравниваются целые слова snake_case-имени
+# (ключ из нескольких слов, например "take_profit", — подряд идущие слова).
+# Рыночные данные важнее торговых слов: get_order_book и get_close_candles — аналитические
+ANALYSIS_KEYWORDS = (
+    "kline", "klines", "candle", "candles", "indicator", "indicators", "pattern", "patterns",
+    "ticker", "tickers", "orderbook", "order_book", "liquidation", "liquidations", "funding",
+    "open_interest",
+)
+# Управление открытой позицией: без позиции эти инструменты модели не нужны
+POSITION_KEYWORDS = (
+    "position", "positions", "stop", "stop_loss", "take_profit", "trailing", "close",
+)
+
+
+def _schema_chars(schemas: List[Dict[str, Any]]) -> int:
+    return len(json.dumps(schemas, ensure_ascii=False))
+
+
+def _message_chars(messages: list) -> int:
+    """Длина текста сообщений запроса (content и аргументы tool_calls) — без сериализации всего контекста."""
+    chars = 0
+    for msg in messages:
+        chars += len(msg.get('content') or '')
+        for call in msg.get('tool_calls') or []:
+            chars += len(call.get('function', {}).get('arguments') or '')
+    return chars
+
+
+def _matches(name: str, keywords: tuple) -> bool:
+    words = name.lower().split("_")
+    for keyword in keywords:
+        parts = keyword.split("_")
+        if any(words[i:i + len(parts)] == parts for i in range(len(words) - len(parts) + 1)):
+            return True
+    return False
+
+
+# --- СОСТОЯНИЕ ОТКРЫТЫХ ПОЗИЦИЙ (обновляется из потока позиций pybit) ---
+
+_positions_lock = threading.Lock()
+_open_positions: Dict[str, float] = {}
+
+
+def note_position_update(message: dict):
+    """Обновляет сведения об открытых позициях по сообщению position_stream."""
+    data = message.get('data', [])
+    with _positions_lock:
+        for position in data:
+            symbol = position.get('symbol')
+            if not symbol:
+                continue
+            try:
+                size = float(position.get('size') or 0)
+            except (TypeError, ValueError):
+                size = 0.0
+            if size:
+                _open_positions[symbol] = size
+            else:
+                _open_positions.pop(symbol, None)
+
+
+def has_open_positions() -> bool:
+    with _positions_lock:
+        return bool(_open_positions)
+
+
+class ToolSelector:
+    """
+    Выбирает подмножество схем инструментов на весь цикл анализа: аналитические, неклассифицированные
+    и ордерные инструменты остаются всегда, управление позицией — только при открытой позиции
+    (или если инструмент недавно вызывался). Набор не меняется между шагами цикла, а порядок схем
+    совпадает с порядком реестра, поэтому префикс запроса остаётся стабильным для кэша провайдера.
+    Экономия считается по фактическим prompt_tokens ответов модели.
+    """
+
+    def __init__(self, core_tools: tuple = CORE_TOOLS, enabled: bool = TOOL_SUBSETTING_ENABLED):
+        self.core_tools = set(core_tools)
+        self.enabled = enabled
+        self.stats = {'calls': 0, 'prompt_tokens': 0, 'prompt_cache_hit_tokens': 0, 'saved_schema_tokens': 0.0}
+
+    @staticmethod
+    def _recent_tool_names(messages: list) -> set:
+        names = set()
+        seen = 0
+        for msg in reversed(messages):
+            if msg.get('role') != 'assistant':
+                continue
+            for call in msg.get('tool_calls') or []:
+                names.add(call.get('function', {}).get('name'))
+            seen += 1
+            if seen >= RECENT_TOOL_WINDOW:
+                break
+        return names
+
+    def select(self, schemas: List[Dict[str, Any]], messages: list,
+               open_positions: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """Набор схем на цикл анализа. Вызывается один раз в начале цикла."""
+        if not self.enabled:
+            return schemas
+        if open_positions is None:
+            open_positions = has_open_positions()
+        recent = self._recent_tool_names(messages)
+
+        selected = []
+        for schema in schemas:
+            name = schema['function']['name']
+            manages_position = _matches(name, POSITION_KEYWORDS) and not _matches(name, ANALYSIS_KEYWORDS)
+            if name in self.core_tools or name in recent or open_positions or not manages_position:
+                selected.append(schema)
+        logger.info(f"🧰 Инструментов на цикл: {len(selected)}/{len(schemas)}")
+        return selected
+
+    def record_call(self, usage: Any, messages: list, sent: List[Dict[str, Any]], full: List[Dict[str, Any]]):
+        """
+        Учитывает вызов инструментальной модели. Токенов на символ запроса — по фактическим prompt_tokens,
+        по этой доле оценивается, сколько токенов заняли бы неотправленные схемы.
+        """
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        if not prompt_tokens:
+            return
+        sent_chars = _schema_chars(sent)
+        omitted_chars = _schema_chars(full) - sent_chars if sent is not full else 0
+        tokens_per_char = prompt_tokens / max(1, _message_chars(messages) + sent_chars)
+        self.stats['calls'] += 1
+        self.stats['prompt_tokens'] += prompt_tokens
+        # DeepSeek сообщает, сколько prompt-токенов пришлось на кэшированный префикс
+        self.stats['prompt_cache_hit_tokens'] += getattr(usage, 'prompt_cache_hit_tokens', 0) or 0
+        self.stats['saved_schema_tokens'] += omitted_chars * tokens_per_char
+
+    def savings_report(self) -> Dict[str, Any]:
+        prompt = self.stats['prompt_tokens']
+        saved = round(self.stats['saved_schema_tokens'])
+        return {
+            **self.stats,
+            'saved_schema_tokens': saved,
+            'saved_ratio': round(saved / (prompt + saved), 3) if prompt + saved else 0.0,
+            'prompt_cache_hit_ratio': round(self.stats['prompt_cache_hit_tokens'] / prompt, 3) if prompt else 0.0,
+        }
@@ -0,0 +1,174 @@
+# utils/tool_worker_pool.py
+import asyncio
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional
+
+from utils.helpers import logger
+
+try:
+    import numpy as np
+except ImportError:  # numpy нужен только для передачи массивов через разделяемую память
+    np = None
+
+# Размер пула процессов и длина очереди ожидающих задач
+TOOL_WORKER_PROCESSES = int(os.getenv("TOOL_WORKER_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+TOOL_WORKER_MAX_QUEUE = int(os.getenv("TOOL_WORKER_MAX_QUEUE", "8"))
+# spawn — безопасный вариант при работающих потоках pybit
+TOOL_WORKER_START_METHOD = os.getenv("TOOL_WORKER_START_METHOD", "spawn")
+# Массивы меньше этого размера (байт) передаются обычным pickle
+SHARED_MEMORY_MIN_BYTES = int(os.getenv("SHARED_MEMORY_MIN_BYTES", "65536"))
+
+
+class SharedArray:
+    """Описание numpy-массива, лежащего в разделяемой памяти (передаётся в процесс вместо данных)."""
+    __slots__ = ("name", "shape", "dtype")
+
+    def __init__(self, name: str, shape: tuple, dtype: str):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+    def __getstate__(self):
+        return self.name, self.shape, self.dtype
+
+    def __setstate__(self, state):
+        self.name, self.shape, self.dtype = state
+
+
+def _resolve_class(module_name: str, qualname: str):
+    """Класс по модулю и __qualname__, включая вложенные (Outer.Inner). Классы из функций (<locals>) не импортируются."""
+    if "<locals>" in qualname:
+        raise TypeError(f"{module_name}.{qualname}: класс, объявленный внутри функции, нельзя загрузить в процессе")
+    target = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return target
+
+
+def _run_in_worker(module_name: str, class_name: str, kwargs: Dict[str, Any]) -> Any:
+    """Точка входа в процессе-воркере: подключает разделяемые массивы и вызывает Tool.compute."""
+    attached = []
+    try:
+        for key, value in list(kwargs.items()):
+            if isinstance(value, SharedArray):
+                shm = shared_memory.SharedMemory(name=value.name)
+                attached.append(shm)
+                kwargs[key] = np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)
+        tool_cls = _resolve_class(module_name, class_name)
+        return tool_cls.compute(**kwargs)
+    finally:
+        kwargs.clear()
+        for shm in attached:
+            try:
+                shm.close()
+            except BufferError:
+                # Результат всё ещё ссылается на буфер — отображение освободится вместе с процессом
+                pass
+
+
+class ToolWorkerPool:
+    """
+    Пул процессов для CPU-тяжёлых инструментов.
+    Инструмент объявляет себя CPU-тяжёлым атрибутом cpu_bound = True и реализует:
+      - async prepare(**kwargs) -> dict (необязательно): ввод-вывод в цикле событий, возвращает аргументы compute;
+      - @staticmethod compute(**kwargs): чистые вычисления, выполняются в отдельном процессе.
+    """
+
+    def __init__(self, processes: int = TOOL_WORKER_PROCESSES, max_queue: int = TOOL_WORKER_MAX_QUEUE):
+        self.processes = processes
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(processes + max_queue)
+        self.stats = {'submitted': 0, 'rejected': 0, 'failed': 0, 'in_flight': 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = multiprocessing.get_context(TOOL_WORKER_START_METHOD)
+            self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            logger.info(f"🏭 Пул процессов инструментов запущен: {self.processes} процессов, очередь {self.max_queue}")
+        return self._executor
+
+    @staticmethod
+    def _share_arrays(kwargs: Dict[str, Any]):
+        """Переносит крупные numpy-массивы в разделяемую память. Возвращает (kwargs, блоки памяти)."""
+        if np is None:
+            return kwargs, []
+        shared_kwargs, blocks = {}, []
+        try:
+            for key, value in kwargs.items():
+                if isinstance(value, np.ndarray) and value.nbytes >= SHARED_MEMORY_MIN_BYTES:
+                    shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+                    blocks.append(shm)
+                    np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)[...] = value
+                    shared_kwargs[key] = SharedArray(shm.name, value.shape, value.dtype.str)
+                else:
+                    shared_kwargs[key] = value
+        except Exception:
+            ToolWorkerPool._release(blocks)
+            raise
+        return shared_kwargs, blocks
+
+    @staticmethod
+    def _release(blocks):
+        for shm in blocks:
+            try:
+                shm.close()
+                shm.unlink()
+            except Exception as e:
+                logger.warning(f"Не удалось освободить разделяемую память {shm.name}: {e}")
+
+    async def run(self, tool_instance, function_args: dict) -> Any:
+        if self._slots.locked():
+            self.stats['rejected'] += 1
+            raise RuntimeError(f"Очередь CPU-инструментов переполнена ({self.processes + self.max_queue} задач)")
+
+        tool_cls = type(tool_instance)
+        if "<locals>" in tool_cls.__qualname__:
+            raise TypeError(f"{tool_cls.__qualname__}: CPU-инструмент должен быть объявлен на уровне модуля или класса")
+
+        async with self._slots:
+            self.stats['submitted'] += 1
+            self.stats['in_flight'] += 1
+            try:
+                prepare = getattr(tool_instance, 'prepare', None)
+                compute_kwargs = await prepare(**function_args) if prepare else dict(function_args)
+                shared_kwargs, blocks = self._share_arrays(compute_kwargs)
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(
+                        self._get_executor(), _run_in_worker,
+                        tool_cls.__module__, tool_cls.__qualname__, shared_kwargs
+                    )
+                finally:
+                    self._release(blocks)
+            except Exception:
+                self.stats['failed'] += 1
+                raise
+            finally:
+                self.stats['in_flight'] -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool: Optional[ToolWorkerPool] = None
+
+
+def get_tool_worker_pool() -> ToolWorkerPool:
+    global _pool
+    if _pool is None:
+        _pool = ToolWorkerPool()
+    return _pool
+
+
+def shutdown_tool_worker_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,238 @@
+# utils/transcript_archive.py
+import asyncio
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.helpers import logger
+
+try:
+    import zstandard
+except ImportError:  # без zstandard используется gzip
+    zstandard = None
+
+ARCHIVE_DIR = os.getenv("TRANSCRIPT_ARCHIVE_DIR", "archive")
+ARCHIVE_INDEX_FILE = "index.jsonl"
+SEGMENT_MAX_BYTES = int(os.getenv("ARCHIVE_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+
+CODEC_ZSTD = "zstd"
+CODEC_GZIP = "gzip"
+
+
+def _message_key(msg: Dict[str, Any]) -> tuple:
+    calls = tuple(call.get('id') for call in msg.get('tool_calls') or [])
+    return msg.get('role'), msg.get('tool_call_id'), msg.get('content'), calls
+
+
+def dropped_messages(before: List[Dict[str, Any]], after: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Сообщения из before, которых нет в after (результат усечения контекста), в исходном порядке.
+    Сообщение, которое усечение укоротило, тоже считается отброшенным: в архив уходит полная версия.
+    """
+    if after is before:
+        return []
+    kept = Counter(_message_key(msg) for msg in after)
+    dropped = []
+    for msg in before:
+        key = _message_key(msg)
+        if kept[key]:
+            kept[key] -= 1
+        else:
+            dropped.append(msg)
+    return dropped
+
+
+def _snapshot(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Копия верхнего уровня записи (списки и словари): сообщения не меняются, а списки сообщений дополняются."""
+    return {
+        key: list(value) if isinstance(value, list) else dict(value) if isinstance(value, dict) else value
+        for key, value in record.items()
+    }
+
+
+class _Codec:
+    """Каждая запись сжимается отдельным кадром — её можно прочитать, не распаковывая соседние."""
+
+    def __init__(self):
+        self.name = CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == CODEC_ZSTD:
+            return self._compressor.compress(data)
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    def decompress(self, data: bytes, codec: str) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Запись сжата zstd, но модуль zstandard не установлен")
+            return self._decompressor.decompress(data)
+        return gzip.decompress(data)
+
+
+class TranscriptArchive:
+    """
+    Архив транскриптов циклов: сжатые записи в файлах-сегментах и небольшой индекс
+    (время, символ, итерация, сегмент, смещение, длина). Индекс держится в памяти,
+    поэтому выборка по итерации или диапазону времени читает с диска только нужные записи.
+    Сжатие и запись выполняются в отдельном потоке (submit / append_async), цикл событий не ждёт диск.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._codec = _Codec()
+        self._lock = threading.Lock()
+        self._index: List[Dict[str, Any]] = []
+        self._timestamps: List[float] = []
+        self._load_index()
+        self._segment_no = self._index[-1]['segment'] if self._index else 1
+        # Один поток записи: порядок записей в сегменте и индексе совпадает с порядком submit
+        self._writer: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="transcript-archive"
+        )
+
+    # --- ИНДЕКС ---
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, ARCHIVE_INDEX_FILE)
+
+    def _segment_path(self, segment_no: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment_no:06d}.bin")
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "rb") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            # Недописанная последняя строка после сбоя: отрезаем её, иначе следующая запись
+            # индекса приклеится к обрывку и тоже станет нечитаемой
+            logger.warning("Архив транскриптов: отброшена недописанная строка индекса")
+            with open(self._index_path, "r+b") as f:
+                f.truncate(complete)
+            content = content[:complete]
+        for line in content.decode("utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Архив транскриптов: пропущена повреждённая строка индекса")
+                continue
+            self._index.append(entry)
+        self._index.sort(key=lambda entry: entry['ts'])
+        self._timestamps = [entry['ts'] for entry in self._index]
+
+    # --- ЗАПИСЬ ---
+
+    def append(self, record: Dict[str, Any], symbol: Optional[str] = None,
+               iteration: Optional[int] = None, kind: str = "step") -> Dict[str, Any]:
+        """Синхронно сжимает и дописывает запись в текущий сегмент, затем добавляет строку в индекс."""
+        return self._write(json.dumps(record, ensure_ascii=False).encode("utf-8"), time.time(), symbol, iteration, kind)
+
+    def submit(self, record: Dict[str, Any], symbol: Optional[str] = None,
+               iteration: Optional[int] = None, kind: str = "step") -> Future:
+        """
+        Ставит запись в очередь потока архива и сразу возвращает Future с записью индекса.
+        В цикле событий снимается только поверхностная копия record (последующие изменения списков
+        сообщений на запись не влияют); сериализация и сжатие выполняются в потоке архива.
+        """
+        if self._writer is None:
+            raise RuntimeError("Архив транскриптов закрыт")
+        return self._writer.submit(self._write_record, _snapshot(record), time.time(), symbol, iteration, kind)
+
+    async def append_async(self, record: Dict[str, Any], symbol: Optional[str] = None,
+                           iteration: Optional[int] = None, kind: str = "step") -> Dict[str, Any]:
+        return await asyncio.wrap_future(self.submit(record, symbol, iteration, kind))
+
+    def close(self):
+        """Дописывает поставленные в очередь записи и останавливает поток архива."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def _write_record(self, record: Dict[str, Any], ts: float, symbol: Optional[str],
+                      iteration: Optional[int], kind: str) -> Dict[str, Any]:
+        return self._write(json.dumps(record, ensure_ascii=False).encode("utf-8"), ts, symbol, iteration, kind)
+
+    def _write(self, data: bytes, ts: float, symbol: Optional[str],
+               iteration: Optional[int], kind: str) -> Dict[str, Any]:
+        payload = self._codec.compress(data)
+        with self._lock:
+            path = self._segment_path(self._segment_no)
+            if os.path.exists(path) and os.path.getsize(path) + len(payload) > SEGMENT_MAX_BYTES:
+                self._segment_no += 1
+                path = self._segment_path(self._segment_no)
+            with open(path, "ab") as f:
+                offset = f.tell()
+                f.write(payload)
+            entry = {
+                'ts': ts, 'symbol': symbol, 'iteration': iteration, 'kind': kind,
+                'segment': self._segment_no, 'offset': offset, 'length': len(payload),
+                'codec': self._codec.name,
+            }
+            # Индекс пишется после данных: при сбое между ними запись просто не видна
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._index.append(entry)
+            self._timestamps.append(ts)
+        return entry
+
+    # --- ЧТЕНИЕ ---
+
+    def read(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        with open(self._segment_path(entry['segment']), "rb") as f:
+            f.seek(entry['offset'])
+            data = f.read(entry['length'])
+        return json.loads(self._codec.decompress(data, entry['codec']))
+
+    def find(self, iteration: int, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Все записи итерации (по индексу, без чтения остальных записей)."""
+        return [
+            self.read(entry) for entry in self._index
+            if entry['iteration'] == iteration and (symbol is None or entry['symbol'] == symbol)
+        ]
+
+    def scan(self, start_ts: float = 0.0, end_ts: Optional[float] = None,
+             symbol: Optional[str] = None, kind: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Записи в диапазоне времени [start_ts, end_ts) в порядке записи."""
+        lo = bisect.bisect_left(self._timestamps, start_ts)
+        hi = bisect.bisect_left(self._timestamps, end_ts) if end_ts is not None else len(self._index)
+        for entry in self._index[lo:hi]:
+            if symbol is not None and entry['symbol'] != symbol:
+                continue
+            if kind is not None and entry['kind'] != kind:
+                continue
+            yield {**self.read(entry), '_archive': entry}
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return list(self._index)
+
+
+_archive: Optional[TranscriptArchive] = None
+
+
+def get_transcript_archive() -> TranscriptArchive:
+    global _archive
+    if _archive is None:
+        _archive = TranscriptArchive()
+    return _archive
+
+
+def shutdown_transcript_archive():
+    global _archive
+    if _archive is not None:
+        _archive.close()
+        _archive = None
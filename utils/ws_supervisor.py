@@ -0,0 +1,293 @@
+# utils/ws_supervisor.py
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.helpers import logger
+
+WS_CHECK_INTERVAL = 5.0          # секунд между проверками здоровья
+WS_READY_TIMEOUT = 10.0          # секунд на подключение при переподключении
+WS_BACKOFF_INITIAL = 1.0
+WS_BACKOFF_MAX = 60.0
+LAG_EMA_ALPHA = 0.1
+# Сколько идентификаторов (execId) помнить для отсева повторов после догрузки
+RECENT_IDS_LIMIT = 5000
+
+
+class StreamHealth:
+    """Состояние одной подписки: время последнего сообщения и задержка относительно биржи."""
+
+    def __init__(self, name: str, max_silence: Optional[float]):
+        self.name = name
+        self.max_silence = max_silence  # None — поток может молчать сколь угодно долго (ликвидации, приватные)
+        self.last_message_at: Optional[float] = None      # monotonic — для тишины
+        self.last_message_wall: Optional[float] = None    # epoch — граница догрузки после разрыва
+        self.last_exchange_ts: Optional[int] = None
+        self.messages = 0
+        self.lag_ms_last: Optional[float] = None
+        self.lag_ms_ema: Optional[float] = None
+        self.lag_ms_max = 0.0
+
+    def note(self, message: dict):
+        now = time.time()
+        self.last_message_at = time.monotonic()
+        self.last_message_wall = now
+        self.messages += 1
+        exchange_ts = message.get('ts') or message.get('creationTime')
+        if exchange_ts:
+            self.last_exchange_ts = int(exchange_ts)
+            lag = now * 1000 - self.last_exchange_ts
+            self.lag_ms_last = lag
+            self.lag_ms_ema = lag if self.lag_ms_ema is None else self.lag_ms_ema + LAG_EMA_ALPHA * (lag - self.lag_ms_ema)
+            self.lag_ms_max = max(self.lag_ms_max, lag)
+
+    def silence(self) -> Optional[float]:
+        if self.last_message_at is None:
+            return None
+        return time.monotonic() - self.last_message_at
+
+    def is_stale(self) -> bool:
+        silence = self.silence()
+        return self.max_silence is not None and silence is not None and silence > self.max_silence
+
+    def metrics(self) -> Dict[str, Any]:
+        silence = self.silence()
+        return {
+            'messages': self.messages,
+            'silence_s': round(silence, 1) if silence is not None else None,
+            'lag_ms_last': round(self.lag_ms_last, 1) if self.lag_ms_last is not None else None,
+            'lag_ms_ema': round(self.lag_ms_ema, 1) if self.lag_ms_ema is not None else None,
+            'lag_ms_max': round(self.lag_ms_max, 1),
+        }
+
+
+class RecentIds:
+    """Ограниченное множество недавно обработанных идентификаторов (execId): повторы после догрузки отсеиваются."""
+
+    def __init__(self, limit: int = RECENT_IDS_LIMIT):
+        self.limit = limit
+        self._ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def add(self, item_id: Any) -> bool:
+        """Запоминает идентификатор. Возвращает False, если он уже встречался."""
+        key = str(item_id)
+        if key in self._ids:
+            return False
+        self._ids[key] = None
+        if len(self._ids) > self.limit:
+            self._ids.popitem(last=False)
+        return True
+
+
+def _pong_age(ws) -> Optional[float]:
+    """
+    Сколько секунд назад пришёл последний pong на ping websocket-client внутри pybit (ws.ws — WebSocketApp).
+    None, если pong ещё не приходил или атрибуты недоступны.
+    """
+    last_pong = getattr(getattr(ws, 'ws', None), 'last_pong_tm', 0) or 0
+    if not last_pong:
+        return None
+    return time.time() - last_pong
+
+
+class WebSocketSupervisor:
+    """
+    Следит за одним соединением pybit WebSocket: проверяет is_connected(), тишину в потоках-пульсах
+    и (для потоков без пульса, например приватного) ответы на ping; при проблеме переподключается
+    с экспоненциальной задержкой, заново оформляет подписки и догружает пропущенное через REST.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Any],
+        subscribe: Callable[[Any], None],
+        backfill: Optional[Callable[[float], Awaitable[None]]] = None,
+        check_interval: float = WS_CHECK_INTERVAL,
+        heartbeat_timeout: Optional[float] = None
+    ):
+        self.name = name
+        self._connect = connect      # синхронно создаёт WebSocket
+        self._subscribe = subscribe  # синхронно оформляет подписки на созданном WebSocket
+        self._backfill = backfill    # async backfill(disconnected_at_epoch_seconds)
+        self.check_interval = check_interval
+        # Допустимый возраст последнего pong; None — не проверять
+        self.heartbeat_timeout = heartbeat_timeout
+        self.ws = None
+        # С этого момента (epoch) данные потока получены или догружены
+        self._healthy_since: Optional[float] = None
+        # Начало разрыва, который ещё не догружен (epoch): сдвигается только успешной догрузкой,
+        # сообщения после переподключения его не двигают
+        self._backfill_from: Optional[float] = None
+        self._backfill_retry: Optional[asyncio.Task] = None
+        self.streams: Dict[str, StreamHealth] = {}
+        self.reconnects = 0
+        self.last_reconnect_reason: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_stream(self, stream: str, max_silence: Optional[float] = None):
+        self.streams[stream] = StreamHealth(stream, max_silence)
+
+    def note_message(self, stream: str, message: dict):
+        """Вызывается из потока pybit на каждое сообщение."""
+        health = self.streams.get(stream)
+        if health is not None:
+            health.note(message)
+
+    async def _wait_ready(self, ws):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WS_READY_TIMEOUT
+        while not ws.is_connected():
+            if loop.time() >= deadline:
+                raise TimeoutError(f"{self.name} не подключился за {WS_READY_TIMEOUT} с")
+            await asyncio.sleep(0.05)
+
+    async def _close(self, ws):
+        try:
+            await asyncio.to_thread(ws.exit)
+        except Exception as e:
+            logger.warning(f"{self.name}: ошибка при закрытии соединения: {e}")
+
+    async def _open(self):
+        """Создаёт WebSocket и ждёт подключения; при неудаче закрывает его, чтобы поток pybit не остался жить."""
+        ws = await asyncio.to_thread(self._connect)
+        try:
+            await self._wait_ready(ws)
+        except BaseException:
+            await self._close(ws)
+            raise
+        return ws
+
+    async def start(self, ws=None):
+        """
+        Подключается (если ws не передан) и запускает фоновый контроль соединения.
+        Если первое подключение не удалось, контроль всё равно запускается и переподключает с задержкой.
+        """
+        self._healthy_since = time.time()
+        if ws is None:
+            try:
+                ws = await self._open()
+                await asyncio.to_thread(self._subscribe, ws)
+            except Exception as e:
+                logger.error(f"❌ {self.name}: не удалось подключиться при старте ({e}), повтор в фоне")
+                ws = None
+        self.ws = ws
+        self._task = asyncio.create_task(self._watch())
+        return ws
+
+    async def stop(self):
+        self._cancel_backfill_retry()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _problem(self) -> Optional[str]:
+        if self.ws is None:
+            return "соединение отсутствует"
+        try:
+            if not self.ws.is_connected():
+                return "соединение разорвано"
+        except Exception as e:
+            return f"ошибка проверки соединения: {e}"
+        for health in self.streams.values():
+            if health.is_stale():
+                return f"поток {health.name} молчит {health.silence():.0f} с"
+        if self.heartbeat_timeout is not None:
+            age = _pong_age(self.ws)
+            if age is not None and age > self.heartbeat_timeout:
+                return f"нет ответа на ping {age:.0f} с"
+        return None
+
+    def _disconnected_at(self) -> float:
+        """
+        Граница догрузки: начало ещё не догруженного разрыва, если прошлая догрузка не удалась;
+        иначе последнее полученное сообщение или момент, до которого данные уже догружены.
+        """
+        if self._backfill_from is not None:
+            return self._backfill_from
+        candidates = [health.last_message_wall for health in self.streams.values() if health.last_message_wall]
+        if self._healthy_since is not None:
+            candidates.append(self._healthy_since)
+        return max(candidates) if candidates else time.time()
+
+    async def _run_backfill(self, since: float, covered_from: float) -> bool:
+        """Догружает данные с since. При успехе граница сдвигается на covered_from (с него данные идут из потока)."""
+        try:
+            await self._backfill(since)
+        except Exception as e:
+            logger.error(f"❌ {self.name}: ошибка догрузки данных через REST: {e}")
+            return False
+        self._backfill_from = None
+        self._healthy_since = covered_from
+        return True
+
+    def _cancel_backfill_retry(self):
+        if self._backfill_retry is not None:
+            self._backfill_retry.cancel()
+            self._backfill_retry = None
+
+    async def _retry_backfill(self, covered_from: float):
+        """Повторяет неудавшуюся догрузку с экспоненциальной задержкой, не дожидаясь следующего разрыва."""
+        delay = WS_BACKOFF_INITIAL
+        while True:
+            await asyncio.sleep(delay)
+            if await self._run_backfill(self._backfill_from, covered_from):
+                logger.info(f"✅ {self.name}: пропущенные данные догружены после повтора")
+                self._backfill_retry = None
+                return
+            delay = min(delay * 2, WS_BACKOFF_MAX)
+            logger.warning(f"{self.name}: повтор догрузки через {delay:.0f} с")
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            problem = self._problem()
+            if problem:
+                await self._reconnect(problem)
+
+    async def _reconnect(self, reason: str):
+        # Новый разрыв: незавершённый повтор догрузки поглощается догрузкой после переподключения
+        self._cancel_backfill_retry()
+        disconnected_at = self._disconnected_at()
+        self.last_reconnect_reason = reason
+        logger.warning(f"🔌 {self.name}: {reason}. Переподключение...")
+        old_ws, self.ws = self.ws, None
+        if old_ws is not None:
+            await self._close(old_ws)
+
+        delay = WS_BACKOFF_INITIAL
+        while True:
+            try:
+                ws = await self._open()
+                break
+            except Exception as e:
+                logger.error(f"❌ {self.name}: переподключение не удалось ({e}), повтор через {delay:.0f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, WS_BACKOFF_MAX)
+
+        # Сначала подписка, потом догрузка: сообщения, пришедшие во время догрузки, не теряются,
+        # а повторы отсеиваются получателями (execId исполнений, timestamp свечей)
+        subscribed_at = time.time()
+        await asyncio.to_thread(self._subscribe, ws)
+        for health in self.streams.values():
+            health.last_message_at = time.monotonic()
+        if self._backfill is not None:
+            if not await self._run_backfill(disconnected_at, subscribed_at):
+                # Начало разрыва запоминается: повтор (и следующее переподключение) догружает с него же
+                self._backfill_from = disconnected_at
+                self._backfill_retry = asyncio.create_task(self._retry_backfill(subscribed_at))
+        else:
+            self._healthy_since = subscribed_at
+        self.ws = ws
+        self.reconnects += 1
+        logger.info(f"✅ {self.name}: переподключено (всего переподключений: {self.reconnects})")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'connected': bool(self.ws is not None and self.ws.is_connected()),
+            'reconnects': self.reconnects,
+            'last_reconnect_reason': self.last_reconnect_reason,
+            'streams': {name: health.metrics() for name, health in self.streams.items()},
+        }